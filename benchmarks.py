@@ -0,0 +1,403 @@
+#!/usr/bin/env python3
+"""
+性能基准测试 - 覆盖数据构建和服务的各个环节
+
+  load_json       加载 1 万条签的 JSON
+  load_pack       打开同样数据的 .pack 并解码全部签（pack_fortunes.FortunePack）
+  parse_gemini    解析数 MB 的模型输出（update_from_gemini_direct.extract_fortunes）
+  enrich          为 1 万条签生成释义（enrich_interpretations.enrich_fortunes）
+  draw            别名表抽签 100 万次（fortune_draw）
+  optimize_images 压缩 5000 张签文图片（optimize_images.optimize_images，需要 Pillow）
+  serve_static    serve.py 静态文件请求延迟（keep-alive）
+
+数据集均由仓库中的真实数据放大生成，放在临时目录中，不会修改仓库文件。
+
+用法：
+  python3 benchmarks.py                # 运行全部基准并打印结果
+  python3 benchmarks.py --quick        # 使用小数据集快速运行
+  python3 benchmarks.py --save         # 把结果保存为基线
+  python3 benchmarks.py --check        # 与基线比较，变慢超过阈值时退出码为 1
+  python3 benchmarks.py --check --save # 先与旧基线比较，没有回退时再更新基线
+  python3 benchmarks.py enrich draw    # 只运行指定基准
+
+基线（benchmark-baseline.json）随仓库提交，按规模（full / quick）分别记录，
+并记录测量时的 Python 版本和 CPU 数；在不同的机器上比较时结果仅供参考。
+"""
+
+import argparse
+import contextlib
+import gc
+import http.client
+import io
+import json
+import os
+import platform
+import random
+import re
+import shutil
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent
+BASELINE_FILE = "benchmark-baseline.json"
+
+SERVED_FILE = "omikuji/data/senso-ji-fortunes-full-optimized-v1.json"
+FULL_FILE = "omikuji/data/senso-ji-fortunes-full.json"
+GEMINI_FILE = "omikuji/data/senso-gemini.txt"
+IMAGES_DIR = "omikuji/data/senso-ji-omikuji-main"
+
+# 各基准的数据规模：完整 / --quick
+SCALES = {
+    'full': {'fortunes': 10_000, 'dump_mb': 8, 'images': 5_000, 'draws': 1_000_000, 'requests': 2_000},
+    'quick': {'fortunes': 1_000, 'dump_mb': 1, 'images': 40, 'draws': 100_000, 'requests': 200},
+}
+
+# 默认允许的变慢比例
+DEFAULT_THRESHOLD = 0.20
+
+ID_FIELD = re.compile(r'"id"\s*:\s*(\d+)')
+
+
+# ==================== 合成数据 ====================
+
+def load_fortunes(path=SERVED_FILE):
+    with open(ROOT / path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def scale_fortunes(fortunes, count):
+    """复制真实签文并重新编号，得到 count 条签"""
+    scaled = []
+    for i in range(count):
+        fortune = json.loads(json.dumps(fortunes[i % len(fortunes)]))
+        fortune['id'] = i + 1
+        scaled.append(fortune)
+    return scaled
+
+
+def scale_gemini_dump(target_bytes):
+    """重复 senso-gemini.txt 直到达到目标大小（签号在每一轮中递增）"""
+    text = (ROOT / GEMINI_FILE).read_text(encoding='utf-8')
+    parts = []
+    size = 0
+    round_no = 0
+    while size < target_bytes:
+        chunk = ID_FIELD.sub(lambda m, offset=round_no * 100: f'"id": {int(m.group(1)) + offset}', text)
+        parts.append(chunk)
+        size += len(chunk.encode('utf-8'))
+        round_no += 1
+    return '\n'.join(parts)
+
+
+# ==================== 基准 ====================
+# 每个基准返回 (setup, run, work)：setup() 准备数据并返回传给 run 的参数，
+# run(arg) 是被计时的部分，work 是每次运行处理的数据量和单位。
+
+def bench_load_json(scale, tmp):
+    fortunes = scale_fortunes(load_fortunes()['fortunes'], scale['fortunes'])
+    path = Path(tmp) / 'fortunes.json'
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({'fortunes': fortunes}, f, ensure_ascii=False, indent=2)
+
+    def run(_):
+        with open(path, 'r', encoding='utf-8') as f:
+            json.load(f)
+
+    return (lambda: None), run, (scale['fortunes'], 'fortunes')
+
+
+def bench_load_pack(scale, tmp):
+    import pack_fortunes
+
+    data = load_fortunes()
+    path = Path(tmp) / 'fortunes.json'
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({'metadata': data['metadata'], 'fortunes': scale_fortunes(data['fortunes'], scale['fortunes'])},
+                  f, ensure_ascii=False)
+    pack_file = Path(tmp) / 'fortunes.pack'
+    pack_fortunes.pack_fortunes(path, pack_file)
+
+    def run(_):
+        with pack_fortunes.FortunePack(pack_file) as pack:
+            for fortune_id in pack.ids():
+                pack.get(fortune_id)
+
+    return (lambda: None), run, (scale['fortunes'], 'fortunes')
+
+
+def bench_parse_gemini(scale, tmp):
+    import update_from_gemini_direct
+
+    path = Path(tmp) / 'gemini-dump.txt'
+    path.write_text(scale_gemini_dump(scale['dump_mb'] << 20), encoding='utf-8')
+    size_mb = path.stat().st_size / 1024 / 1024
+
+    def run(_):
+        update_from_gemini_direct.extract_fortunes([str(path)])
+
+    return (lambda: None), run, (size_mb, 'MB')
+
+
+def bench_enrich(scale, tmp):
+    import enrich_interpretations
+
+    fortunes = scale_fortunes(load_fortunes(FULL_FILE)['fortunes'], scale['fortunes'])
+
+    def run(_):
+        enrich_interpretations.enrich_fortunes(fortunes)
+
+    return (lambda: None), run, (len(fortunes), 'fortunes')
+
+
+def bench_draw(scale, tmp):
+    import fortune_draw
+
+    service = fortune_draw.DrawService(load_fortunes()['fortunes'])
+    sampler = service.samplers['lucky']
+    draws = scale['draws']
+
+    def run(_):
+        rng = random.Random(0)
+        sample = sampler.sample
+        for _ in range(draws):
+            sample(rng)
+
+    return (lambda: None), run, (draws, 'draws')
+
+
+def bench_optimize_images(scale, tmp):
+    try:
+        import PIL  # noqa: F401
+    except ImportError:
+        return None
+
+    import optimize_images
+
+    sources = sorted((ROOT / IMAGES_DIR).glob('*.jpg'))
+    input_dir = Path(tmp) / 'images'
+    input_dir.mkdir()
+    for i in range(scale['images']):
+        src = sources[i % len(sources)]
+        dst = input_dir / f'{i}.jpg'
+        try:
+            os.link(src, dst)
+        except OSError:
+            shutil.copyfile(src, dst)
+
+    def setup():
+        output_dir = Path(tmp) / 'optimized'
+        shutil.rmtree(output_dir, ignore_errors=True)
+        return output_dir
+
+    def run(output_dir):
+        optimize_images.optimize_images(input_dir, output_dir, quality=85,
+                                        manifest_path=Path(tmp) / 'manifest.json', force=True)
+
+    return setup, run, (scale['images'], 'images')
+
+
+def bench_serve_static(scale, tmp):
+    import serve
+
+    server = serve.StaticServer(('127.0.0.1', 0), quiet=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    port = server.server_address[1]
+    paths = ['/', '/js/app.js', '/data/fortunes/index.json', f'/data/{IMAGES_DIR.split("/", 2)[2]}/1_0.jpg']
+    latencies = []
+
+    def run(_):
+        latencies.clear()
+        conn = http.client.HTTPConnection('127.0.0.1', port)
+        for i in range(scale['requests']):
+            start = time.perf_counter()
+            conn.request('GET', paths[i % len(paths)], headers={'Accept-Encoding': 'br, gzip'})
+            conn.getresponse().read()
+            latencies.append(time.perf_counter() - start)
+        conn.close()
+
+    def extra():
+        ordered = sorted(latencies)
+        return {
+            'p50_ms': ordered[len(ordered) // 2] * 1000,
+            'p95_ms': ordered[int(len(ordered) * 0.95)] * 1000,
+        }
+
+    run.extra = extra
+    run.cleanup = server.shutdown
+    return (lambda: None), run, (scale['requests'], 'requests')
+
+
+BENCHMARKS = {
+    'load_json': (bench_load_json, 5),
+    'load_pack': (bench_load_pack, 5),
+    'parse_gemini': (bench_parse_gemini, 3),
+    'enrich': (bench_enrich, 3),
+    'draw': (bench_draw, 3),
+    'optimize_images': (bench_optimize_images, 1),
+    'serve_static': (bench_serve_static, 3),
+}
+
+
+# ==================== 运行与比较 ====================
+
+def run_benchmarks(names=None, quick=False, repeats=None):
+    """
+    运行基准测试
+
+    Returns:
+        {名称: {'seconds': 中位数, 'min': 最小值, 'runs': 次数, 'work': 数据量,
+                'unit': 单位, 'throughput': 每秒处理量, ...}}
+    """
+    scale = SCALES['quick' if quick else 'full']
+    results = {}
+
+    for name in names or BENCHMARKS:
+        factory, default_repeats = BENCHMARKS[name]
+        with tempfile.TemporaryDirectory(prefix=f'yinian-bench-{name}-') as tmp:
+            prepared = factory(scale, tmp)
+            if prepared is None:
+                print(f"⏭️  {name}: 缺少依赖，跳过")
+                continue
+            setup, run, (work, unit) = prepared
+
+            times = []
+            extras = []
+            try:
+                for _ in range(repeats or default_repeats):
+                    arg = setup()
+                    gc.collect()
+                    with contextlib.redirect_stdout(io.StringIO()):
+                        start = time.perf_counter()
+                        run(arg)
+                        times.append(time.perf_counter() - start)
+                    if hasattr(run, 'extra'):
+                        extras.append(run.extra())
+            finally:
+                if hasattr(run, 'cleanup'):
+                    run.cleanup()
+
+        median = statistics.median(times)
+        result = {
+            'seconds': median,
+            'min': min(times),
+            'runs': len(times),
+            'work': work,
+            'unit': unit,
+            'throughput': work / median if median > 0 else 0.0,
+        }
+        for key in (extras[0] if extras else {}):
+            result[key] = statistics.median(e[key] for e in extras)
+        results[name] = result
+
+        detail = ''.join(f"，{k} {v:.2f}" for k, v in result.items() if k.endswith('_ms'))
+        print(f"⏱️  {name:<16} {median*1000:>10.1f}ms  {result['throughput']:>14,.1f} {unit}/s{detail}")
+
+    return results
+
+
+def environment():
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+    }
+
+
+def load_baseline(path=BASELINE_FILE):
+    """读取基线文件：{规模: {'environment', 'recorded', 'results'}}"""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except OSError:
+        return {}
+
+
+def save_baseline(results, quick, path=BASELINE_FILE):
+    """记录本次结果为该规模的基线（另一规模的基线保持不变）；只运行部分基准时只更新这些基准"""
+    scale = 'quick' if quick else 'full'
+    baseline = load_baseline(path)
+    previous = baseline.get(scale, {}).get('results', {})
+    baseline[scale] = {
+        'environment': environment(),
+        'recorded': time.strftime('%Y-%m-%d %H:%M:%S'),
+        'results': {**previous, **results},
+    }
+    path = Path(path)
+    tmp_path = path.with_name(path.name + '.tmp')
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(dict(sorted(baseline.items())), f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+    print(f"💾 {scale} 基线已保存到 {path}")
+
+
+def check_regressions(results, quick, threshold=DEFAULT_THRESHOLD, path=BASELINE_FILE):
+    """与基线比较，返回变慢超过阈值的基准列表；没有该规模的基线时返回 None"""
+    scale = 'quick' if quick else 'full'
+    baseline = load_baseline(path).get(scale)
+    if not baseline:
+        print(f"❌ {path} 中没有 {scale} 规模的基线，请先运行{' --quick' if quick else ''} --save")
+        return None
+
+    recorded, current = baseline['environment'], environment()
+    if (recorded['python'], recorded['cpus']) != (current['python'], current['cpus']):
+        print(f"⚠️  基线记录于 Python {recorded['python']}、{recorded['cpus']} 核（{baseline['recorded']}），"
+              f"与本机不同，结果仅供参考")
+
+    regressions = []
+    print("-" * 60)
+    for name, result in results.items():
+        base = baseline['results'].get(name)
+        if not base:
+            print(f"  {name:<16} 基线中没有记录")
+            continue
+        ratio = result['seconds'] / base['seconds'] if base['seconds'] else 1.0
+        mark = '✅'
+        if ratio > 1 + threshold:
+            mark = '❌'
+            regressions.append(name)
+        print(f"  {mark} {name:<16} {base['seconds']*1000:>9.1f}ms → {result['seconds']*1000:>9.1f}ms ({ratio-1:+.1%})")
+    return regressions
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="一念性能基准测试")
+    parser.add_argument('names', nargs='*', help=f"要运行的基准（默认全部）: {', '.join(BENCHMARKS)}")
+    parser.add_argument('--quick', action='store_true', help="使用小规模数据集")
+    parser.add_argument('--repeats', type=int, default=None, help="每个基准的运行次数")
+    parser.add_argument('--save', action='store_true', help="保存结果为基线")
+    parser.add_argument('--check', action='store_true', help="与基线比较，变慢超过阈值时失败")
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD, help="允许的变慢比例（默认 0.2）")
+    parser.add_argument('--baseline', default=BASELINE_FILE, help="基线文件路径")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    os.chdir(ROOT)
+    args = parse_args()
+    unknown = [name for name in args.names if name not in BENCHMARKS]
+    if unknown:
+        print(f"❌ 未知基准: {', '.join(unknown)}（可选: {', '.join(BENCHMARKS)}）")
+        sys.exit(2)
+
+    print(f"🏁 规模: {'quick' if args.quick else 'full'}，{environment()['python']}，{os.cpu_count()} 核")
+    print("-" * 60)
+    results = run_benchmarks(args.names, quick=args.quick, repeats=args.repeats)
+
+    # 先与旧基线比较，再保存：否则 --save --check 会拿本次结果和自己比较
+    if args.check:
+        regressions = check_regressions(results, args.quick, args.threshold, args.baseline)
+        if regressions is None:
+            sys.exit(2)
+        if regressions:
+            print(f"❌ 性能回退超过 {args.threshold:.0%}: {', '.join(regressions)}")
+            if args.save:
+                print("   有性能回退，未更新基线")
+            sys.exit(1)
+        print("✅ 没有超过阈值的性能回退")
+
+    if args.save:
+        save_baseline(results, args.quick, args.baseline)
@@ -0,0 +1,503 @@
+#!/usr/bin/env python3
+"""
+签文数据统一构建入口
+
+把各个脚本建模为依赖图中的阶段（stage）：
+  template    → generate_fortunes.py 生成签文骨架
+  pdf         → extract_pdf_fortunes.py 从浅草寺签文 PDF 提取签诗和释义
+  gemini      → update_from_gemini_direct.py 从模型输出（或 PDF 提取结果）更新 full.json
+  enrich      → enrich_interpretations.py 重新生成现代释义
+  publish     → publish_fortunes.py 把 full.json 的修改同步到线上签文 JSON（optimized-v1）
+  optimize    → optimize_images.py 原地重新压缩已提交的签文图片（需显式指定，见下）
+  images      → 响应式衍生图 + 低清占位图 + 瓦片金字塔，写入线上签文 JSON
+  split       → split_fortunes.py 拆分为精简索引 + 详情分片，locale_bundles.py 生成各语言的详情分片
+  pack        → pack_fortunes.py 生成二进制打包数据（.pack）
+  search      → search_index.py 生成签诗和解签的全文检索索引
+  compress    → compress_assets.py 预压缩文本资源（.br / .gz）
+  verify      → verify_dataset.py 校验签号、签级和图片完整性
+  fairness    → draw_fairness.py 蒙特卡洛模拟抽签算法，检验签号和签级分布
+  fingerprint → fingerprint_assets.py 生成带内容哈希文件名的部署目录 dist/
+
+每个阶段记录运行后输入文件的内容哈希，输入未变化时直接跳过；
+互不依赖的阶段并行执行。optimize 会覆盖仓库中的源图片，默认构建不运行，
+只有在命令行中指定 optimize（或加 --optimize）时才执行。
+
+用法：
+  python3 build.py              # 构建全部阶段
+  python3 build.py enrich       # 只构建 enrich 及其依赖
+  python3 build.py --list       # 查看各阶段是否需要重建
+  python3 build.py --force      # 忽略缓存全部重建
+  python3 build.py optimize --target-ssim 0.98   # 重新压缩源图片（修改已提交的文件）
+  python3 build.py gemini --source pdf --force   # 直接用 PDF 提取结果生成 full.json
+  python3 build.py --profile memory,flame        # 附带内存峰值和调用栈采样（见 instrumentation.py）
+"""
+
+import argparse
+import glob
+import hashlib
+import importlib.util
+import json
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from pathlib import Path
+
+from instrumentation import add_profile_argument, instrument, stage
+from optimize_images import DEFAULT_QUALITY, QUALITY_SEARCH_MAX, QUALITY_SEARCH_MIN, resolve_quality, target_from_args
+
+ROOT = Path(__file__).resolve().parent
+
+STATE_FILE = ".build-cache/pipeline-state.json"
+
+IMAGES_DIR = "omikuji/data/senso-ji-omikuji-main"
+GEMINI_FILE = "omikuji/data/senso-gemini.txt"
+PDF_FILE = "omikuji/data/日本東京淺草觀音寺一百籤.pdf"
+PDF_OUTPUT = "omikuji/data/senso-pdf.json"
+TEMPLATE_FILE = "omikuji/data/senso-ji-fortunes-template.json"
+FULL_FILE = "omikuji/data/senso-ji-fortunes-full.json"
+SERVED_FILE = "omikuji/data/senso-ji-fortunes-full-optimized-v1.json"
+FORTUNES_DIR = "omikuji/data/fortunes"
+PACK_FILE = f"{FORTUNES_DIR}/fortunes.pack"
+SEARCH_FILE = f"{FORTUNES_DIR}/search.json"
+DIST_DIR = "dist"
+
+# 与 compress_assets.TEXT_PATTERNS 保持一致
+TEXT_ASSETS = [
+    "omikuji/*.html",
+    "omikuji/css/*.css",
+    "omikuji/js/*.js",
+    "omikuji/data/*.json",
+    f"{FORTUNES_DIR}/*.json",
+    f"{FORTUNES_DIR}/*/*.json",
+    f"{FORTUNES_DIR}/*.pack",
+]
+
+
+def _load_module(path):
+    """按文件路径导入脚本（generate_fortunes.py 不在包内）"""
+    name = Path(path).stem
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.spec_from_file_location(name, ROOT / path)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+# ==================== 阶段定义 ====================
+
+def run_template(options):
+    _load_module("omikuji/generate_fortunes.py").main(TEMPLATE_FILE)
+
+
+def run_pdf(options):
+    _load_module("extract_pdf_fortunes.py").extract_pdf(
+        PDF_FILE, PDF_OUTPUT, workers=options.workers, force=options.force)
+
+
+def run_gemini(options):
+    sources = [PDF_OUTPUT] if options.source == 'pdf' else [GEMINI_FILE]
+    _load_module("update_from_gemini_direct.py").update_from_gemini(
+        sources, target=FULL_FILE, base=TEMPLATE_FILE, force=options.force)
+
+
+def run_enrich(options):
+    _load_module("enrich_interpretations.py").main(
+        FULL_FILE, workers=options.workers or 1, force=options.force)
+
+
+def run_publish(options):
+    _load_module("publish_fortunes.py").publish_fortunes(FULL_FILE, SERVED_FILE)
+
+
+def run_optimize(options):
+    _load_module("optimize_images.py").optimize_images(
+        IMAGES_DIR, quality=options.quality, workers=options.workers, target=target_from_args(options),
+        min_quality=options.min_quality)
+
+
+def run_images(options):
+    images = _load_module("optimize_images.py")
+    variants = images.build_responsive_images(IMAGES_DIR, workers=options.workers)
+    placeholders = images.build_placeholders(IMAGES_DIR, workers=options.workers)
+    pyramids = images.build_tile_pyramids(IMAGES_DIR, workers=options.workers)
+    images.write_responsive_manifest(variants, SERVED_FILE)
+    images.write_placeholders(placeholders, SERVED_FILE)
+    images.write_tile_manifest(pyramids, SERVED_FILE)
+
+
+def run_split(options):
+    _load_module("split_fortunes.py").split_fortunes(SERVED_FILE, FORTUNES_DIR)
+    _load_module("locale_bundles.py").build_locale_bundles(
+        SERVED_FILE, FORTUNES_DIR, workers=options.workers, force=options.force)
+
+
+def run_pack(options):
+    _load_module("pack_fortunes.py").pack_fortunes(SERVED_FILE, PACK_FILE)
+
+
+def run_search(options):
+    _load_module("search_index.py").build_search_index(SERVED_FILE, SEARCH_FILE)
+
+
+def run_compress(options):
+    _load_module("compress_assets.py").compress_assets(workers=options.workers)
+
+
+def run_fingerprint(options):
+    _load_module("fingerprint_assets.py").fingerprint_assets(DIST_DIR, workers=options.workers)
+
+
+def run_verify(options):
+    report = _load_module("verify_dataset.py").verify_dataset(
+        [SERVED_FILE, FULL_FILE], workers=options.workers, force=options.force)
+    if not report.ok:
+        raise ValueError(f"签文数据校验发现 {len(report.errors)} 处错误")
+
+
+def run_fairness(options):
+    fairness = _load_module("draw_fairness.py")
+    if not fairness.numpy_available():
+        print("⚠️  未安装 NumPy，跳过抽签公平性模拟（pip3 install numpy）")
+        return
+    report = fairness.run(index_file=f"{FORTUNES_DIR}/index.json")
+    fairness.print_report(report)
+    print(f"📋 报告: {fairness.write_report(report, None)}")
+    # 与 draw_fairness.py 的退出码规则相同：签级规格不符只警告，算法有偏差时构建失败
+    unfair = fairness.failed_algorithms(report)
+    if unfair:
+        raise ValueError(f"抽签算法未通过公平性检验: {', '.join(unfair)}")
+
+
+# inputs/outputs 支持 glob；输入包含阶段脚本本身，脚本修改后会自动重建
+STAGES = {
+    'template': {
+        'deps': [],
+        'inputs': ["omikuji/generate_fortunes.py"],
+        'outputs': [TEMPLATE_FILE],
+        'run': run_template,
+    },
+    'pdf': {
+        'deps': [],
+        'inputs': [PDF_FILE, "extract_pdf_fortunes.py"],
+        'outputs': [PDF_OUTPUT],
+        'run': run_pdf,
+    },
+    # 切换 --source 时加 --force，否则输入未变化会被跳过
+    'gemini': {
+        'deps': ['template', 'pdf'],
+        'inputs': [GEMINI_FILE, PDF_OUTPUT, TEMPLATE_FILE, "update_from_gemini_direct.py"],
+        'outputs': [FULL_FILE],
+        'run': run_gemini,
+    },
+    'enrich': {
+        'deps': ['gemini'],
+        'inputs': [FULL_FILE, "enrich_interpretations.py"],
+        'outputs': [FULL_FILE],
+        'run': run_enrich,
+    },
+    'publish': {
+        'deps': ['enrich'],
+        'inputs': [FULL_FILE, SERVED_FILE, "publish_fortunes.py"],
+        'outputs': [SERVED_FILE],
+        'run': run_publish,
+    },
+    # 原地修改已提交的源图片：只在显式指定时运行（opt_in）
+    'optimize': {
+        'deps': [],
+        'opt_in': True,
+        'inputs': [f"{IMAGES_DIR}/*.jpg", "optimize_images.py"],
+        'outputs': [f"{IMAGES_DIR}/*.jpg"],
+        'run': run_optimize,
+    },
+    'images': {
+        'deps': ['optimize', 'publish'],
+        'inputs': [f"{IMAGES_DIR}/*.jpg", SERVED_FILE, "optimize_images.py"],
+        'outputs': ["omikuji/data/responsive/*", "omikuji/data/tiles/*.dzi", SERVED_FILE],
+        'run': run_images,
+    },
+    'split': {
+        'deps': ['images'],
+        'inputs': [SERVED_FILE, "split_fortunes.py", "locale_bundles.py"],
+        'outputs': [f"{FORTUNES_DIR}/index.json", f"{FORTUNES_DIR}/detail-*.json",
+                    f"{FORTUNES_DIR}/*/detail-*.json"],
+        'run': run_split,
+    },
+    'pack': {
+        'deps': ['images'],
+        'inputs': [SERVED_FILE, "pack_fortunes.py"],
+        'outputs': [PACK_FILE],
+        'run': run_pack,
+    },
+    'search': {
+        'deps': ['images'],
+        'inputs': [SERVED_FILE, "search_index.py"],
+        'outputs': [SEARCH_FILE],
+        'run': run_search,
+    },
+    'compress': {
+        'deps': ['enrich', 'split', 'pack', 'search'],
+        'inputs': TEXT_ASSETS + ["compress_assets.py"],
+        'outputs': ["omikuji/index.html.gz"],
+        'run': run_compress,
+    },
+    'verify': {
+        'deps': ['enrich', 'images'],
+        'inputs': [SERVED_FILE, FULL_FILE, f"{IMAGES_DIR}/*.jpg", "verify_dataset.py"],
+        'outputs': [],
+        'run': run_verify,
+    },
+    # 抽签规则（app.js、fortune_draw.py）或签级数据变化时重新模拟
+    'fairness': {
+        'deps': ['split'],
+        'inputs': [f"{FORTUNES_DIR}/index.json", "omikuji/js/app.js", "fortune_draw.py",
+                   "omikuji/generate_fortunes.py", "draw_fairness.py"],
+        'outputs': [".build-cache/reports/draw_fairness-*.json"],
+        'run': run_fairness,
+    },
+    # 部署目录中的分片、打包数据和检索索引要引用带哈希的图片名，需要重新生成；
+    # 依赖 split / pack / search 保证它们先完成，不会同时读写同一批文件
+    'fingerprint': {
+        'deps': ['images', 'verify', 'split', 'pack', 'search'],
+        'inputs': ["omikuji/index.html", "omikuji/css/*.css", "omikuji/js/*.js", SERVED_FILE,
+                   f"{IMAGES_DIR}/*.jpg", "omikuji/data/responsive/*", "omikuji/data/tiles/*.dzi",
+                   "vercel.json",
+                   f"{FORTUNES_DIR}/index.json", f"{FORTUNES_DIR}/detail-*.json",
+                   f"{FORTUNES_DIR}/*/detail-*.json", PACK_FILE, SEARCH_FILE,
+                   "fingerprint_assets.py", "bundle_critical.py", "split_fortunes.py", "locale_bundles.py",
+                   "pack_fortunes.py", "search_index.py"],
+        'outputs': [f"{DIST_DIR}/omikuji/asset-manifest.json"],
+        'run': run_fingerprint,
+    },
+}
+
+
+# ==================== 增量缓存 ====================
+
+def expand(patterns):
+    """展开 glob，返回排序后的文件列表"""
+    files = set()
+    for pattern in patterns:
+        if glob.has_magic(pattern):
+            files.update(p for p in glob.glob(pattern) if os.path.isfile(p))
+        elif os.path.isfile(pattern):
+            files.add(pattern)
+    return sorted(files)
+
+
+class HashCache:
+    """文件哈希缓存：大小和修改时间都没变时直接复用上次的哈希"""
+
+    def __init__(self, entries=None):
+        self.entries = entries or {}
+
+    def sha256(self, path):
+        st = os.stat(path)
+        entry = self.entries.get(path)
+        if entry and entry[0] == st.st_size and entry[1] == st.st_mtime_ns:
+            return entry[2]
+
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                digest.update(chunk)
+        self.entries[path] = [st.st_size, st.st_mtime_ns, digest.hexdigest()]
+        return self.entries[path][2]
+
+    def snapshot(self, patterns):
+        return {path: self.sha256(path) for path in expand(patterns)}
+
+
+def load_state(path=STATE_FILE):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {'files': {}, 'stages': {}}
+
+
+def save_state(state, path=STATE_FILE):
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(path.name + '.tmp')
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(state, f, indent=1, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def is_fresh(name, state, hashes):
+    """输入哈希与上次运行后一致，且输出都存在时，阶段无需重建"""
+    stage = STAGES[name]
+    record = state['stages'].get(name)
+    if not record:
+        return False
+    if any(not expand([pattern]) for pattern in stage['outputs']):
+        return False
+    return hashes.snapshot(stage['inputs']) == record['inputs']
+
+
+def resolve(targets):
+    """按依赖关系展开目标阶段（包含所有上游阶段）"""
+    selected = []
+
+    def visit(name):
+        if name not in STAGES:
+            raise SystemExit(f"❌ 未知阶段: {name}（可选: {', '.join(STAGES)}）")
+        if name in selected:
+            return
+        for dep in STAGES[name]['deps']:
+            visit(dep)
+        selected.append(name)
+
+    for target in targets or STAGES:
+        visit(target)
+    return selected
+
+
+def opted_out(name, targets, options):
+    """opt_in 阶段只在命令行显式指定（或 --optimize）时运行"""
+    return (STAGES[name].get('opt_in', False) and name not in (targets or ())
+            and not getattr(options, 'optimize', False))
+
+
+# ==================== 调度 ====================
+
+def run_stage(name, options):
+    with stage(name):
+        STAGES[name]['run'](options)
+
+
+def build(targets=None, force=False, jobs=None, options=None, state_path=STATE_FILE):
+    """
+    构建指定阶段
+
+    Returns:
+        {阶段名: 'built' | 'skipped' | 'failed' | 'blocked'}
+    """
+    options = options or parse_args([])
+    names = resolve(targets)
+    state = load_state(state_path)
+    hashes = HashCache(state.get('files'))
+
+    status = {}
+    timings = {}
+    pending = list(names)
+    running = {}
+    start = time.perf_counter()
+
+    print(f"🔨 构建阶段: {' → '.join(names)}")
+    print("-" * 50)
+
+    def ready(name):
+        return all(status.get(dep) in ('built', 'skipped') for dep in STAGES[name]['deps'])
+
+    def blocked(name):
+        return any(status.get(dep) in ('failed', 'blocked') for dep in STAGES[name]['deps'])
+
+    with ThreadPoolExecutor(max_workers=jobs or len(names)) as pool:
+        while pending or running:
+            for name in list(pending):
+                if blocked(name):
+                    status[name] = 'blocked'
+                    pending.remove(name)
+                elif ready(name):
+                    pending.remove(name)
+                    if opted_out(name, targets, options):
+                        status[name] = 'skipped'
+                        print(f"⏭️  {name}: 会修改已提交的文件，默认不运行（显式指定 {name} 或加 --optimize）")
+                        continue
+                    if not force and is_fresh(name, state, hashes):
+                        status[name] = 'skipped'
+                        print(f"⏭️  {name}: 输入未变化，跳过")
+                        continue
+                    print(f"▶️  {name}: 开始构建")
+                    running[pool.submit(run_stage, name, options)] = (name, time.perf_counter())
+
+            if not running:
+                continue
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name, stage_start = running.pop(future)
+                timings[name] = time.perf_counter() - stage_start
+                try:
+                    future.result()
+                except Exception as e:
+                    status[name] = 'failed'
+                    state['stages'].pop(name, None)
+                    print(f"❌ {name}: 失败 - {e}")
+                    continue
+                status[name] = 'built'
+                # 记录运行后的输入哈希：原地修改的文件下次不会被误判为变化
+                state['stages'][name] = {'inputs': hashes.snapshot(STAGES[name]['inputs'])}
+                print(f"✅ {name}: 完成（{timings[name]*1000:.0f}ms）")
+
+    state['files'] = {path: entry for path, entry in hashes.entries.items() if os.path.exists(path)}
+    save_state(state, state_path)
+
+    elapsed = time.perf_counter() - start
+    built = sum(1 for s in status.values() if s == 'built')
+    skipped = sum(1 for s in status.values() if s == 'skipped')
+    print("-" * 50)
+    print(f"📦 构建 {built} 个阶段，跳过 {skipped} 个，总耗时 {elapsed*1000:.0f}ms")
+    for name in names:
+        if status[name] in ('failed', 'blocked'):
+            print(f"  ✗ {name}: {status[name]}")
+
+    return status
+
+
+def list_stages(targets=None, state_path=STATE_FILE, options=None):
+    state = load_state(state_path)
+    hashes = HashCache(state.get('files'))
+    for name in resolve(targets):
+        deps = ', '.join(STAGES[name]['deps']) or '-'
+        if opted_out(name, targets, options):
+            mark = '○ 默认不运行'
+        else:
+            mark = '✓ 最新' if is_fresh(name, state, hashes) else '● 需要重建'
+        print(f"  {name:<10} {mark:<8} 依赖: {deps}")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="签文数据统一构建入口")
+    parser.add_argument('targets', nargs='*', help=f"要构建的阶段（默认全部）: {', '.join(STAGES)}")
+    parser.add_argument('--force', action='store_true', help="忽略缓存，全部重建")
+    parser.add_argument('--list', action='store_true', help="列出各阶段状态，不执行构建")
+    parser.add_argument('-j', '--jobs', type=int, default=None, help="同时运行的阶段数")
+    parser.add_argument('--workers', type=int, default=None, help="图片和释义阶段的并行进程数")
+    parser.add_argument('--optimize', action='store_true',
+                        help="同时运行 optimize 阶段（原地重新压缩已提交的源图片）")
+    parser.add_argument('--quality', type=int, default=None,
+                        help=f"JPEG 质量（optimize 阶段，默认 {DEFAULT_QUALITY}）；"
+                             f"指定感知质量目标时为查找上限（默认 {QUALITY_SEARCH_MAX}）")
+    parser.add_argument('--min-quality', type=int, default=QUALITY_SEARCH_MIN,
+                        help=f"optimize 阶段感知质量目标模式的查找下限（默认 {QUALITY_SEARCH_MIN}）")
+    target = parser.add_mutually_exclusive_group()
+    target.add_argument('--target-ssim', type=float, default=None, metavar='SSIM',
+                        help="optimize 阶段按 SSIM 目标为每张图片选择质量（需要 NumPy）")
+    target.add_argument('--target-psnr', type=float, default=None, metavar='DB',
+                        help="optimize 阶段按 PSNR 目标为每张图片选择质量")
+    parser.add_argument('--source', choices=['gemini', 'pdf'], default='gemini',
+                        help="gemini 阶段的数据来源：人工修正的模型输出或 PDF 提取结果")
+    add_profile_argument(parser)
+    args = parser.parse_args(argv)
+    # 与 optimize_images.py 使用同一套默认值和校验
+    try:
+        args.quality = resolve_quality(args.quality, target_from_args(args), args.min_quality)
+    except ValueError as e:
+        parser.error(str(e))
+    return args
+
+
+if __name__ == "__main__":
+    os.chdir(ROOT)
+    args = parse_args()
+    if args.list:
+        list_stages(args.targets, options=args)
+        sys.exit(0)
+    with instrument('build', profile=args.profile):
+        result = build(args.targets, force=args.force, jobs=args.jobs, options=args)
+    sys.exit(0 if all(s in ('built', 'skipped') for s in result.values()) else 1)
@@ -0,0 +1,389 @@
+#!/usr/bin/env python3
+"""
+首屏关键路径打包 - 让首次打开只需要一次往返
+
+部署目录中的 index.html 原本要再请求样式表，Vue 挂载后 loadFortunes() 还要再请求
+签文索引，慢速移动网络上首屏至少要等三次往返。本脚本（由 fingerprint_assets.py 调用）：
+
+  1. 把样式表压缩后内联为 <style>，页面第一个响应就能绘制启动页
+  2. 把精简签文索引（data/fortunes/index.json）内联为
+     <script type="application/json" id="fortune-index">，app.js 直接读取，不再请求
+  3. 为外部脚本加上 <link rel="preload">，为第三方来源（Vue CDN）加上 preconnect，
+     浏览器在解析 HTML 时就开始下载，而不是等到读到 </body> 前的 <script>
+  4. 检查打包后页面 gzip 后的大小不超过预算（默认 14KB，约为 TCP 初始拥塞窗口），
+     超出时构建失败，避免首屏悄悄变成两次往返
+
+minify_css / minify_js 只做保守的压缩：去掉注释、缩进和多余空白，保留换行
+（不依赖自动分号插入的写法也不会被改变语义），不重命名变量。
+
+用法：
+  python3 bundle_critical.py                  # 检查 dist/omikuji/index.html 的大小预算
+  python3 bundle_critical.py --budget 20      # 使用 20KB 预算
+"""
+
+import argparse
+import gzip
+import html
+import json
+import os
+import posixpath
+import re
+import sys
+from pathlib import Path
+
+OUTPUT_DIR = "dist"
+SITE_DIR = "omikuji"
+PAGE = "index.html"
+
+# 内联签文索引的元素 id（app.js 的 loadJsonIndex 读取）
+INDEX_ELEMENT_ID = "fortune-index"
+
+# 打包后页面 gzip 后的大小上限：10 个 MSS（约 14.6KB）的初始拥塞窗口能一次送达
+BUDGET_BYTES = 14 * 1024
+
+STYLESHEET = re.compile(r'<link\s+rel="stylesheet"\s+href="([^"]+)"\s*/?>')
+SCRIPT = re.compile(r'<script\s+(?:defer\s+)?src="([^"]+)"(?:\s+defer)?\s*></script>')
+CSS_URL = re.compile(r'url\(([\'"]?)([^\'")]+)\1\)')
+EXTERNAL = re.compile(r'^(?:[a-z]+:)?//', re.I)
+
+IDENTIFIER = re.compile(r'[\w$\u0080-\uffff]')
+
+
+def is_identifier(char):
+    return bool(char) and bool(IDENTIFIER.match(char))
+
+
+# ==================== CSS ====================
+
+def minify_css(text):
+    """去掉注释和多余空白；字符串原样保留"""
+    out = []
+    i, n = 0, len(text)
+    pending_space = False
+    while i < n:
+        char = text[i]
+        if text.startswith('/*', i):
+            end = text.find('*/', i + 2)
+            i = n if end < 0 else end + 2
+            pending_space = True
+            continue
+        if char in '"\'':
+            end = i + 1
+            while end < n and text[end] != char:
+                end += 2 if text[end] == '\\' else 1
+            if pending_space and out and out[-1] not in '{};,>:(':
+                out.append(' ')
+            pending_space = False
+            out.append(text[i:end + 1])
+            i = end + 1
+            continue
+        if char.isspace():
+            pending_space = True
+            i += 1
+            continue
+        if char in '{};,>':
+            # 这些符号两侧的空白都可以去掉；'}' 前的最后一个分号也可以去掉
+            if char == '}' and out and out[-1] == ';':
+                out.pop()
+        elif pending_space and out and out[-1] not in '{};,>:(':
+            out.append(' ')
+        pending_space = False
+        out.append(char)
+        i += 1
+    return ''.join(out).strip()
+
+
+def rebase_css_urls(css, css_path, page_path):
+    """样式表内联到页面后，把其中的相对 url() 改为相对于页面"""
+    css_dir = posixpath.dirname(css_path)
+    page_dir = posixpath.dirname(page_path)
+
+    def rebase(match):
+        quote, url = match.groups()
+        if EXTERNAL.match(url) or url.startswith(('data:', '/', '#')):
+            return match.group(0)
+        target = posixpath.normpath(posixpath.join(css_dir, url))
+        return f"url({quote}{posixpath.relpath(target, page_dir or '.')}{quote})"
+
+    return CSS_URL.sub(rebase, css)
+
+
+# ==================== JavaScript ====================
+
+# 这些字符之后出现的 / 是正则字面量而不是除号
+REGEX_PRECEDERS = set('(,=:[!&|?{};+-*%<>~^}')
+REGEX_KEYWORDS = {'return', 'typeof', 'instanceof', 'in', 'of', 'new', 'delete', 'void',
+                  'throw', 'case', 'do', 'else', 'yield', 'await'}
+# 这些字符之后或之前的换行可以去掉（不会触发或阻止自动分号插入）
+NEWLINE_AFTER = set('{[(,;:=&|?')
+NEWLINE_BEFORE = set('}])')
+
+
+class _JsMinifier:
+    def __init__(self, text):
+        self.text = text
+        self.out = []
+        # 最后一个有意义的词法单元，用于区分正则和除号
+        self.last = ''
+
+    def emit(self, token):
+        self.out.append(token)
+        self.last = token
+
+    def tail(self):
+        return self.out[-1][-1] if self.out and self.out[-1] else ''
+
+    def skip_string(self, i):
+        quote = self.text[i]
+        end = i + 1
+        while self.text[end] != quote:
+            end += 2 if self.text[end] == '\\' else 1
+        return end + 1
+
+    def skip_regex(self, i):
+        end = i + 1
+        in_class = False
+        while True:
+            char = self.text[end]
+            if char == '\\':
+                end += 2
+                continue
+            if char == '[':
+                in_class = True
+            elif char == ']':
+                in_class = False
+            elif char == '/' and not in_class:
+                break
+            elif char == '\n':
+                raise ValueError(f"无法解析的正则字面量（位置 {i}）")
+            end += 1
+        end += 1
+        while end < len(self.text) and is_identifier(self.text[end]):
+            end += 1
+        return end
+
+    def skip_template(self, i):
+        """模板字符串原样保留，但要找到 ${...} 中代码的结束位置"""
+        end = i + 1
+        while self.text[end] != '`':
+            if self.text[end] == '\\':
+                end += 2
+            elif self.text.startswith('${', end):
+                end = self.skip_code(end + 2)
+            else:
+                end += 1
+        return end + 1
+
+    def skip_code(self, i):
+        """跳过 ${ 之后的表达式，返回匹配的 } 之后的位置"""
+        depth = 0
+        while True:
+            char = self.text[i]
+            if char in '"\'':
+                i = self.skip_string(i)
+            elif char == '`':
+                i = self.skip_template(i)
+            elif char == '{':
+                depth += 1
+                i += 1
+            elif char == '}':
+                if depth == 0:
+                    return i + 1
+                depth -= 1
+                i += 1
+            else:
+                i += 1
+
+    def regex_allowed(self):
+        last = self.last
+        if not last:
+            return True
+        if is_identifier(last[-1]):
+            return last in REGEX_KEYWORDS
+        return last[-1] in REGEX_PRECEDERS
+
+    def run(self):
+        text, n = self.text, len(self.text)
+        i = 0
+        newline = space = False
+        while i < n:
+            char = text[i]
+            # 正则字面量不能以 // 开头，代码中的 // 一定是注释
+            if text.startswith('//', i):
+                end = text.find('\n', i)
+                i = n if end < 0 else end
+                continue
+            if text.startswith('/*', i):
+                end = text.find('*/', i + 2)
+                comment = text[i:n if end < 0 else end]
+                newline = newline or '\n' in comment
+                space = True
+                i = n if end < 0 else end + 2
+                continue
+            if char in ' \t\r\n':
+                newline = newline or char == '\n'
+                space = True
+                i += 1
+                continue
+
+            if space and self.out:
+                self.separate(newline, char)
+            newline = space = False
+
+            if char in '"\'':
+                end = self.skip_string(i)
+            elif char == '`':
+                end = self.skip_template(i)
+            elif char == '/' and self.regex_allowed():
+                end = self.skip_regex(i)
+            elif is_identifier(char):
+                end = i + 1
+                while end < n and is_identifier(text[end]):
+                    end += 1
+            else:
+                end = i + 1
+            self.emit(text[i:end])
+            i = end
+        return ''.join(self.out).strip() + '\n'
+
+    def separate(self, newline, next_char):
+        previous = self.tail()
+        if newline:
+            if previous in NEWLINE_AFTER or next_char in NEWLINE_BEFORE:
+                return
+            self.out.append('\n')
+        elif (is_identifier(previous) and is_identifier(next_char)) or \
+                (previous in '+-' and previous == next_char):
+            self.out.append(' ')
+
+
+def minify_js(text):
+    """去掉注释、缩进和多余空白，保留必要的换行；字符串、模板字符串和正则原样保留"""
+    return _JsMinifier(text).run()
+
+
+MINIFIERS = {'.css': minify_css, '.js': minify_js}
+
+
+def minify(path, text):
+    """按扩展名压缩文本，未知类型原样返回"""
+    return MINIFIERS.get(Path(path).suffix, lambda t: t)(text)
+
+
+# ==================== 页面 ====================
+
+def gzip_size(data):
+    return len(gzip.compress(data, compresslevel=9, mtime=0))
+
+
+def inline_json(element_id, data):
+    """JSON 数据岛：转义 </ 以免提前结束 <script>"""
+    text = json.dumps(data, ensure_ascii=False, separators=(',', ':')).replace('</', '<\\/')
+    return f'<script type="application/json" id="{element_id}">{text}</script>'
+
+
+def bundle_page(page_html, site_dir, page_path=PAGE, index_path=None, budget=BUDGET_BYTES):
+    """
+    打包一张页面
+
+    Args:
+        page_html: 页面 HTML（资源引用已改写为部署目录中的路径）
+        site_dir: 部署目录中的站点根（dist/omikuji）
+        page_path: 页面相对于站点根的路径
+        index_path: 要内联的签文索引（相对于站点根），None 表示不内联
+        budget: gzip 后的大小上限（字节），0 表示不检查
+
+    Returns:
+        (打包后的 HTML, 报告)
+
+    Raises:
+        ValueError: 超出大小预算
+    """
+    site_dir = Path(site_dir)
+    report = {'inlined': [], 'preload': [], 'preconnect': []}
+
+    def inline_stylesheet(match):
+        href = html.unescape(match.group(1))
+        if EXTERNAL.match(href):
+            return match.group(0)
+        css = (site_dir / href).read_text(encoding='utf-8')
+        css = rebase_css_urls(minify_css(css), href, page_path)
+        report['inlined'].append(href)
+        return f'<style>{css}</style>'
+
+    page_html = STYLESHEET.sub(inline_stylesheet, page_html)
+
+    if index_path is not None:
+        with open(site_dir / index_path, 'r', encoding='utf-8') as f:
+            island = inline_json(INDEX_ELEMENT_ID, json.load(f))
+        # 放在第一个脚本之前：脚本同步执行，挂载时数据岛必须已经解析
+        body = page_html.index('<body')
+        first_script = page_html.find('<script', body)
+        at = first_script if first_script >= 0 else page_html.index('</body>')
+        page_html = f"{page_html[:at]}{island}\n    {page_html[at:]}"
+        report['inlined'].append(index_path)
+
+    # 外部脚本：head 中提前声明，解析 HTML 时就开始下载。
+    # <script> 没有 crossorigin 属性，preload 和 preconnect 也不能加，否则请求模式不同会下载两次
+    hints = []
+    for src in SCRIPT.findall(page_html):
+        match = EXTERNAL.match(src)
+        if match:
+            origin = '/'.join(src.split('/', 3)[:3])
+            if origin not in report['preconnect']:
+                report['preconnect'].append(origin)
+                hints.append(f'<link rel="preconnect" href="{origin}">')
+        report['preload'].append(src)
+    hints += [f'<link rel="preload" href="{src}" as="script">' for src in report['preload']]
+    if hints:
+        page_html = page_html.replace('</head>', ''.join(f'    {hint}\n' for hint in hints) + '</head>', 1)
+
+    encoded = page_html.encode('utf-8')
+    report['bytes'] = len(encoded)
+    report['gzip_bytes'] = gzip_size(encoded)
+    report['budget_bytes'] = budget
+    if budget and report['gzip_bytes'] > budget:
+        raise ValueError(f"{page_path} gzip 后 {report['gzip_bytes'] / 1024:.1f}KB，"
+                         f"超出首屏预算 {budget / 1024:.1f}KB")
+    return page_html, report
+
+
+def print_report(page_path, report):
+    for path in report['inlined']:
+        print(f"📥 内联 {path}")
+    for origin in report['preconnect']:
+        print(f"🔗 preconnect {origin}")
+    print(f"⏩ preload {len(report['preload'])} 个脚本")
+    budget = f" / 预算 {report['budget_bytes'] / 1024:.1f}KB" if report['budget_bytes'] else ''
+    print(f"📄 {page_path}: {report['bytes'] / 1024:.1f}KB，gzip {report['gzip_bytes'] / 1024:.1f}KB{budget}")
+
+
+def check_budget(output_dir=OUTPUT_DIR, budget=BUDGET_BYTES):
+    """检查部署目录中已打包页面的大小，返回是否在预算内"""
+    page = Path(output_dir) / SITE_DIR / PAGE
+    encoded = page.read_bytes()
+    size = gzip_size(encoded)
+    inlined = f'id="{INDEX_ELEMENT_ID}"'.encode() in encoded
+    print(f"📄 {page}: {len(encoded) / 1024:.1f}KB，gzip {size / 1024:.1f}KB / 预算 {budget / 1024:.1f}KB")
+    if not inlined:
+        print("⚠️  页面中没有内联的签文索引，请先运行 fingerprint_assets.py")
+    if size > budget:
+        print(f"❌ 超出首屏预算 {(size - budget) / 1024:.1f}KB")
+        return False
+    print("✅ 首屏资源在预算内")
+    return True
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="检查首屏页面的大小预算")
+    parser.add_argument('--output', default=OUTPUT_DIR, help="部署目录（默认 dist）")
+    parser.add_argument('--budget', type=float, default=BUDGET_BYTES / 1024, help="gzip 后的大小上限（KB）")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    if not os.path.isdir(Path(args.output) / SITE_DIR):
+        print(f"❌ 部署目录不存在: {args.output}（先运行 python3 fingerprint_assets.py）")
+        sys.exit(1)
+    sys.exit(0 if check_budget(args.output, int(args.budget * 1024)) else 1)
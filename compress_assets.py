@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""
+静态资源预压缩 - 为文本资源生成 .br 和 .gz 副本
+
+以最高压缩级别预先压缩 HTML/CSS/JS/JSON，服务器可以按 Accept-Encoding
+直接发送压缩副本，不必在每次请求时实时压缩。
+中日文字较多的签文 JSON 压缩率很高。
+
+brotli 为可选依赖（pip3 install brotli），未安装时只生成 .gz。
+"""
+
+import argparse
+import gzip
+import os
+import sys
+import time
+from pathlib import Path
+
+from optimize_images import file_sha256, load_manifest, run_jobs, save_manifest
+
+# 需要预压缩的文本资源（相对于项目根目录）
+TEXT_PATTERNS = [
+    "omikuji/*.html",
+    "omikuji/css/*.css",
+    "omikuji/js/*.js",
+    "omikuji/data/*.json",
+    "omikuji/data/fortunes/*.json",
+    "omikuji/data/fortunes/*/*.json",
+    "omikuji/data/fortunes/*.pack",
+]
+
+MANIFEST_FILE = ".build-cache/compress-manifest.json"
+
+# 太小的文件压缩收益抵不过额外的请求头开销
+MIN_SIZE = 256
+
+
+def has_brotli():
+    try:
+        import brotli  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def collect_assets(patterns=TEXT_PATTERNS):
+    files = set()
+    for pattern in patterns:
+        files.update(p for p in Path('.').glob(pattern) if p.is_file())
+    return sorted(files)
+
+
+def _write_variant(path, suffix, payload, original_size):
+    """压缩后更小才写出副本，否则删除旧副本"""
+    target = path.with_name(path.name + suffix)
+    if len(payload) >= original_size:
+        if target.exists():
+            target.unlink()
+        return None
+
+    tmp_file = target.with_name(target.name + '.tmp')
+    with open(tmp_file, 'wb') as f:
+        f.write(payload)
+    os.replace(tmp_file, target)
+    return len(payload)
+
+
+def _compress_one(job):
+    """以最高级别压缩单个文件（在子进程中执行）"""
+    path, use_brotli = job
+    path = Path(path)
+    try:
+        raw = path.read_bytes()
+        sizes = {'original': len(raw)}
+
+        # mtime=0 让相同内容生成相同的 .gz，避免无意义的缓存失效
+        sizes['gz'] = _write_variant(path, '.gz', gzip.compress(raw, compresslevel=9, mtime=0), len(raw))
+
+        if use_brotli:
+            import brotli
+            payload = brotli.compress(raw, mode=brotli.MODE_TEXT, quality=11, lgwin=24)
+            sizes['br'] = _write_variant(path, '.br', payload, len(raw))
+
+        return {'path': str(path), 'sizes': sizes, 'error': None}
+    except Exception as e:
+        return {'path': str(path), 'error': str(e)}
+
+
+def compress_assets(patterns=TEXT_PATTERNS, workers=None, manifest_path=MANIFEST_FILE, force=False):
+    """
+    预压缩文本资源
+
+    Args:
+        patterns: 资源 glob 列表
+        workers: 并行进程数（默认全部核心）
+        manifest_path: 内容哈希清单，源文件未变化时跳过
+        force: 忽略清单全部重新压缩
+
+    Returns:
+        {源文件路径: {'original': 字节, 'gz': 字节或 None, 'br': 字节或 None}}
+    """
+    use_brotli = has_brotli()
+    workers = workers or os.cpu_count() or 1
+    manifest = load_manifest(manifest_path)
+
+    if not use_brotli:
+        print("⚠️  未安装 brotli，只生成 .gz（pip3 install brotli）")
+
+    start = time.perf_counter()
+    jobs = []
+    source_hashes = {}
+    report = {}
+    for path in collect_assets(patterns):
+        if path.stat().st_size < MIN_SIZE:
+            continue
+        key = path.as_posix()
+        source_hash = file_sha256(path)
+        entry = manifest.get(key)
+        expected = [s for s in ('gz', 'br') if entry and entry['sizes'].get(s)]
+        if (not force and entry and entry['sha256'] == source_hash
+                and entry['brotli'] == use_brotli
+                and all(path.with_name(f"{path.name}.{s}").exists() for s in expected)):
+            report[key] = entry['sizes']
+            continue
+
+        source_hashes[key] = source_hash
+        jobs.append((key, use_brotli))
+
+    skipped = len(report)
+    for result in run_jobs(_compress_one, jobs, workers):
+        if result['error']:
+            print(f"✗ {result['path']}: 错误 - {result['error']}")
+            continue
+        key = result['path']
+        report[key] = result['sizes']
+        manifest[key] = {'sha256': source_hashes[key], 'brotli': use_brotli, 'sizes': result['sizes']}
+
+    save_manifest(manifest_path, manifest)
+    elapsed = time.perf_counter() - start
+
+    print(f"{'文件':<52} {'原始':>9} {'gzip':>9} {'brotli':>9}")
+    print("-" * 82)
+    totals = {'original': 0, 'gz': 0, 'br': 0}
+    for key in sorted(report):
+        sizes = report[key]
+        totals['original'] += sizes['original']
+        for kind in ('gz', 'br'):
+            totals[kind] += sizes.get(kind) or sizes['original']
+        cells = [f"{sizes[k]/1024:.1f}KB" if sizes.get(k) else '-' for k in ('original', 'gz', 'br')]
+        print(f"{key:<52} {cells[0]:>9} {cells[1]:>9} {cells[2]:>9}")
+    print("-" * 82)
+    if totals['original']:
+        print(f"📊 合计 {totals['original']/1024:.1f}KB → gzip {totals['gz']/1024:.1f}KB"
+              f"（{totals['gz']/totals['original']*100:.1f}%）"
+              + (f"，brotli {totals['br']/1024:.1f}KB（{totals['br']/totals['original']*100:.1f}%）"
+                 if use_brotli else ''))
+    print(f"✅ 压缩 {len(report) - skipped} 个文件，跳过 {skipped} 个未变化的文件，耗时 {elapsed:.2f}s")
+
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="预压缩静态文本资源（.br / .gz）")
+    parser.add_argument('-j', '--workers', type=int, default=None, help="并行进程数（默认全部核心）")
+    parser.add_argument('--force', action='store_true', help="忽略哈希清单，全部重新压缩")
+    args = parser.parse_args()
+
+    os.chdir(Path(__file__).resolve().parent)
+    compress_assets(workers=args.workers, force=args.force)
+    sys.exit(0)
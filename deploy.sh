@@ -60,6 +60,30 @@ echo ""
 echo "━━━━━━━━━━━━━━━━━━━━━━━━━━"
 echo ""
 
+# 校验签文数据和图片（签号齐全、签级有效、图片完整），有错误时中止部署
+if command -v python3 &> /dev/null; then
+    echo "🔍 校验签文数据..."
+    if ! python3 verify_dataset.py --fail-fast; then
+        echo ""
+        echo "❌ 数据校验失败，已中止部署"
+        exit 1
+    fi
+    echo ""
+fi
+
+# 生成带内容指纹的部署目录（资源文件名随内容变化，可以放心长期缓存）
+DEPLOY_DIR="dist"
+echo "🔖 生成部署目录 $DEPLOY_DIR/ ..."
+if ! python3 fingerprint_assets.py --output "$DEPLOY_DIR"; then
+    echo "❌ 生成部署目录失败，已中止部署"
+    exit 1
+fi
+# 沿用项目根目录的 Vercel 项目关联
+if [ -d .vercel ]; then
+    cp -r .vercel "$DEPLOY_DIR/"
+fi
+echo ""
+
 # 部署选项
 echo "🌐 部署选项："
 echo "  1) 预览部署（开发环境）"
@@ -72,12 +96,12 @@ case $deploy_choice in
     1)
         echo ""
         echo "🔨 开始预览部署..."
-        vercel
+        vercel "$DEPLOY_DIR"
         ;;
     2)
         echo ""
         echo "🚀 开始生产部署..."
-        vercel --prod
+        vercel "$DEPLOY_DIR" --prod
         ;;
     *)
         echo "❌ 无效选择"
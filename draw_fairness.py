@@ -0,0 +1,479 @@
+#!/usr/bin/env python3
+"""
+抽签公平性模拟 - NumPy 向量化的蒙特卡洛检验
+
+用 NumPy 重新实现各抽签算法，一次模拟上亿次抽签，统计每支签和每个签级的频数，
+用卡方检验判断结果是否符合预期分布：
+
+  client      app.js 的 drawFortune()：排除「凶」，
+              下标 = (Date.now() % 1000 + floor(Math.random() × n)) % n
+  server:*    fortune_draw.py 的别名表抽样（/api/draw），使用 DrawService 构建的同一张表
+  clock       对照组：只用时间戳，下标 = Date.now() % n（1000 不能被 n 整除，分布有偏），
+              用来确认检验能发现这种程度的偏差
+
+每种算法做两项卡方检验，都通过时报告的 ok 为 true：
+  公平性    每支签 / 每个签级的频数与「候选签内按权重均匀」的期望一致，即算法本身没有偏差
+  签级规格  签级分布与 generate_fortunes.py 的 LEVEL_MAPPING（排除该算法不抽的签级）一致，
+            即抽到各签级的概率符合对外公布的比例；公平的算法在签级数据与规格不同时
+            （verify_dataset.py 也会提示）同样不符，报告的 findings 列出偏差最大的签级
+
+判定规则（本脚本和 build.py 的 fairness 阶段相同，见 failed_algorithms()）：
+算法有偏差时失败（退出码 1 / 构建失败）；签级规格不符属于签级数据的问题，
+列入 findings 并给出警告，不判为失败，加 --strict 时同样判为失败。
+
+Date.now() % 1000 按均匀分布模拟（毫秒部分与用户何时摇签无关）。
+默认固定随机种子，结果可复现；修改抽签规则后运行即可。
+
+用法：
+  python3 draw_fairness.py                      # 1 亿次抽签，报告写入 .build-cache/reports/
+  python3 draw_fairness.py -n 500000000 --seed 7
+  python3 draw_fairness.py --weights 大吉:2      # 检验带签级权重的服务端抽签
+  python3 draw_fairness.py -o -                 # 报告输出到标准输出
+  python3 draw_fairness.py --strict             # 签级规格不符时也返回 1
+
+依赖 NumPy（pip3 install numpy）。
+"""
+
+import argparse
+import importlib.util
+import json
+import math
+import os
+import sys
+import time
+from collections import Counter
+from datetime import datetime
+from pathlib import Path
+
+from fortune_draw import INDEX_FILE, MODES, UNLUCKY_LEVELS, DrawService, normalize_level, parse_weights
+
+ROOT = Path(__file__).resolve().parent
+REPORT_DIR = ".build-cache/reports"
+
+DEFAULT_DRAWS = 100_000_000
+DEFAULT_SEED = 20260101
+# 每批模拟的抽签数（内存约为 CHUNK × 24 字节）
+CHUNK = 1 << 22
+# 显著性水平：p 值低于该值视为分布不符
+ALPHA = 0.001
+
+# 与 app.js 的 drawFortune() 保持一致：只排除「凶」
+CLIENT_EXCLUDED = {'凶'}
+# app.js 中 Date.now() % 1000
+CLOCK_MODULUS = 1000
+# findings 中每种算法列出的偏差最大的签级数
+FINDING_LEVELS = 3
+
+
+# ==================== 统计 ====================
+
+def chi2_sf(statistic, dof):
+    """卡方分布的上尾概率 P(X ≥ statistic)，即正则化上不完全伽马函数 Q(dof/2, statistic/2)"""
+    if dof <= 0:
+        return 1.0
+    if statistic <= 0:
+        return 1.0
+    a, x = dof / 2, statistic / 2
+    log_prefix = -x + a * math.log(x) - math.lgamma(a)
+
+    if x < a + 1:
+        # 级数展开求 P，再取 1 - P
+        term = total = 1 / a
+        k = a
+        while abs(term) > abs(total) * 1e-15:
+            k += 1
+            term *= x / k
+            total += term
+        return max(0.0, 1 - total * math.exp(log_prefix))
+
+    # 连分式（Lentz 算法）直接求 Q
+    tiny = 1e-300
+    b = x + 1 - a
+    c = 1 / tiny
+    d = 1 / b
+    h = d
+    for i in range(1, 10_000):
+        an = -i * (i - a)
+        b += 2
+        d = an * d + b
+        d = tiny if abs(d) < tiny else d
+        c = b + an / c
+        c = tiny if abs(c) < tiny else c
+        d = 1 / d
+        delta = d * c
+        h *= delta
+        if abs(delta - 1) < 1e-15:
+            break
+    return min(1.0, math.exp(log_prefix) * h)
+
+
+def chi_square(observed, expected_probs):
+    """
+    Pearson 卡方拟合优度检验
+
+    Returns:
+        {'statistic', 'dof', 'p_value', 'unexpected'}；期望为 0 的格子不参与统计量，
+        其中的观测数记为 unexpected，只要不为 0 分布就不符（p_value 为 0）
+    """
+    total = sum(observed)
+    statistic = 0.0
+    cells = 0
+    unexpected = 0
+    for count, p in zip(observed, expected_probs):
+        if p <= 0:
+            unexpected += count
+            continue
+        expected = total * p
+        statistic += (count - expected) ** 2 / expected
+        cells += 1
+    dof = cells - 1
+    p_value = 0.0 if unexpected else chi2_sf(statistic, dof)
+    return {'statistic': round(statistic, 3), 'dof': dof, 'p_value': p_value, 'unexpected': unexpected}
+
+
+def load_level_mapping():
+    """读取 generate_fortunes.py 的 LEVEL_MAPPING，返回 {中文签级: 签数}"""
+    spec = importlib.util.spec_from_file_location(
+        "generate_fortunes", ROOT / "omikuji/generate_fortunes.py")
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return Counter({module.LEVEL_CHINESE[key]: len(ids) for key, ids in module.LEVEL_MAPPING.items()})
+
+
+# ==================== 算法 ====================
+
+class Algorithm:
+    """
+    一种抽签算法
+
+    Attributes:
+        candidates: 可能抽到的签（下标即 sample() 返回的下标）
+        weights: 每支候选签的期望权重（公平时的分布）
+        excluded: 不参与抽签的签级（用于计算签级规格）
+        level_weights: 签级权重（用于计算签级规格）
+    """
+
+    control = False
+
+    def __init__(self, name, description, candidates, weights, excluded, level_weights=None):
+        self.name = name
+        self.description = description
+        self.candidates = candidates
+        self.weights = weights
+        self.excluded = set(excluded)
+        self.level_weights = dict(level_weights or {})
+
+    def sample(self, rng, count):
+        raise NotImplementedError
+
+
+class ClientDraw(Algorithm):
+    """app.js 的 drawFortune()"""
+
+    def __init__(self, fortunes):
+        pool = [f for f in fortunes if f['level'] not in CLIENT_EXCLUDED]
+        super().__init__('client', "app.js drawFortune()：(Date.now() % 1000 + floor(Math.random() × n)) % n",
+                         pool, [1.0] * len(pool), CLIENT_EXCLUDED)
+
+    def sample(self, rng, count):
+        import numpy as np
+
+        n = len(self.candidates)
+        timestamp = rng.integers(0, CLOCK_MODULUS, count)
+        random_index = (rng.random(count) * n).astype(np.int64)
+        return (timestamp + random_index) % n
+
+
+class ClockDraw(ClientDraw):
+    """对照组：去掉 Math.random() 后只剩时间戳"""
+
+    control = True
+
+    def __init__(self, fortunes):
+        super().__init__(fortunes)
+        self.name = 'clock'
+        self.description = "对照组：Date.now() % n（不含随机数）"
+
+    def sample(self, rng, count):
+        return rng.integers(0, CLOCK_MODULUS, count) % len(self.candidates)
+
+
+class ServerDraw(Algorithm):
+    """fortune_draw.py 的别名表抽样，与 AliasSampler.sample() 相同"""
+
+    def __init__(self, fortunes, mode, mapping, weights=None):
+        import numpy as np
+
+        service = DrawService(fortunes)
+        sampler = service.sampler(mode, weights)
+        merged = {**service.level_weights, **(weights or {})}
+        # 按规格中的全部签级判断该模式排除哪些，数据中没有的签级（如大凶）也要排除出规格
+        levels = set(mapping) | {f['level'] for f in service.fortunes}
+        super().__init__(f'server:{mode}', f"fortune_draw.py /api/draw?mode={mode}（别名表）",
+                         sampler.items, [merged.get(f['level'], 1.0) for f in sampler.items],
+                         {level for level in levels if not MODES[mode]({'level': level})}, merged)
+        self.prob = np.array(sampler.prob)
+        self.alias = np.array(sampler.alias, dtype=np.int64)
+
+    def sample(self, rng, count):
+        import numpy as np
+
+        u = rng.random(count) * len(self.candidates)
+        i = u.astype(np.int64)
+        return np.where(u - i < self.prob[i], i, self.alias[i])
+
+
+def build_algorithms(fortunes, mapping, weights=None):
+    algorithms = [ClientDraw(fortunes)]
+    algorithms += [ServerDraw(fortunes, mode, mapping, weights) for mode in MODES]
+    algorithms.append(ClockDraw(fortunes))
+    return algorithms
+
+
+# ==================== 模拟 ====================
+
+def simulate(algorithm, draws, rng, chunk=CHUNK):
+    """分批抽样并累计每支候选签的频数，返回 (频数列表, 耗时)"""
+    import numpy as np
+
+    n = len(algorithm.candidates)
+    counts = np.zeros(n, dtype=np.int64)
+    start = time.perf_counter()
+    remaining = draws
+    while remaining:
+        size = min(chunk, remaining)
+        counts += np.bincount(algorithm.sample(rng, size), minlength=n)
+        remaining -= size
+    return counts.tolist(), time.perf_counter() - start
+
+
+def analyze(algorithm, counts, seconds, mapping, alpha=ALPHA):
+    """根据频数计算每支签、每个签级的分布和卡方检验"""
+    draws = sum(counts)
+    total_weight = sum(algorithm.weights)
+    probs = [w / total_weight for w in algorithm.weights]
+
+    ids = []
+    max_z = 0.0
+    for fortune, count, p in zip(algorithm.candidates, counts, probs):
+        expected = draws * p
+        z = (count - expected) / math.sqrt(expected * (1 - p)) if 0 < p < 1 else 0.0
+        max_z = max(max_z, abs(z))
+        ids.append({'id': fortune['id'], 'level': fortune['level'], 'count': count,
+                    'share': count / draws, 'expected_share': p, 'z': round(z, 3)})
+
+    level_counts = Counter()
+    level_probs = Counter()
+    for fortune, count, p in zip(algorithm.candidates, counts, probs):
+        level_counts[fortune['level']] += count
+        level_probs[fortune['level']] += p
+
+    # 签级规格：LEVEL_MAPPING 中各签级的签数 × 权重，排除该算法不抽的签级
+    spec = {level: count * algorithm.level_weights.get(level, 1.0)
+            for level, count in mapping.items() if level not in algorithm.excluded}
+    spec_total = sum(spec.values())
+    spec_probs = {level: w / spec_total for level, w in spec.items()}
+
+    levels = sorted(set(level_counts) | set(spec_probs), key=lambda level: -spec_probs.get(level, 0))
+    by_level = {level: {'count': level_counts[level],
+                        'share': level_counts[level] / draws,
+                        'expected_share': level_probs[level],
+                        'spec_share': spec_probs.get(level, 0.0)} for level in levels}
+
+    chi2_ids = chi_square(counts, probs)
+    chi2_levels = chi_square([level_counts[level] for level in levels], [level_probs[level] for level in levels])
+    chi2_spec = chi_square([level_counts[level] for level in levels], [spec_probs.get(level, 0.0) for level in levels])
+    fair = chi2_ids['p_value'] >= alpha and chi2_levels['p_value'] >= alpha
+    matches_spec = chi2_spec['p_value'] >= alpha
+    # 与规格偏差最大的签级（按占比差的绝对值）
+    deviations = sorted(by_level.items(), key=lambda item: -abs(item[1]['share'] - item[1]['spec_share']))
+    spec_deviations = [{'level': level, 'share': v['share'], 'spec_share': v['spec_share']}
+                       for level, v in deviations[:FINDING_LEVELS]]
+
+    return {
+        'description': algorithm.description,
+        'control': algorithm.control,
+        'candidates': len(algorithm.candidates),
+        'excluded_levels': sorted(algorithm.excluded),
+        'draws': draws,
+        'seconds': round(seconds, 3),
+        'draws_per_second': round(draws / seconds) if seconds > 0 else None,
+        'chi2_ids': chi2_ids,
+        'chi2_levels': chi2_levels,
+        'chi2_spec': chi2_spec,
+        'max_abs_z': round(max_z, 3),
+        'fair': fair,
+        'matches_spec': matches_spec,
+        'spec_deviations': spec_deviations,
+        'levels': by_level,
+        'ids': ids,
+    }
+
+
+def run(draws=DEFAULT_DRAWS, seed=DEFAULT_SEED, index_file=INDEX_FILE, weights=None,
+        algorithms=None, alpha=ALPHA):
+    """
+    模拟全部（或指定的）抽签算法
+
+    Returns:
+        报告字典（除对照组外的算法）：
+          fair          全部通过公平性检验
+          matches_spec  签级分布全部符合 LEVEL_MAPPING
+          ok            两项都通过
+          findings      未通过的检验，每条一句说明
+    """
+    import numpy as np
+
+    with open(index_file, 'r', encoding='utf-8') as f:
+        fortunes = [dict(f, level=normalize_level(f['level'])) for f in json.load(f)['fortunes']]
+    fortunes.sort(key=lambda f: f['id'])
+    mapping = load_level_mapping()
+
+    selected = build_algorithms(fortunes, mapping, weights)
+    if algorithms:
+        unknown = set(algorithms) - {a.name for a in selected}
+        if unknown:
+            raise ValueError(f"未知算法: {', '.join(sorted(unknown))}（可选 {', '.join(a.name for a in selected)}）")
+        selected = [a for a in selected if a.name in algorithms]
+
+    results = {}
+    for i, algorithm in enumerate(selected):
+        # 每种算法独立的随机流，增减算法不影响其他算法的结果
+        rng = np.random.Generator(np.random.PCG64([seed, i]))
+        counts, seconds = simulate(algorithm, draws, rng)
+        results[algorithm.name] = analyze(algorithm, counts, seconds, mapping, alpha)
+
+    checked = {name: r for name, r in results.items() if not r['control']}
+    fair = all(r['fair'] for r in checked.values())
+    matches_spec = all(r['matches_spec'] for r in checked.values())
+    return {
+        'generated': datetime.now().isoformat(timespec='seconds'),
+        'index_file': str(index_file),
+        'seed': seed,
+        'draws': draws,
+        'alpha': alpha,
+        'weights': weights or {},
+        'level_mapping': dict(mapping),
+        'unlucky_levels': sorted(UNLUCKY_LEVELS),
+        'ok': fair and matches_spec,
+        'fair': fair,
+        'matches_spec': matches_spec,
+        'findings': findings(checked, alpha),
+        'algorithms': results,
+    }
+
+
+def findings(results, alpha=ALPHA):
+    """把未通过的检验整理成说明文字"""
+    notes = []
+    for name, r in results.items():
+        if not r['fair']:
+            notes.append(f"{name}: 抽签有偏差（签号 p={r['chi2_ids']['p_value']:.3g}，"
+                         f"签级 p={r['chi2_levels']['p_value']:.3g}，最大偏离 {r['max_abs_z']}σ）")
+        if not r['matches_spec']:
+            levels = '，'.join(f"{d['level']} {d['share']*100:.2f}%（规格 {d['spec_share']*100:.2f}%）"
+                              for d in r['spec_deviations'])
+            notes.append(f"{name}: 签级分布与 LEVEL_MAPPING 不符（χ²={r['chi2_spec']['statistic']}，"
+                         f"p={r['chi2_spec']['p_value']:.3g} < {alpha}）：{levels}")
+    return notes
+
+
+def failed_algorithms(report, strict=False):
+    """判为失败的算法（不含对照组）：有偏差的算法；strict 时还包括签级规格不符的算法"""
+    return [name for name, r in report['algorithms'].items()
+            if not r['control'] and (not r['fair'] or (strict and not r['matches_spec']))]
+
+
+def numpy_available():
+    try:
+        import numpy  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def print_report(report, strict=False):
+    print(f"🎲 每种算法 {report['draws']:,} 次抽签，种子 {report['seed']}，显著性水平 {report['alpha']}")
+    print("-" * 50)
+    for name, result in report['algorithms'].items():
+        if result['fair'] and result['matches_spec']:
+            mark = '✅'
+        elif result['control'] or (result['fair'] and not strict):
+            mark = '⚠️ '
+        else:
+            mark = '❌'
+        suffix = '（对照组）' if result['control'] else ''
+        print(f"{mark} {name}{suffix}: {result['description']}")
+        print(f"   {result['candidates']} 支候选签，{result['draws_per_second']:,} 次/秒；"
+              f"签号 χ²={result['chi2_ids']['statistic']} (df={result['chi2_ids']['dof']}, "
+              f"p={result['chi2_ids']['p_value']:.4g})，签级 p={result['chi2_levels']['p_value']:.4g}，"
+              f"最大偏离 {result['max_abs_z']}σ")
+        shares = '，'.join(f"{level} {v['share']*100:.2f}%/{v['spec_share']*100:.2f}%"
+                          for level, v in result['levels'].items())
+        print(f"   签级 实际/规格: {shares}")
+        spec = result['chi2_spec']
+        unexpected = f"，{spec['unexpected']:,} 次抽到规格外的签级" if spec['unexpected'] else ''
+        print(f"   签级规格 χ²={spec['statistic']} (df={spec['dof']}, p={spec['p_value']:.4g}){unexpected}")
+    print("-" * 50)
+    print("✅ 抽签算法无偏差" if report['fair'] else "❌ 有算法未通过公平性检验")
+    if report['matches_spec']:
+        print("✅ 签级分布符合 LEVEL_MAPPING")
+    elif strict:
+        print("❌ 签级分布与 LEVEL_MAPPING 不符")
+    else:
+        print("⚠️  签级分布与 LEVEL_MAPPING 不符（签级数据的问题，不判为失败；--strict 时判为失败）")
+    for note in report['findings']:
+        print(f"   - {note}")
+
+
+def write_report(report, output):
+    if output == '-':
+        json.dump(report, sys.stdout, ensure_ascii=False, indent=2)
+        print()
+        return None
+    path = Path(output) if output else Path(REPORT_DIR) / f"draw_fairness-{datetime.now():%Y%m%d-%H%M%S}.json"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(path.name + '.tmp')
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+    return path
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="抽签公平性蒙特卡洛模拟")
+    parser.add_argument('algorithms', nargs='*', help="要模拟的算法（默认全部）: client, server:lucky, server:all, clock")
+    parser.add_argument('-n', '--draws', type=int, default=DEFAULT_DRAWS, help="每种算法的抽签次数")
+    parser.add_argument('--seed', type=int, default=DEFAULT_SEED, help="随机种子")
+    parser.add_argument('--index', default=INDEX_FILE, help="签文索引（split_fortunes.py 的输出）")
+    parser.add_argument('--weights', default=None, help="服务端抽签的签级权重，如 大吉:2,吉:1")
+    parser.add_argument('--alpha', type=float, default=ALPHA, help="显著性水平")
+    parser.add_argument('--strict', action='store_true',
+                        help="签级分布与 LEVEL_MAPPING 不符时也返回 1（默认只警告）")
+    parser.add_argument('-o', '--output', default=None,
+                        help=f"JSON 报告路径（默认 {REPORT_DIR}/draw_fairness-<时间>.json，- 输出到标准输出）")
+    return parser.parse_args(argv)
+
+
+def main(args):
+    if not numpy_available():
+        print("❌ 错误：未安装 NumPy 库")
+        print("请运行: pip3 install numpy")
+        return 1
+    try:
+        report = run(args.draws, args.seed, args.index, parse_weights(args.weights),
+                     args.algorithms or None, args.alpha)
+    except (OSError, ValueError, KeyError) as e:
+        print(f"❌ 模拟失败: {e}")
+        return 1
+
+    if args.output != '-':
+        print_report(report, args.strict)
+    path = write_report(report, args.output)
+    if path:
+        print(f"📋 报告: {path}")
+    return 1 if failed_algorithms(report, args.strict) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(parse_args()))
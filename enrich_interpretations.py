@@ -3,214 +3,354 @@
 根据签诗和逐句解释丰富现代释义
 """
 
+import argparse
+import hashlib
 import json
+import os
+import re
+import time
 
-DATA_FILE = "omikuji/data/senso-ji-fortunes-full.json"
-
+from instrumentation import add_profile_argument, instrument, stage
+from optimize_images import run_jobs, write_fortune_json
 
-def generate_interpretation(fortune):
-    """根据签诗生成更丰富的释义"""
+DATA_FILE = "omikuji/data/senso-ji-fortunes-full.json"
 
-    level = fortune['level']
-    poem_lines = fortune['poem']['lines']
-    line_interp = fortune['poem'].get('lineInterpretations', [])
-    existing = fortune['interpretation']
-
-    # 主题提取（从诗句中关键词）
-    all_text = ''.join(poem_lines)
-    sentiment = 'positive'
-    if level in ['凶', '末小吉']:
-        sentiment = 'negative'
-    elif any(kw in all_text for kw in ['愁', '损', '失', '阻', '忧']):
-        sentiment = 'cautious'
-
-    # 完全重新生成所有释义
-    summary = generate_summary(level, poem_lines, line_interp, sentiment)
-    career = generate_career(level, poem_lines, sentiment)
-    love = generate_love(level, poem_lines, sentiment)
-    health = generate_health(level, poem_lines, sentiment)
-    advice = generate_advice(level, poem_lines, sentiment)
-    story = generate_story(level, poem_lines, line_interp)
 
+# ==================== 释义模板 ====================
+# 模板和关键词表在导入时编译一次（见 compile_profiles / ThemeMatcher），
+# 生成释义时只做查表和一次诗句扫描。
+
+SUMMARY_TEMPLATES = {
+    '大吉': [
+        "此签大吉。运势如日中天，所求皆顺。{theme}，宜积极进取把握良机。",
+        "此签上上大吉。天时地利人和齐聚，{theme}，正当其时大展宏图。",
+        "大吉之兆。祥瑞降临，{theme}，诸事顺遂，功成名就可期。"
+    ],
+    '吉': [
+        "此签为吉。运势良好，{theme}，稳步向前必有所获。",
+        "吉兆。时机渐熟，{theme}，保持专注向好而行。",
+        "吉签。顺中有进，{theme}，持之以恒可见成果。"
+    ],
+    '末吉': [
+        "此签末吉。初始平缓，{theme}，耐心等待后福可期。",
+        "末吉之兆。先难后易，{theme}，积蓄力量待时而动。"
+    ],
+    '小吉': [
+        "此签小吉。平稳向好，{theme}，小步积累渐进改善。",
+        "小吉之兆。微福渐至，{theme}，稳扎稳打自有收获。"
+    ],
+    '半吉': [
+        "此签半吉。吉凶参半，{theme}，需谨慎权衡步步为营。",
+        "半吉之兆。喜忧并存，{theme}，宜静观其变灵活应对。"
+    ],
+    '末小吉': [
+        "此签末小吉。转吉之前，{theme}，坚守本分静待转机。",
+        "末小吉之兆。黎明前暗，{theme}，韬光养晦等待时机。"
+    ],
+    '凶': [
+        "此签为凶。运势欠佳，{theme}，宜守不宜动多作检讨。",
+        "凶兆。阻碍重重，{theme}，低调行事修身养性。",
+        "凶签。前路多艰，{theme}，耐心等待雨过天晴。"
+    ]
+}
+
+# 事业财运
+CAREER_TEXT = {
+    '大吉': "事业运势旺盛，贵人相助，升职加薪机会降临。财运亨通，投资理财皆有利可图。把握当前良机，大胆施展抱负。",
+    '吉': "事业稳步发展，工作顺利获得认可。财运平稳，正财稳定，可适度理财。保持专注，持续努力必有回报。",
+    '末吉': "事业平稳向好，小有进展。财运平平，收支平衡，宜稳中求进。耐心积累，渐进改善。",
+    '小吉': "事业平稳向好，小有进展。财运平平，收支平衡，宜稳中求进。耐心积累，渐进改善。",
+    '半吉': "事业喜忧参半，需谨慎决策。财运起伏，避免冒险投资，稳守为上。",
+    '末小吉': "事业处于低潮期，宜保持低调。财运不佳，避免重大开支，静待转机。",
+    '凶': "事业运势低迷，阻碍较多，宜稳守现状。财运不佳，避免投资投机，谨慎理财。修身养性等待时机好转。",
+}
+
+# 感情姻缘
+LOVE_TEXT = {
+    '大吉': "感情运极佳，单身者桃花旺，有望遇见良缘。有伴侣者感情升温，关系更近一步，婚嫁事宜顺遂。",
+    '吉': "感情运势良好，单身者有机会认识心仪对象。有伴侣者相处和睦，关系稳定发展。",
+    '末吉': "感情平稳渐进，单身者不必强求，缘分自然来。有伴侣者维持现状，细水长流。",
+    '小吉': "感情平稳渐进，单身者不必强求，缘分自然来。有伴侣者维持现状，细水长流。",
+    '半吉': "感情运势起伏，需多沟通理解。避免冲动决定，给彼此一些空间。",
+    '末小吉': "感情处于平淡期，不宜急于求成。单身者耐心等待，有伴侣者多包容体谅。",
+    '凶': "感情运势低迷，易生误会争执。单身者暂缓追求，有伴侣者需冷静处理问题，多沟通少指责。",
+}
+
+# 健康平安（末小吉与凶相同）
+HEALTH_TEXT = {
+    '大吉': "身体状况良好，精神饱满。保持规律作息和适度运动，健康运势佳。",
+    '吉': "身体状况良好，精神饱满。保持规律作息和适度运动，健康运势佳。",
+    '末吉': "健康状况平稳，注意劳逸结合。适度休息，避免过度劳累。",
+    '小吉': "健康状况平稳，注意劳逸结合。适度休息，避免过度劳累。",
+    '半吉': "健康运势一般，注意小病小痛。保持良好作息，饮食清淡。",
+    '凶': "健康运势欠佳，注意身体保养。避免过度劳累，保持心情愉悦，定期检查。",
+}
+
+# 建议（末小吉与凶相同）
+ADVICE_TEXT = {
+    '大吉': "把握当下好运，积极进取。保持谦逊态度，广结善缘，为未来持续积累福气。",
+    '吉': "把握当下好运，积极进取。保持谦逊态度，广结善缘，为未来持续积累福气。",
+    '末吉': "稳步前行，不急不躁。积累经验和资源，为更好的机会做准备。",
+    '小吉': "稳步前行，不急不躁。积累经验和资源，为更好的机会做准备。",
+    '半吉': "谨慎决策，权衡利弊。保持冷静，灵活应对变化，稳中求进。",
+    '凶': "低调行事，韬光养晦。修身养性，反思总结，等待运势好转再行动。",
+}
+
+# 主题关键词，按优先级排列：诗中出现多个关键词时取排在前面的
+THEME_MAP = {
+    '云': '云开雾散，前景光明',
+    '月': '明月当空，清辉普照',
+    '花': '花开富贵，事业兴旺',
+    '春': '枯木逢春，否极泰来',
+    '山': '高山仰止，步步高升',
+    '水': '顺风顺水，一帆风顺',
+    '风': '风生水起，运势亨通',
+    '宝': '珍宝现世，福缘深厚',
+    '塔': '七级浮屠，功德圆满',
+    '龙': '龙腾云起，飞黄腾达',
+    '舟': '扬帆起航，前程远大'
+}
+
+DEFAULT_THEME = "运势通达"
+
+# 签数超过该值时才值得启动进程池
+PARALLEL_MIN = 2000
+
+# 修改生成逻辑（不只是模板文字）后递增，让所有签的指纹失效
+GENERATOR_VERSION = 1
+
+
+class ThemeMatcher:
+    """
+    把全部主题关键词编译成一个正则，一次扫描诗句即可找出优先级最高的主题
+
+    多个关键词从同一位置开始时取较长的一个。
+    """
+
+    def __init__(self, theme_map=THEME_MAP, default=DEFAULT_THEME):
+        self.priority = {keyword: i for i, keyword in enumerate(theme_map)}
+        self.themes = list(theme_map.values())
+        self.default = default
+        keywords = sorted(theme_map, key=len, reverse=True)
+        self.pattern = re.compile('|'.join(map(re.escape, keywords)))
+
+    def match(self, poem_lines):
+        best = None
+        # 用换行连接，避免多字关键词跨句匹配
+        for keyword in self.pattern.findall('\n'.join(poem_lines)):
+            rank = self.priority[keyword]
+            if best is None or rank < best:
+                best = rank
+                if rank == 0:
+                    break
+        return self.default if best is None else self.themes[best]
+
+
+def compile_profiles():
+    """
+    预先拼好每个签级的全部释义文本
+
+    Returns:
+        (profiles, default)：profiles 为 {签级: 档案}，未知签级使用 default。
+        档案中的 summary 拆成主题前后两段，生成时只需拼接。
+    """
+    def profile(summary_level, level):
+        prefix, _, suffix = SUMMARY_TEMPLATES[summary_level][0].partition('{theme}')
+        return {
+            'summary': (prefix, suffix),
+            'career': CAREER_TEXT.get(level, CAREER_TEXT['凶']),
+            'love': LOVE_TEXT.get(level, LOVE_TEXT['凶']),
+            'health': HEALTH_TEXT.get(level, HEALTH_TEXT['凶']),
+            'advice': ADVICE_TEXT.get(level, ADVICE_TEXT['凶']),
+        }
+
+    profiles = {level: profile(level, level) for level in SUMMARY_TEMPLATES}
+    # 未知签级：总体运势按吉，其余按凶（与原先 if/else 的兜底分支一致）
+    return profiles, profile('吉', None)
+
+
+PROFILES, DEFAULT_PROFILE = compile_profiles()
+THEME_MATCHER = ThemeMatcher()
+
+# 生成器版本 + 全部模板的摘要：修改任一模板文字都会让指纹变化
+GENERATOR_DIGEST = hashlib.sha256(json.dumps(
+    [GENERATOR_VERSION, SUMMARY_TEMPLATES, CAREER_TEXT, LOVE_TEXT, HEALTH_TEXT, ADVICE_TEXT, THEME_MAP, DEFAULT_THEME],
+    ensure_ascii=False, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def fingerprint(fortune):
+    """
+    释义输入的内容指纹：签级、诗句、逐句解释和生成器版本
+
+    保存在签的 interpretationFingerprint 字段中，与当前值一致时释义无需重新生成。
+    """
+    poem = fortune['poem']
+    payload = json.dumps(
+        [GENERATOR_DIGEST, fortune['level'], poem['lines'], poem.get('lineInterpretations', [])],
+        ensure_ascii=False, separators=(',', ':'))
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:16]
+
+
+def _interpret(level, poem_lines, line_interp):
+    profile = PROFILES.get(level, DEFAULT_PROFILE)
+    prefix, suffix = profile['summary']
     return {
-        'summary': summary,
-        'career': career,
-        'love': love,
-        'health': health,
-        'advice': advice,
-        'story': story
+        'summary': prefix + THEME_MATCHER.match(poem_lines) + suffix,
+        'career': profile['career'],
+        'love': profile['love'],
+        'health': profile['health'],
+        'advice': profile['advice'],
+        'story': generate_story(level, poem_lines, line_interp)
     }
 
 
-def generate_summary(level, poem_lines, line_interp, sentiment):
-    """生成总体运势"""
-    templates = {
-        '大吉': [
-            "此签大吉。运势如日中天，所求皆顺。{theme}，宜积极进取把握良机。",
-            "此签上上大吉。天时地利人和齐聚，{theme}，正当其时大展宏图。",
-            "大吉之兆。祥瑞降临，{theme}，诸事顺遂，功成名就可期。"
-        ],
-        '吉': [
-            "此签为吉。运势良好，{theme}，稳步向前必有所获。",
-            "吉兆。时机渐熟，{theme}，保持专注向好而行。",
-            "吉签。顺中有进，{theme}，持之以恒可见成果。"
-        ],
-        '末吉': [
-            "此签末吉。初始平缓，{theme}，耐心等待后福可期。",
-            "末吉之兆。先难后易，{theme}，积蓄力量待时而动。"
-        ],
-        '小吉': [
-            "此签小吉。平稳向好，{theme}，小步积累渐进改善。",
-            "小吉之兆。微福渐至，{theme}，稳扎稳打自有收获。"
-        ],
-        '半吉': [
-            "此签半吉。吉凶参半，{theme}，需谨慎权衡步步为营。",
-            "半吉之兆。喜忧并存，{theme}，宜静观其变灵活应对。"
-        ],
-        '末小吉': [
-            "此签末小吉。转吉之前，{theme}，坚守本分静待转机。",
-            "末小吉之兆。黎明前暗，{theme}，韬光养晦等待时机。"
-        ],
-        '凶': [
-            "此签为凶。运势欠佳，{theme}，宜守不宜动多作检讨。",
-            "凶兆。阻碍重重，{theme}，低调行事修身养性。",
-            "凶签。前路多艰，{theme}，耐心等待雨过天晴。"
-        ]
-    }
+def generate_interpretation(fortune):
+    """根据签诗生成更丰富的释义"""
+    poem = fortune['poem']
+    return _interpret(fortune['level'], poem['lines'], poem.get('lineInterpretations', []))
 
-    theme = extract_theme(poem_lines)
-    template = templates.get(level, templates['吉'])[0]
 
-    return template.format(theme=theme)
+def generate_summary(level, poem_lines, line_interp=None, sentiment=None):
+    """生成总体运势"""
+    prefix, suffix = PROFILES.get(level, DEFAULT_PROFILE)['summary']
+    return prefix + extract_theme(poem_lines) + suffix
 
 
-def generate_career(level, poem_lines, sentiment):
+def generate_career(level, poem_lines=None, sentiment=None):
     """生成事业财运"""
-    if level == '大吉':
-        return "事业运势旺盛，贵人相助，升职加薪机会降临。财运亨通，投资理财皆有利可图。把握当前良机，大胆施展抱负。"
-    elif level == '吉':
-        return "事业稳步发展，工作顺利获得认可。财运平稳，正财稳定，可适度理财。保持专注，持续努力必有回报。"
-    elif level in ['末吉', '小吉']:
-        return "事业平稳向好，小有进展。财运平平，收支平衡，宜稳中求进。耐心积累，渐进改善。"
-    elif level == '半吉':
-        return "事业喜忧参半，需谨慎决策。财运起伏，避免冒险投资，稳守为上。"
-    elif level == '末小吉':
-        return "事业处于低潮期，宜保持低调。财运不佳，避免重大开支，静待转机。"
-    else:  # 凶
-        return "事业运势低迷，阻碍较多，宜稳守现状。财运不佳，避免投资投机，谨慎理财。修身养性等待时机好转。"
-
-
-def generate_love(level, poem_lines, sentiment):
+    return PROFILES.get(level, DEFAULT_PROFILE)['career']
+
+
+def generate_love(level, poem_lines=None, sentiment=None):
     """生成感情姻缘"""
-    if level == '大吉':
-        return "感情运极佳，单身者桃花旺，有望遇见良缘。有伴侣者感情升温，关系更近一步，婚嫁事宜顺遂。"
-    elif level == '吉':
-        return "感情运势良好，单身者有机会认识心仪对象。有伴侣者相处和睦，关系稳定发展。"
-    elif level in ['末吉', '小吉']:
-        return "感情平稳渐进，单身者不必强求，缘分自然来。有伴侣者维持现状，细水长流。"
-    elif level == '半吉':
-        return "感情运势起伏，需多沟通理解。避免冲动决定，给彼此一些空间。"
-    elif level == '末小吉':
-        return "感情处于平淡期，不宜急于求成。单身者耐心等待，有伴侣者多包容体谅。"
-    else:  # 凶
-        return "感情运势低迷，易生误会争执。单身者暂缓追求，有伴侣者需冷静处理问题，多沟通少指责。"
-
-
-def generate_health(level, poem_lines, sentiment):
+    return PROFILES.get(level, DEFAULT_PROFILE)['love']
+
+
+def generate_health(level, poem_lines=None, sentiment=None):
     """生成健康平安"""
-    if level in ['大吉', '吉']:
-        return "身体状况良好，精神饱满。保持规律作息和适度运动，健康运势佳。"
-    elif level in ['末吉', '小吉']:
-        return "健康状况平稳，注意劳逸结合。适度休息，避免过度劳累。"
-    elif level == '半吉':
-        return "健康运势一般，注意小病小痛。保持良好作息，饮食清淡。"
-    else:  # 凶, 末小吉
-        return "健康运势欠佳，注意身体保养。避免过度劳累，保持心情愉悦，定期检查。"
+    return PROFILES.get(level, DEFAULT_PROFILE)['health']
 
 
-def generate_advice(level, poem_lines, sentiment):
+def generate_advice(level, poem_lines=None, sentiment=None):
     """生成建议"""
-    if level in ['大吉', '吉']:
-        return "把握当下好运，积极进取。保持谦逊态度，广结善缘，为未来持续积累福气。"
-    elif level in ['末吉', '小吉']:
-        return "稳步前行，不急不躁。积累经验和资源，为更好的机会做准备。"
-    elif level == '半吉':
-        return "谨慎决策，权衡利弊。保持冷静，灵活应对变化，稳中求进。"
-    else:  # 凶, 末小吉
-        return "低调行事，韬光养晦。修身养性，反思总结，等待运势好转再行动。"
+    return PROFILES.get(level, DEFAULT_PROFILE)['advice']
 
 
 def generate_story(level, poem_lines, line_interp):
     """生成典故说明"""
     # 基于诗句意境生成
-    if line_interp and len(line_interp) > 0:
-        main_theme = line_interp[0] if line_interp else ""
-    else:
-        main_theme = poem_lines[0] if poem_lines else ""
-
+    main_theme = line_interp[0] if line_interp else (poem_lines[0] if poem_lines else "")
     return f"此签诗意取自「{poem_lines[0][:4]}...」，寓意{main_theme[:30]}。古人以诗喻理，揭示人生起伏变迁之理。"
 
 
 def extract_theme(poem_lines):
     """从诗句中提取主题"""
-    theme_map = {
-        '云': '云开雾散，前景光明',
-        '月': '明月当空，清辉普照',
-        '花': '花开富贵，事业兴旺',
-        '春': '枯木逢春，否极泰来',
-        '山': '高山仰止，步步高升',
-        '水': '顺风顺水，一帆风顺',
-        '风': '风生水起，运势亨通',
-        '宝': '珍宝现世，福缘深厚',
-        '塔': '七级浮屠，功德圆满',
-        '龙': '龙腾云起，飞黄腾达',
-        '舟': '扬帆起航，前程远大'
-    }
+    return THEME_MATCHER.match(poem_lines)
+
+
+def _enrich_chunk(rows):
+    """为一批 (签级, 诗句, 逐句解释) 生成释义（在子进程中执行）"""
+    return [_interpret(level, lines, line_interp) for level, lines, line_interp in rows]
+
+
+def enrich_fortunes(fortunes, workers=1):
+    """
+    批量生成释义
 
-    for keyword, theme in theme_map.items():
-        if any(keyword in line for line in poem_lines):
-            return theme
+    Args:
+        fortunes: 签列表（可以来自多个寺庙的数据集）
+        workers: 并行进程数；签数少于 PARALLEL_MIN 时始终串行
 
-    # 默认主题
-    return "运势通达"
+    Returns:
+        与 fortunes 一一对应的释义列表
+    """
+    rows = [(f['level'], f['poem']['lines'], f['poem'].get('lineInterpretations', [])) for f in fortunes]
+    if workers > 1 and len(rows) >= PARALLEL_MIN:
+        # 每个进程分到几块，均衡负载的同时减少进程间传输次数
+        size = -(-len(rows) // (workers * 4))
+        chunks = [rows[i:i + size] for i in range(0, len(rows), size)]
+        return [interp for chunk in run_jobs(_enrich_chunk, chunks, workers) for interp in chunk]
+    return _enrich_chunk(rows)
 
 
-def main():
+def main(data_files=DATA_FILE, workers=1, force=False):
+    """
+    重新生成过期的释义并写回
+
+    Args:
+        data_files: 一个或多个签文 JSON（如多个寺庙的数据集），全部签合成一批处理
+        workers: 并行进程数
+        force: 忽略指纹，重新生成全部释义
+
+    Returns:
+        重新生成的签数
+    """
+    if isinstance(data_files, (str, os.PathLike)):
+        data_files = [data_files]
+
     print("=" * 80)
     print("丰富签文释义内容")
     print("=" * 80)
     print()
 
-    with open(DATA_FILE, 'r', encoding='utf-8') as f:
-        data = json.load(f)
-
-    print(f"处理 {len(data['fortunes'])} 个签...")
+    datasets = []
+    with stage('load'):
+        for data_file in data_files:
+            with open(data_file, 'r', encoding='utf-8') as f:
+                datasets.append(json.load(f))
+
+    # 只处理输入指纹变化的签
+    stale = []
+    changed_files = set()
+    with stage('fingerprint'):
+        for index, data in enumerate(datasets):
+            for fortune in data['fortunes']:
+                current = fingerprint(fortune)
+                if force or fortune.get('interpretationFingerprint') != current:
+                    stale.append((fortune, current))
+                    changed_files.add(index)
+
+    total = sum(len(data['fortunes']) for data in datasets)
+    print(f"处理 {len(data_files)} 个文件，共 {total} 个签，其中 {len(stale)} 个需要重新生成...")
     print()
 
-    updated = 0
-    for fortune in data['fortunes']:
-        # 完全重新生成所有释义
-        new_interp = generate_interpretation(fortune)
+    start = time.perf_counter()
+    with stage('enrich'):
+        interpretations = enrich_fortunes([fortune for fortune, _ in stale], workers)
+    elapsed = time.perf_counter() - start
+
+    for (fortune, current), new_interp in zip(stale, interpretations):
         fortune['interpretation'] = new_interp
-        updated += 1
+        fortune['interpretationFingerprint'] = current
 
-        if updated <= 5:  # 显示前5个示例
-            print(f"第 {fortune['id']} 签 ({fortune['level']}):")
-            print(f"  summary: {new_interp['summary']}")
-            print(f"  career: {new_interp['career'][:50]}...")
-            print()
+    for fortune, _ in stale[:5]:  # 显示前5个示例
+        new_interp = fortune['interpretation']
+        print(f"第 {fortune['id']} 签 ({fortune['level']}):")
+        print(f"  summary: {new_interp['summary']}")
+        print(f"  career: {new_interp['career'][:50]}...")
+        print()
 
-    print(f"共更新 {updated} 个签的释义")
+    print(f"共更新 {len(stale)} 个签的释义，耗时 {elapsed*1000:.1f}ms")
     print()
 
-    # 保存
-    with open(DATA_FILE, 'w', encoding='utf-8') as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
+    # 只写回有变化的文件（原子替换，未变化的文件保持原样）
+    with stage('write'):
+        for index in sorted(changed_files):
+            write_fortune_json(data_files[index], datasets[index])
 
     print("=" * 80)
-    print("✅ 更新完成！")
+    print("✅ 更新完成！" if stale else "✅ 所有释义都是最新的，无需写入")
     print("=" * 80)
 
+    return len(stale)
+
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="根据签诗和逐句解释丰富现代释义")
+    parser.add_argument('files', nargs='*', default=[DATA_FILE], help=f"签文 JSON 文件（默认 {DATA_FILE}）")
+    parser.add_argument('-j', '--workers', type=int, default=1, help="并行进程数（签数较多时生效）")
+    parser.add_argument('--force', action='store_true', help="忽略指纹，重新生成全部释义")
+    add_profile_argument(parser)
+    args = parser.parse_args()
+    with instrument('enrich_interpretations', profile=args.profile):
+        main(args.files, workers=args.workers, force=args.force)
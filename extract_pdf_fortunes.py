@@ -0,0 +1,401 @@
+#!/usr/bin/env python3
+"""
+从浅草寺一百签 PDF 直接提取签诗，不依赖模型输出
+
+  omikuji/data/日本東京淺草觀音寺一百籤.pdf → omikuji/data/senso-pdf.json
+
+按页在进程池中并行提取文本，并按页内容哈希缓存（.build-cache/pdf-pages.json），
+PDF 未变化的页不会重新提取。之后顺序拼接各页，按签号切分：
+  - 签号、签级和签诗在 PDF 中是加粗（重复绘制）的文字，其余为正文
+  - 签诗之后的正文是解签段落，按句拆分到每句诗，作为 lineInterpretations
+  - 「願望：…疾病：…」等为各项运势，按 PDF 原有的项目名原样放入 predictions；
+    interpretation 只填含义对得上的栏目：婚嫁 / 交往 → love，疾病 → health，
+    运势后的粗体告诫 → advice（願望、遺失物、盼望的人、旅行、搬家等没有对应栏目）
+
+输出为签对象数组，与模型输出结构相同（多出的 predictions 不参与合并），
+可直接交给 update_from_gemini_direct.py。提取后打印与现有数据（full.json）签级不同的签。
+
+依赖 pypdf（pip3 install pypdf），未安装时保留已有的输出文件。
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import re
+import sys
+import time
+from pathlib import Path
+
+from optimize_images import load_manifest, run_jobs, save_manifest
+
+PDF_FILE = "omikuji/data/日本東京淺草觀音寺一百籤.pdf"
+OUTPUT_FILE = "omikuji/data/senso-pdf.json"
+# 用于对比签级的现有数据
+DATASET_FILE = "omikuji/data/senso-ji-fortunes-full.json"
+CACHE_FILE = ".build-cache/pdf-pages.json"
+
+TOTAL_FORTUNES = 100
+
+# PDF 使用繁体签级，数据中统一为简体
+LEVELS = {'大吉', '吉', '半吉', '小吉', '末吉', '末小吉', '凶'}
+LEVEL_CHARS = {'大': '大', '小': '小', '半': '半', '末': '末', '吉': '吉', '凶': '凶', '兇': '凶'}
+# PDF 文字层中没有签级的签（签号后直接是诗句，签级字未以文字绘制），
+# 按签纸图片的标题补上：49_0.jpg「第四十九 吉」
+MISSING_LEVELS = {49: '吉'}
+
+# PDF 以重复绘制模拟粗体：连续四次（七寶七寶七寶七寶），或两两之间有空格（大大 大大）
+_BOLD = re.compile(r'(\S)\1 \1\1|(\S+?)\2\2\2')
+# 行首签号，粗体签号会重复四次（14 14 14 14）
+_FORTUNE_ID = re.compile(r'^\s*(\d{1,3})(?:\s+\1){0,3}(?=\s|$)')
+# 各项运势：「疾病：會治好吧。」
+_PREDICTION = re.compile(r'([^：。\s]+)：(.*?)(?=[^：。\s]+：|$)')
+_SENTENCE = re.compile(r'[^。！？]+[。！？]?')
+
+PREDICTION_START = '願望'
+_PUNCTUATION = re.compile(r'[，。、：；！？（）「」]')
+
+# 进程内复用已打开的 PDF
+_readers = {}
+
+
+def has_pypdf():
+    try:
+        import pypdf  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def _reader(pdf_path):
+    from pypdf import PdfReader
+
+    if pdf_path not in _readers:
+        _readers[pdf_path] = PdfReader(pdf_path)
+    return _readers[pdf_path]
+
+
+def page_hashes(pdf_path):
+    """每页内容流的 SHA-256（页面内容不变时提取结果也不变）"""
+    hashes = []
+    for page in _reader(pdf_path).pages:
+        contents = page.get_contents()
+        data = contents.get_data() if contents is not None else b''
+        hashes.append(hashlib.sha256(data).hexdigest())
+    return hashes
+
+
+def _extract_page(job):
+    """提取单页文本（在子进程中执行）"""
+    pdf_path, index = job
+    try:
+        return {'index': index, 'text': _reader(pdf_path).pages[index].extract_text(), 'error': None}
+    except Exception as e:
+        return {'index': index, 'text': '', 'error': str(e)}
+
+
+def extract_pages(pdf_path=PDF_FILE, workers=None, cache_path=CACHE_FILE, force=False):
+    """
+    并行提取各页文本，按页内容哈希缓存
+
+    Returns:
+        按页序排列的文本列表
+    """
+    workers = workers or os.cpu_count() or 1
+    cache = load_manifest(cache_path)
+    hashes = page_hashes(pdf_path)
+
+    texts = [None] * len(hashes)
+    jobs = []
+    for index, digest in enumerate(hashes):
+        entry = cache.get(digest)
+        if entry is not None and not force:
+            texts[index] = entry['text']
+        else:
+            jobs.append((pdf_path, index))
+
+    for result in run_jobs(_extract_page, jobs, workers):
+        if result['error']:
+            raise RuntimeError(f"第 {result['index'] + 1} 页提取失败: {result['error']}")
+        texts[result['index']] = result['text']
+        cache[hashes[result['index']]] = {'text': result['text']}
+
+    # 只保留当前 PDF 的页，避免缓存无限增长
+    save_manifest(cache_path, {digest: cache[digest] for digest in hashes})
+    print(f"📄 {len(hashes)} 页，提取 {len(jobs)} 页，{len(hashes) - len(jobs)} 页来自缓存")
+    return texts
+
+
+def unbold(line):
+    """
+    把一行拆成粗体片段和普通文字
+
+    Returns:
+        [(文字, 是否粗体)]；粗体片段还原为单份文字，相邻的粗体片段之间
+        只隔一个空格时合并为一段（如「一信 向天飛」是同一句诗）
+    """
+    segments = []
+    pos = 0
+    for m in _BOLD.finditer(line):
+        gap = line[pos:m.start()]
+        text = m.group(1) or m.group(2)
+        if pos == 0 and 0 < len(gap) <= 2 and not gap.isspace() and not _PUNCTUATION.search(gap):
+            # 诗句开头的红字偶尔只绘制了一次（飜做徘徊思）
+            text, gap = gap + text, ''
+        if segments and segments[-1][1] and len(gap) <= 1 and not gap.strip():
+            segments[-1] = (segments[-1][0] + text, True)
+        else:
+            if gap:
+                segments.append((gap, False))
+            segments.append((text, True))
+        pos = m.end()
+    if pos < len(line):
+        segments.append((line[pos:], False))
+    return segments
+
+
+def iter_lines(page_texts):
+    """依次产出 (页码, 行)，去掉每页开头的页码行"""
+    for index, text in enumerate(page_texts):
+        lines = text.splitlines()
+        if lines and lines[0].strip() == str(index + 1):
+            lines = lines[1:]
+        for line in lines:
+            yield index + 1, line
+
+
+def split_sections(page_texts):
+    """
+    按签号切分全文
+
+    签号必须按 1、2、3… 顺序出现，正文中偶然出现在行首的数字不会被误认为签号。
+
+    Returns:
+        [(签号, [页码...], [行...])]
+    """
+    sections = []
+    expected = 1
+    for page, line in iter_lines(page_texts):
+        m = _FORTUNE_ID.match(line)
+        if m and int(m.group(1)) == expected:
+            sections.append((expected, [page], [line[m.end():]]))
+            expected += 1
+        elif sections:
+            if page not in sections[-1][1]:
+                sections[-1][1].append(page)
+            sections[-1][2].append(line)
+    return sections
+
+
+def split_sentences(text, groups):
+    """把段落按句拆成 groups 组（每组句数尽量平均），与诗句一一对应"""
+    sentences = [s.strip() for s in _SENTENCE.findall(text) if s.strip()]
+    if not sentences:
+        return [''] * groups
+    result = []
+    for i in range(groups):
+        start = len(sentences) * i // groups
+        end = len(sentences) * (i + 1) // groups
+        result.append(''.join(sentences[start:end]) or sentences[min(start, len(sentences) - 1)])
+    return result
+
+
+def first_sentence(text):
+    """段落的第一句（保留句末标点，不在句中截断）"""
+    sentences = [s.strip() for s in _SENTENCE.findall(text) if s.strip()]
+    return sentences[0] if sentences else ''
+
+
+def _take_level(level, text):
+    """从粗体片段开头取出签级字（大 / 吉 / 末小吉 …），返回 (签级, 剩余文字)"""
+    while text:
+        candidate = level + LEVEL_CHARS.get(text[0], '?')
+        if not any(known.startswith(candidate) for known in LEVELS):
+            break
+        # 签级字后面紧跟诗句时（吉 守道當逢泰）只取签级字
+        level, text = candidate, text[1:].lstrip()
+    return level, text
+
+
+def parse_section(fortune_id, lines):
+    """
+    解析一支签的文字，返回签对象（格式与模型输出相同）
+
+    PDF 中签诗和解签正文有时排在左右两栏，提取出的文字会交错，
+    因此按片段分类而不是按出现顺序：
+      - 行首、不含标点的粗体片段是诗句（开头的签级字单独取出）
+      - 其余粗体片段（願望：、萬事行為謹慎。）和普通文字属于正文；
+        粗体的「願望」出现之前是解签段落，之后是各项运势
+    """
+    level = ''
+    poem_lines = []
+    paragraph = []
+    predictions = []
+
+    for line in lines:
+        at_line_start = True
+        for text, bold in unbold(line):
+            if not bold and not text.strip():
+                continue
+            if bold and at_line_start and level not in LEVELS:
+                level, text = _take_level(level, text)
+                if not text:
+                    continue
+            if bold and at_line_start and not _PUNCTUATION.search(text):
+                poem_lines.append(text)
+                continue
+            at_line_start = False
+            if bold and text.startswith(PREDICTION_START):
+                predictions.append(text)
+            else:
+                (predictions if predictions else paragraph).append(text)
+
+    if not level and fortune_id in MISSING_LEVELS:
+        level = MISSING_LEVELS[fortune_id]
+    if level not in LEVELS:
+        raise ValueError(f"第 {fortune_id} 签: 无法识别签级 {level!r}")
+
+    # 诗句因排版被拆开或合并时，按等长重新切分为四句
+    joined = ''.join(poem_lines)
+    if len(poem_lines) != 4 and len(joined) % 4 == 0:
+        size = len(joined) // 4
+        poem_lines = [joined[i:i + size] for i in range(0, len(joined), size)]
+    if len(poem_lines) != 4:
+        raise ValueError(f"第 {fortune_id} 签: 签诗应为 4 句，提取到 {poem_lines}")
+
+    paragraph_text = re.sub(r'\s+', '', ''.join(paragraph))
+    prediction_text = re.sub(r'\s+', '', ''.join(predictions))
+    # 运势都以「吧」结尾；PDF 偶有把句号印成冒号的（第 35 签「旅行：好吧：結婚」），否则「好吧」会被当成项目名
+    prediction_text = prediction_text.replace('吧：', '吧。')
+    items = {key: value for key, value in _PREDICTION.findall(prediction_text)}
+    # 运势之后常有一句粗体的告诫（如「萬事行為謹慎。」）
+    warning = ''
+    last_key = list(items)[-1] if items else None
+    if last_key and '。' in items[last_key].rstrip('。'):
+        value, _, warning = items[last_key].partition('。')
+        items[last_key] = value + '。'
+
+    def pick(*keywords):
+        return ''.join(f"{key}：{value}" for key, value in items.items()
+                       if any(k in key for k in keywords))
+
+    # 所有运势项目原样保留；interpretation 中没有对应栏目的（願望、遺失物、旅行等）只在这里
+
+    return {
+        'id': fortune_id,
+        'level': level,
+        'imageFront': f"senso-ji-omikuji-main/{fortune_id}_0.jpg",
+        'imageBack': f"senso-ji-omikuji-main/{fortune_id}_1.jpg",
+        'poem': {
+            'title': f"第{fortune_id}签",
+            'lines': poem_lines,
+            'source': '浅草寺',
+            'lineInterpretations': split_sentences(paragraph_text, len(poem_lines))
+        },
+        'interpretation': {
+            'summary': f"此签{level}。" + first_sentence(paragraph_text),
+            'career': '',
+            'love': pick('婚', '嫁', '交往'),
+            'health': pick('疾病'),
+            'advice': warning,
+            'story': ''
+        },
+        'predictions': items
+    }
+
+
+def parse_fortunes(page_texts):
+    """
+    从各页文本解析全部签
+
+    Returns:
+        (签列表, {签号: [页码...]}, 错误列表)
+    """
+    fortunes = []
+    pages = {}
+    errors = []
+    for fortune_id, section_pages, lines in split_sections(page_texts):
+        pages[fortune_id] = section_pages
+        try:
+            fortunes.append(parse_section(fortune_id, lines))
+        except ValueError as e:
+            errors.append(str(e))
+    missing = sorted(set(range(1, TOTAL_FORTUNES + 1)) - set(pages))
+    if missing:
+        errors.append(f"缺少签号: {', '.join(map(str, missing))}")
+    return fortunes, pages, errors
+
+
+def level_changes(fortunes, dataset_file=DATASET_FILE):
+    """
+    与现有数据比较签级
+
+    Returns:
+        [(签号, 现有签级, PDF 签级)]；现有数据不存在时为空
+    """
+    try:
+        with open(dataset_file, 'r', encoding='utf-8') as f:
+            current = {fortune['id']: fortune['level'] for fortune in json.load(f)['fortunes']}
+    except OSError:
+        return []
+    return [(f['id'], current[f['id']], f['level']) for f in fortunes
+            if f['id'] in current and current[f['id']] != f['level']]
+
+
+def extract_pdf(pdf_path=PDF_FILE, output_file=OUTPUT_FILE, workers=None, cache_path=CACHE_FILE, force=False,
+                dataset_file=DATASET_FILE):
+    """
+    提取 PDF 中的全部签并写入 output_file（签对象数组）
+
+    Returns:
+        提取到的签数；未安装 pypdf 时返回 None 并保留已有输出
+    """
+    if not has_pypdf():
+        print("⚠️  未安装 pypdf，跳过 PDF 提取（pip3 install pypdf）")
+        if os.path.exists(output_file):
+            print(f"   沿用已有的 {output_file}")
+        return None
+
+    start = time.perf_counter()
+    texts = extract_pages(pdf_path, workers, cache_path, force)
+    fortunes, pages, errors = parse_fortunes(texts)
+
+    # 个别签排版异常时跳过，其余签照常输出；合并时这些签保持原有内容
+    for error in errors:
+        print(f"⚠️  {error}")
+    if not fortunes:
+        raise ValueError("PDF 中没有解析出任何签")
+
+    output_file = Path(output_file)
+    tmp_file = output_file.with_name(output_file.name + '.tmp')
+    with open(tmp_file, 'w', encoding='utf-8') as f:
+        json.dump(fortunes, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_file, output_file)
+
+    spans = sum(1 for p in pages.values() if len(p) > 1)
+    print(f"✅ 提取 {len(fortunes)} 支签（{spans} 支跨页），耗时 {time.perf_counter() - start:.2f}s → {output_file}")
+
+    # 以 PDF 为来源（build.py gemini --source pdf）合并时，这些签的签级和签级分布都会改变
+    changes = level_changes(fortunes, dataset_file)
+    if changes:
+        print(f"⚠️  {len(changes)} 支签的签级与 {dataset_file} 不同（现有 → PDF）:")
+        for fortune_id, old, new in changes:
+            print(f"   第 {fortune_id} 签: {old} → {new}")
+    return len(fortunes)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="从浅草寺一百签 PDF 提取签诗")
+    parser.add_argument('--pdf', default=PDF_FILE, help="PDF 路径")
+    parser.add_argument('--output', default=OUTPUT_FILE, help="输出 JSON 路径")
+    parser.add_argument('-j', '--workers', type=int, default=None, help="并行进程数（默认全部核心）")
+    parser.add_argument('--force', action='store_true', help="忽略页缓存，全部重新提取")
+    args = parser.parse_args()
+
+    os.chdir(Path(__file__).resolve().parent)
+    try:
+        count = extract_pdf(args.pdf, args.output, args.workers, force=args.force)
+    except ValueError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+    sys.exit(0)
@@ -0,0 +1,328 @@
+#!/usr/bin/env python3
+"""
+静态资源内容指纹 - 生成可长期缓存的部署目录
+
+固定文件名的资源不能长期缓存：修改 app.js、签文数据或重新压缩图片后，老访客仍会
+使用旧文件。本脚本把站点复制到 dist/，并把资源重命名为带内容哈希的文件名
+（app.js → app.3f2a1b9c0d.js），vercel.json 只对这类文件名设置一年的 immutable 缓存：
+
+  图片         硬链接到 dist/（跨设备时复制），不额外占用空间
+  瓦片金字塔   目录名已包含原图哈希，按原路径硬链接
+  签文 JSON    改写 imageFront / imageBack / srcset 后重新拆分（split_fortunes.py、locale_bundles.py）、
+               打包（pack_fortunes.py）和生成检索索引（search_index.py），
+               分片名写入带哈希的 index.json
+  app.js 等    改写其中引用的资源路径，并压缩空白和注释
+  index.html   改写引用后保持原名（每次都要重新验证）；内联样式表和签文索引，
+               加上 preload / preconnect，并检查首屏大小预算（bundle_critical.py）
+
+同时输出：
+  dist/omikuji/asset-manifest.json     原路径 → 带哈希的路径
+  dist/omikuji/precache-manifest.json  页面外壳的预缓存列表 [{url, revision}]，供 service worker 使用
+  dist/vercel.json                     部署配置（与根目录一致）
+
+内容不变时文件名不变，已缓存的资源不会失效；内容变化时 URL 随之变化，立即生效。
+
+用法：
+  python3 fingerprint_assets.py            # 生成 dist/
+  python3 fingerprint_assets.py --output build
+  python3 fingerprint_assets.py --no-bundle   # 不内联、不压缩（排查问题时使用）
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import re
+import shutil
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from bundle_critical import BUDGET_BYTES, bundle_page, minify, print_report
+from locale_bundles import build_locale_bundles
+from optimize_images import load_manifest, save_manifest, write_fortune_json
+from pack_fortunes import pack_fortunes
+from search_index import build_search_index
+from split_fortunes import split_fortunes, write_compact_json
+
+SITE_DIR = "omikuji"
+SERVED_FILE = "omikuji/data/senso-ji-fortunes-full-optimized-v1.json"
+IMAGE_DIRS = ["omikuji/data/senso-ji-omikuji-main", "omikuji/data/responsive"]
+IMAGE_SUFFIXES = {'.jpg', '.jpeg', '.png', '.webp', '.avif'}
+# 已按内容命名的目录（optimize_images.py --tiles），原样链接
+CONTENT_ADDRESSED_DIRS = ["omikuji/data/tiles"]
+STYLES = ["omikuji/css/styles.css"]
+# 按依赖顺序排列：后面的脚本可能引用前面的资源
+SCRIPTS = ["omikuji/js/fortune-pack.js", "omikuji/js/tile-viewer.js", "omikuji/js/fortune-search.js",
+           "omikuji/js/app.js"]
+PAGES = ["omikuji/index.html"]
+VERCEL_CONFIG = "vercel.json"
+
+OUTPUT_DIR = "dist"
+ASSET_MANIFEST = "asset-manifest.json"
+PRECACHE_MANIFEST = "precache-manifest.json"
+HASH_CACHE_FILE = ".build-cache/fingerprint-hashes.json"
+HASH_LENGTH = 10
+
+# 首次打开页面就需要的资源（图片按需加载，不预缓存）
+PRECACHE = ["index.html", "css/styles.css", "js/fortune-pack.js", "js/tile-viewer.js",
+            "js/fortune-search.js", "js/app.js", "data/fortunes/index.json"]
+
+
+def hashed_name(path, digest):
+    """app.js + 摘要 → app.<摘要前 HASH_LENGTH 位>.js"""
+    path = Path(path)
+    return path.with_name(f"{path.stem}.{digest[:HASH_LENGTH]}{path.suffix}")
+
+
+class HashCache:
+    """按文件大小和修改时间缓存 SHA-256，图片未变化时不重新读取"""
+
+    def __init__(self, path=HASH_CACHE_FILE):
+        self.path = path
+        self.entries = load_manifest(path)
+
+    def sha256(self, path):
+        st = os.stat(path)
+        key = Path(path).as_posix()
+        entry = self.entries.get(key)
+        if entry and entry[0] == st.st_size and entry[1] == st.st_mtime_ns:
+            return entry[2]
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                digest.update(chunk)
+        self.entries[key] = [st.st_size, st.st_mtime_ns, digest.hexdigest()]
+        return self.entries[key][2]
+
+    def save(self):
+        self.entries = {path: entry for path, entry in self.entries.items() if os.path.exists(path)}
+        save_manifest(self.path, self.entries)
+
+
+def rewrite_references(text, mapping):
+    """把文本中用引号或 url() 包起来的资源路径替换为带哈希的路径"""
+    if not mapping:
+        return text
+    keys = sorted(mapping, key=len, reverse=True)
+    pattern = re.compile(r'(?<=[\'"(])(' + '|'.join(map(re.escape, keys)) + r')(?=[\'")?#])')
+    return pattern.sub(lambda m: mapping[m.group(1)], text)
+
+
+class Fingerprinter:
+    """把站点资源写入输出目录并记录 原路径 → 带哈希路径（均相对于 omikuji/）"""
+
+    def __init__(self, output_dir, hashes, minify=False):
+        self.site = Path(output_dir) / SITE_DIR
+        self.hashes = hashes
+        self.minify = minify
+        self.mapping = {}
+
+    def _logical(self, path):
+        return Path(path).relative_to(SITE_DIR).as_posix()
+
+    def link(self, source, digest):
+        """按内容哈希重命名并硬链接原文件（图片）"""
+        logical = self._logical(source)
+        target = hashed_name(logical, digest).as_posix()
+        dst = self.site / target
+        dst.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            os.link(source, dst)
+        except OSError:
+            shutil.copy2(source, dst)
+        self.mapping[logical] = target
+
+    def link_tree(self, source_dir):
+        """按原路径硬链接整个目录（文件名已经包含内容哈希）"""
+        count = 0
+        for source in Path(source_dir).rglob('*'):
+            if not source.is_file():
+                continue
+            dst = self.site / self._logical(source)
+            dst.parent.mkdir(parents=True, exist_ok=True)
+            try:
+                os.link(source, dst)
+            except OSError:
+                shutil.copy2(source, dst)
+            count += 1
+        return count
+
+    def emit(self, logical, content):
+        """写出生成的内容（bytes），按内容哈希命名"""
+        target = hashed_name(logical, hashlib.sha256(content).hexdigest()).as_posix()
+        dst = self.site / target
+        dst.parent.mkdir(parents=True, exist_ok=True)
+        dst.write_bytes(content)
+        self.mapping[logical] = target
+        return target
+
+    def rename(self, path):
+        """把已写入输出目录的文件按内容哈希改名"""
+        path = Path(path)
+        logical = path.relative_to(self.site).as_posix()
+        target = hashed_name(logical, hashlib.sha256(path.read_bytes()).hexdigest()).as_posix()
+        os.replace(path, self.site / target)
+        self.mapping[logical] = target
+        return target
+
+    def rewrite_text(self, source):
+        """改写文本文件中的资源引用（需要时压缩）后按内容哈希写出"""
+        text = rewrite_references(Path(source).read_text(encoding='utf-8'), self.mapping)
+        if self.minify:
+            text = minify(source, text)
+        return self.emit(self._logical(source), text.encode('utf-8'))
+
+
+def _rewrite_srcset(srcset, mapping):
+    candidates = []
+    for candidate in srcset.split(', '):
+        path, _, descriptor = candidate.partition(' ')
+        path = mapping.get(f"data/{path}", f"data/{path}")[len("data/"):]
+        candidates.append(f"{path} {descriptor}".rstrip())
+    return ', '.join(candidates)
+
+
+def rewrite_fortune_images(data, mapping):
+    """改写签文中的图片路径（相对于 data/）"""
+    for fortune in data['fortunes']:
+        for side in ('Front', 'Back'):
+            image = fortune.get(f'image{side}')
+            if image:
+                fortune[f'image{side}'] = mapping.get(f"data/{image}", f"data/{image}")[len("data/"):]
+            sources = fortune.get(f'image{side}Sources')
+            if isinstance(sources, dict):
+                fortune[f'image{side}Sources'] = {
+                    fmt: _rewrite_srcset(srcset, mapping) for fmt, srcset in sources.items()}
+    return data
+
+
+def fingerprint_assets(output_dir=OUTPUT_DIR, workers=None, hash_cache=HASH_CACHE_FILE,
+                       bundle=True, budget=BUDGET_BYTES):
+    """
+    生成带内容指纹的部署目录
+
+    Args:
+        bundle: 压缩样式和脚本，并把首屏资源内联到页面（见 bundle_critical.py）
+        budget: 打包后页面 gzip 后的大小上限（字节），超出时抛出 ValueError；0 表示不检查
+
+    Returns:
+        {原路径: 带哈希路径}（相对于 omikuji/）
+    """
+    start = time.perf_counter()
+    output_path = Path(output_dir)
+    tmp_path = output_path.with_name(output_path.name + '.tmp')
+    shutil.rmtree(tmp_path, ignore_errors=True)
+
+    hashes = HashCache(hash_cache)
+    assets = Fingerprinter(tmp_path, hashes, minify=bundle)
+
+    print(f"🔖 生成带内容指纹的部署目录 {output_path}/")
+    print("-" * 50)
+
+    # 1. 图片：并行计算哈希后硬链接
+    images = sorted(p for d in IMAGE_DIRS if os.path.isdir(d)
+                    for p in Path(d).rglob('*') if p.suffix.lower() in IMAGE_SUFFIXES)
+    with ThreadPoolExecutor(max_workers=workers or os.cpu_count() or 1) as pool:
+        digests = list(pool.map(hashes.sha256, images))
+    for image, digest in zip(images, digests):
+        assets.link(image, digest)
+    hashes.save()
+    print(f"🖼️  图片 {len(images)} 张")
+    for directory in CONTENT_ADDRESSED_DIRS:
+        if os.path.isdir(directory):
+            print(f"🧩 {directory}: {assets.link_tree(directory)} 个文件")
+
+    # 2. 签文数据：改写图片路径，再拆分和打包
+    with open(SERVED_FILE, 'r', encoding='utf-8') as f:
+        data = rewrite_fortune_images(json.load(f), assets.mapping)
+    fortunes_dir = tmp_path / SITE_DIR / "data/fortunes"
+    served = tmp_path / SERVED_FILE
+    served.parent.mkdir(parents=True, exist_ok=True)
+    write_fortune_json(served, data)
+
+    split_fortunes(served, fortunes_dir)
+    build_locale_bundles(served, fortunes_dir, workers=workers, manifest_path=None)
+    pack_fortunes(served, fortunes_dir / "fortunes.pack")
+    build_search_index(served, fortunes_dir / "search.json")
+    assets.rename(served)
+    assets.rename(fortunes_dir / "fortunes.pack")
+    assets.rename(fortunes_dir / "search.json")
+
+    index_file = fortunes_dir / "index.json"
+    with open(index_file, 'r', encoding='utf-8') as f:
+        index = json.load(f)
+    index['shards'] = [Path(assets.rename(fortunes_dir / shard)).name for shard in index['shards']]
+    for locale_bundle in index.get('locales', {}).values():
+        locale_bundle['shards'] = [Path(assets.rename(fortunes_dir / shard)).relative_to("data/fortunes").as_posix()
+                                   for shard in locale_bundle['shards']]
+    write_compact_json(index_file, index)
+    assets.rename(index_file)
+
+    # 3. 样式、脚本和页面
+    for source in STYLES + SCRIPTS:
+        assets.rewrite_text(source)
+
+    site_path = tmp_path / SITE_DIR
+    for page in PAGES:
+        html = rewrite_references(Path(page).read_text(encoding='utf-8'), assets.mapping)
+        logical = Path(page).relative_to(SITE_DIR).as_posix()
+        if bundle:
+            html, report = bundle_page(html, site_path, logical,
+                                       index_path=assets.mapping['data/fortunes/index.json'],
+                                       budget=budget)
+            print_report(logical, report)
+        (site_path / logical).write_text(html, encoding='utf-8')
+
+    # 4. 资源清单和预缓存列表
+    manifest = dict(sorted(assets.mapping.items()))
+    with open(site_path / ASSET_MANIFEST, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+
+    precache = []
+    for logical in PRECACHE:
+        if logical in manifest:
+            # 文件名已带哈希，revision 为 null（与 Workbox 的约定一致）
+            precache.append({'url': manifest[logical], 'revision': None})
+        else:
+            digest = hashlib.sha256((site_path / logical).read_bytes()).hexdigest()
+            precache.append({'url': logical, 'revision': digest[:HASH_LENGTH]})
+    with open(site_path / PRECACHE_MANIFEST, 'w', encoding='utf-8') as f:
+        json.dump(precache, f, ensure_ascii=False, indent=2)
+
+    shutil.copy2(VERCEL_CONFIG, tmp_path / VERCEL_CONFIG)
+
+    # 5. 整体替换旧的输出目录
+    old_path = output_path.with_name(output_path.name + '.old')
+    shutil.rmtree(old_path, ignore_errors=True)
+    if output_path.exists():
+        os.replace(output_path, old_path)
+    os.replace(tmp_path, output_path)
+    shutil.rmtree(old_path, ignore_errors=True)
+
+    elapsed = time.perf_counter() - start
+    print("-" * 50)
+    print(f"✅ {len(manifest)} 个资源已加上内容指纹，耗时 {elapsed:.2f}s")
+    print(f"📋 {output_path / SITE_DIR / ASSET_MANIFEST}")
+    return manifest
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="生成带内容指纹的部署目录")
+    parser.add_argument('--output', default=OUTPUT_DIR, help="输出目录（默认 dist）")
+    parser.add_argument('-j', '--workers', type=int, default=None, help="计算哈希的线程数")
+    parser.add_argument('--no-bundle', action='store_true', help="不压缩脚本和样式，不内联首屏资源")
+    parser.add_argument('--budget', type=float, default=BUDGET_BYTES / 1024,
+                        help="首屏页面 gzip 后的大小上限（KB，0 表示不检查）")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    try:
+        fingerprint_assets(args.output, workers=args.workers, bundle=not args.no_bundle,
+                           budget=int(args.budget * 1024))
+    except (OSError, ValueError, KeyError) as e:
+        print(f"❌ 生成失败: {e}")
+        sys.exit(1)
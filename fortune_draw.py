@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+"""
+服务端抽签 - 预计算别名表（alias method），O(1) 抽取
+
+启动时为每种抽签模式构建一次别名表，之后每次抽签只需一个随机数：
+  lucky  只抽吉祥签（排除 凶、大凶），与 app.js 的 drawFortune() 一致
+  all    全部 100 签
+
+支持按签级设置权重（如 大吉:2），以及传入 seed 复现抽签结果。
+由 serve.py 挂载为 /api/draw：
+
+  GET /api/draw?mode=lucky
+  GET /api/draw?mode=all&seed=event-2026&count=10
+  GET /api/draw?weights=大吉:2,吉:1
+"""
+
+import json
+import random
+import sys
+from functools import lru_cache
+from http import HTTPStatus
+
+INDEX_FILE = "omikuji/data/fortunes/index.json"
+
+# 与 app.js 的 convertLevelToChinese() 保持一致
+LEVEL_CHINESE = {
+    'excellent': '大吉',
+    'good': '吉',
+    'medium': '半吉',
+    'small': '小吉',
+    '末吉': '末吉',
+    'poor': '凶',
+    'worst': '大凶',
+    'supreme': '大吉',
+}
+
+UNLUCKY_LEVELS = {'凶', '大凶'}
+
+MODES = {
+    'lucky': lambda fortune: fortune['level'] not in UNLUCKY_LEVELS,
+    'all': lambda fortune: True,
+}
+
+# 单次请求最多抽取的签数
+MAX_COUNT = 1000
+COUNT_ERROR = f"count 必须是 1-{MAX_COUNT} 之间的整数"
+
+
+def build_alias_table(weights):
+    """
+    Vose 别名法构建概率表和别名表
+
+    Returns:
+        (prob, alias)：抽到第 i 格时，以 prob[i] 的概率取 i，否则取 alias[i]
+    """
+    n = len(weights)
+    total = float(sum(weights))
+    if n == 0 or total <= 0:
+        raise ValueError("权重之和必须大于 0")
+
+    scaled = [w * n / total for w in weights]
+    prob = [0.0] * n
+    alias = list(range(n))
+    small = [i for i, p in enumerate(scaled) if p < 1.0]
+    large = [i for i, p in enumerate(scaled) if p >= 1.0]
+
+    while small and large:
+        s = small.pop()
+        g = large.pop()
+        prob[s] = scaled[s]
+        alias[s] = g
+        scaled[g] = scaled[g] + scaled[s] - 1.0
+        (small if scaled[g] < 1.0 else large).append(g)
+
+    # 剩余的格子由于浮点误差可能略偏离 1，直接视为 1
+    for i in large + small:
+        prob[i] = 1.0
+
+    return prob, alias
+
+
+class AliasSampler:
+    """在固定的候选集合上按权重 O(1) 抽样"""
+
+    def __init__(self, items, weights):
+        self.items = list(items)
+        self.prob, self.alias = build_alias_table(weights)
+        self.n = len(self.items)
+
+    def sample(self, rng):
+        # 一个随机数同时决定格子和格内的取舍
+        u = rng.random() * self.n
+        i = int(u)
+        return self.items[i if u - i < self.prob[i] else self.alias[i]]
+
+    def sample_many(self, rng, count):
+        return [self.sample(rng) for _ in range(count)]
+
+
+def normalize_level(level):
+    return LEVEL_CHINESE.get(level, level)
+
+
+def parse_weights(text):
+    """解析 '大吉:2,吉:1' 形式的签级权重"""
+    weights = {}
+    for part in (text or '').split(','):
+        if not part.strip():
+            continue
+        level, sep, value = part.partition(':')
+        try:
+            weight = float(value) if sep else None
+        except ValueError:
+            weight = None
+        if weight is None:
+            raise ValueError(f"权重格式应为 签级:数值，收到 {part!r}")
+        if weight < 0 or weight != weight:
+            raise ValueError(f"权重不能为负数: {part!r}")
+        weights[normalize_level(level.strip())] = weight
+    return weights
+
+
+def parse_count(value):
+    """解析查询参数中的抽取数量，未提供时为 1"""
+    if value in (None, ''):
+        return 1
+    try:
+        count = int(value)
+    except (TypeError, ValueError):
+        raise ValueError(COUNT_ERROR) from None
+    if not 1 <= count <= MAX_COUNT:
+        raise ValueError(COUNT_ERROR)
+    return count
+
+
+class DrawService:
+    """
+    抽签服务
+
+    Args:
+        fortunes: 签列表（至少包含 id 和 level）
+        level_weights: 默认签级权重，未列出的签级权重为 1
+    """
+
+    def __init__(self, fortunes, level_weights=None):
+        self.fortunes = [dict(f, level=normalize_level(f['level'])) for f in fortunes]
+        self.level_weights = dict(level_weights or {})
+        # 启动时为每种模式预计算默认权重下的别名表
+        self.samplers = {mode: self._build(mode, self._weights_key(None)) for mode in MODES}
+        self._cached_build = lru_cache(maxsize=64)(self._build)
+        self._random = random.Random()
+
+    def _weights_key(self, weights):
+        merged = dict(self.level_weights)
+        merged.update(weights or {})
+        return tuple(sorted(merged.items()))
+
+    def _build(self, mode, weights_key):
+        weights = dict(weights_key)
+        candidates = [f for f in self.fortunes if MODES[mode](f) and weights.get(f['level'], 1.0) > 0]
+        if not candidates:
+            raise ValueError(f"模式 {mode} 在当前权重下没有可抽的签")
+        return AliasSampler(candidates, [weights.get(f['level'], 1.0) for f in candidates])
+
+    def sampler(self, mode='lucky', weights=None):
+        if mode not in MODES:
+            raise ValueError(f"未知模式: {mode}（可选: {', '.join(MODES)}）")
+        if not weights:
+            return self.samplers[mode]
+        return self._cached_build(mode, self._weights_key(weights))
+
+    def draw(self, mode='lucky', seed=None, weights=None, count=1):
+        """
+        抽签
+
+        Args:
+            mode: 抽签模式（lucky / all）
+            seed: 随机种子；相同的种子、模式和权重得到相同的结果
+            weights: 本次请求的签级权重，覆盖默认权重
+            count: 抽取数量（有放回）
+        """
+        if not 1 <= count <= MAX_COUNT:
+            raise ValueError(COUNT_ERROR)
+        sampler = self.sampler(mode, weights)
+        rng = random.Random(seed) if seed is not None else self._random
+        return sampler.sample_many(rng, count)
+
+    def handle(self, method, query, body):
+        """serve.py 的 API 入口：返回 (状态码, JSON 对象)"""
+        if method != 'GET':
+            return HTTPStatus.METHOD_NOT_ALLOWED, {'error': '只支持 GET'}
+        try:
+            mode = query.get('mode', 'lucky')
+            seed = query.get('seed')
+            count = parse_count(query.get('count'))
+            weights = parse_weights(query.get('weights'))
+            fortunes = self.draw(mode, seed=seed, weights=weights, count=count)
+        except ValueError as e:
+            return HTTPStatus.BAD_REQUEST, {'error': str(e)}
+
+        return HTTPStatus.OK, {
+            'mode': mode,
+            'seed': seed,
+            'fortunes': fortunes
+        }
+
+
+def load_draw_service(index_file=INDEX_FILE, level_weights=None):
+    """从精简索引（split_fortunes.py 的输出）或 .pack（pack_fortunes.py 的输出）创建抽签服务"""
+    if str(index_file).endswith('.pack'):
+        from pack_fortunes import FortunePack
+        with FortunePack(index_file) as pack:
+            fortunes = [{'id': i, 'level': pack.level(i)} for i in pack.ids()]
+        return DrawService(fortunes, level_weights)
+
+    with open(index_file, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    return DrawService(data['fortunes'], level_weights)
+
+
+if __name__ == "__main__":
+    import time
+
+    service = load_draw_service()
+    for mode, sampler in service.samplers.items():
+        print(f"🎲 {mode}: {sampler.n} 支候选签")
+
+    rng = random.Random(0)
+    sampler = service.samplers['lucky']
+    draws = 1_000_000
+    start = time.perf_counter()
+    for _ in range(draws):
+        sampler.sample(rng)
+    elapsed = time.perf_counter() - start
+    print(f"⏱️  {draws} 次抽签耗时 {elapsed:.2f}s（{draws/elapsed:,.0f} 次/秒）")
+    sys.exit(0)
@@ -0,0 +1,384 @@
+#!/usr/bin/env python3
+"""
+服务端抽签历史 - SQLite（WAL 模式）只追加存储，批量写入
+
+每条记录只保存 (签号, 时间戳, 许愿, 是否查询)，签文内容由前端按签号从索引还原。
+写入先进入内存队列，由单个写线程把队列中积压的记录合并为一个事务提交
+（组提交），每次抽签的写入成本与已有记录数无关。
+
+由 serve.py 挂载：
+
+  GET    /api/history?user=<id>&before=<seq>&limit=50   按 seq 倒序分页读取
+  POST   /api/history         {"user": ..., "records": [...]}  追加记录（202）
+  DELETE /api/history?user=<id>                            清空该用户的记录
+  POST   /api/history/sync    {"user": ..., "since": <seq>, "records": [...]}
+                              上传本地新记录，返回 since 之后的全部服务端记录
+
+记录格式：{"clientId": "...", "id": 7, "timestamp": 1760000000000, "wish": "...", "queried": false}
+clientId 由前端生成，同一用户重复上传同一条记录只保存一次，同步可以安全重试。
+"""
+
+import os
+import queue
+import re
+import sqlite3
+import sys
+import threading
+import uuid
+from http import HTTPStatus
+from pathlib import Path
+
+# 以 . 开头的目录不会被 serve.py 当作静态文件提供
+HISTORY_DB = ".data/history.db"
+
+# 用户标识由前端随机生成并保存在 localStorage
+USER_PATTERN = re.compile(r'^[A-Za-z0-9_-]{8,64}$')
+
+MAX_WISH = 200
+MAX_CLIENT_ID = 64
+# 单次请求最多上传 / 返回的记录数
+MAX_RECORDS = 500
+DEFAULT_PAGE = 50
+
+# 单个事务最多合并的写操作数
+BATCH_SIZE = 512
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS history (
+    seq        INTEGER PRIMARY KEY AUTOINCREMENT,
+    user       TEXT    NOT NULL,
+    client_id  TEXT    NOT NULL,
+    fortune_id INTEGER NOT NULL,
+    ts         INTEGER NOT NULL,
+    wish       TEXT,
+    queried    INTEGER NOT NULL DEFAULT 0,
+    UNIQUE (user, client_id)
+);
+CREATE INDEX IF NOT EXISTS history_user_seq ON history (user, seq);
+"""
+
+INSERT_SQL = """
+INSERT OR IGNORE INTO history (user, client_id, fortune_id, ts, wish, queried)
+VALUES (?, ?, ?, ?, ?, ?)
+"""
+
+COLUMNS = "seq, client_id, fortune_id, ts, wish, queried"
+
+# 写线程退出标记
+_STOP = object()
+
+
+def check_user(user):
+    if not isinstance(user, str) or not USER_PATTERN.match(user):
+        raise ValueError("user 必须是 8-64 位字母、数字、_ 或 -")
+    return user
+
+
+def parse_record(user, record):
+    """校验一条上传的记录，返回写入用的元组"""
+    if not isinstance(record, dict):
+        raise ValueError("记录必须是对象")
+    fortune_id = record.get('id')
+    timestamp = record.get('timestamp')
+    if not isinstance(fortune_id, int) or isinstance(fortune_id, bool) or fortune_id < 1:
+        raise ValueError(f"签号无效: {fortune_id!r}")
+    if not isinstance(timestamp, int) or isinstance(timestamp, bool) or timestamp <= 0:
+        raise ValueError(f"timestamp 必须是毫秒时间戳: {timestamp!r}")
+
+    wish = record.get('wish') or None
+    if wish is not None and (not isinstance(wish, str) or len(wish) > MAX_WISH):
+        raise ValueError(f"wish 必须是不超过 {MAX_WISH} 字的字符串")
+
+    client_id = record.get('clientId') or uuid.uuid4().hex
+    if not isinstance(client_id, str) or len(client_id) > MAX_CLIENT_ID:
+        raise ValueError(f"clientId 必须是不超过 {MAX_CLIENT_ID} 字符的字符串")
+
+    return (user, client_id, fortune_id, timestamp, wish, int(bool(record.get('queried'))))
+
+
+def parse_limit(value, default):
+    if value in (None, ''):
+        return default
+    try:
+        limit = int(value)
+    except (TypeError, ValueError):
+        limit = None
+    if isinstance(value, (bool, float)) or limit is None or not 1 <= limit <= MAX_RECORDS:
+        raise ValueError(f"limit 必须是 1-{MAX_RECORDS} 之间的整数")
+    return limit
+
+
+def parse_before(value):
+    """翻页游标（上一页返回的 next）"""
+    if value in (None, ''):
+        return None
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"before 必须是整数: {value!r}") from None
+
+
+def check_body(body):
+    """POST 请求体必须是 JSON 对象（未提供时视为空对象）"""
+    if body is None:
+        return {}
+    if not isinstance(body, dict):
+        raise ValueError("请求体必须是 JSON 对象")
+    return body
+
+
+def _row_to_record(row):
+    seq, client_id, fortune_id, ts, wish, queried = row
+    return {
+        'seq': seq,
+        'clientId': client_id,
+        'id': fortune_id,
+        'timestamp': ts,
+        'wish': wish,
+        'queried': bool(queried)
+    }
+
+
+class HistoryStore:
+    """
+    抽签历史存储（线程安全）
+
+    Args:
+        path: SQLite 数据库文件
+        batch_size: 单个事务最多合并的写操作数
+    """
+
+    def __init__(self, path=HISTORY_DB, batch_size=BATCH_SIZE):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.batch_size = batch_size
+        self.queue = queue.Queue()
+        # 每个请求线程一个只读连接；WAL 模式下读不阻塞写
+        self._local = threading.local()
+
+        conn = self._connect()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(SCHEMA)
+        conn.close()
+
+        self._writer = threading.Thread(target=self._write_loop, name='history-writer', daemon=True)
+        self._writer.start()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        # WAL 模式下 NORMAL 只在检查点时 fsync，断电最多丢失最后几个事务
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _reader(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._local.conn = self._connect()
+        return conn
+
+    # ---------- 写入 ----------
+
+    def _write_loop(self):
+        conn = self._connect()
+        while True:
+            batch = [self.queue.get()]
+            # 取走队列中已积压的操作，合并到同一个事务
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            stop = _STOP in batch
+            ops = [op for op in batch if op is not _STOP]
+            try:
+                self._apply(conn, ops)
+            except sqlite3.Error as e:
+                print(f"⚠️  写入抽签历史失败（{len(batch)} 项）: {e}")
+            finally:
+                # 通知等待这些写操作的请求（失败时也通知，避免请求一直阻塞）
+                for _, _, done in ops:
+                    if done is not None:
+                        done.set()
+                for _ in batch:
+                    self.queue.task_done()
+            if stop:
+                conn.close()
+                return
+
+    @staticmethod
+    def _apply(conn, ops):
+        rows = []
+        with conn:
+            for kind, value, _ in ops:
+                if kind == 'add':
+                    rows.append(value)
+                    continue
+                # 清空前先写入之前排队的记录，保持操作顺序
+                if rows:
+                    conn.executemany(INSERT_SQL, rows)
+                    rows = []
+                conn.execute("DELETE FROM history WHERE user = ?", (value,))
+            if rows:
+                conn.executemany(INSERT_SQL, rows)
+
+    def append(self, user, records, wait=False):
+        """
+        校验并排队写入记录，返回排队的条数
+
+        Args:
+            wait: 等待这些记录提交后再返回（只等本次排队的记录，不等其他请求的写入）
+        """
+        check_user(user)
+        if not isinstance(records, list) or len(records) > MAX_RECORDS:
+            raise ValueError(f"records 必须是不超过 {MAX_RECORDS} 条的数组")
+        rows = [parse_record(user, record) for record in records]
+        # 写线程按排队顺序提交，最后一条提交时前面的记录也都已提交
+        done = threading.Event() if wait and rows else None
+        for i, row in enumerate(rows):
+            self.queue.put(('add', row, done if i == len(rows) - 1 else None))
+        if done is not None:
+            done.wait()
+        return len(rows)
+
+    def clear(self, user):
+        self.queue.put(('clear', check_user(user), None))
+
+    def flush(self):
+        """等待已排队的写操作全部提交（包括其他请求的写入，只用于测试和关闭前）"""
+        self.queue.join()
+
+    def close(self):
+        self.queue.put(_STOP)
+        self._writer.join()
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    # ---------- 读取 ----------
+
+    def page(self, user, before=None, limit=DEFAULT_PAGE):
+        """
+        按 seq 倒序分页（键集分页，翻页成本与页码无关）
+
+        Returns:
+            (records, next_before)：没有更多记录时 next_before 为 None
+        """
+        check_user(user)
+        sql = f"SELECT {COLUMNS} FROM history WHERE user = ?"
+        params = [user]
+        if before is not None:
+            sql += " AND seq < ?"
+            params.append(before)
+        sql += " ORDER BY seq DESC LIMIT ?"
+        params.append(limit + 1)
+
+        rows = self._reader().execute(sql, params).fetchall()
+        records = [_row_to_record(row) for row in rows[:limit]]
+        next_before = records[-1]['seq'] if len(rows) > limit else None
+        return records, next_before
+
+    def since(self, user, after=0, limit=MAX_RECORDS):
+        """
+        按 seq 正序返回 after 之后的记录
+
+        Returns:
+            (records, cursor, more)：cursor 为已返回的最大 seq
+        """
+        check_user(user)
+        rows = self._reader().execute(
+            f"SELECT {COLUMNS} FROM history WHERE user = ? AND seq > ? ORDER BY seq LIMIT ?",
+            (user, after, limit + 1)
+        ).fetchall()
+        records = [_row_to_record(row) for row in rows[:limit]]
+        cursor = records[-1]['seq'] if records else after
+        return records, cursor, len(rows) > limit
+
+    def count(self, user):
+        check_user(user)
+        return self._reader().execute("SELECT COUNT(*) FROM history WHERE user = ?", (user,)).fetchone()[0]
+
+
+class HistoryService:
+    """serve.py 的 /api/history 和 /api/history/sync 入口"""
+
+    def __init__(self, store):
+        self.store = store
+
+    def handle(self, method, query, body):
+        try:
+            if method == 'GET':
+                records, next_before = self.store.page(
+                    query.get('user'),
+                    before=parse_before(query.get('before')),
+                    limit=parse_limit(query.get('limit'), DEFAULT_PAGE)
+                )
+                return HTTPStatus.OK, {'records': records, 'next': next_before}
+
+            if method == 'POST':
+                body = check_body(body)
+                accepted = self.store.append(body.get('user'), body.get('records', []))
+                return HTTPStatus.ACCEPTED, {'accepted': accepted}
+
+            if method == 'DELETE':
+                self.store.clear(query.get('user'))
+                return HTTPStatus.OK, {'cleared': True}
+        except ValueError as e:
+            return HTTPStatus.BAD_REQUEST, {'error': str(e)}
+
+        return HTTPStatus.METHOD_NOT_ALLOWED, {'error': '只支持 GET / POST / DELETE'}
+
+    def handle_sync(self, method, query, body):
+        """上传本地新记录并拉取 since 之后的服务端记录（包含刚上传的记录）"""
+        if method != 'POST':
+            return HTTPStatus.METHOD_NOT_ALLOWED, {'error': '只支持 POST'}
+        try:
+            body = check_body(body)
+            user = body.get('user')
+            since = body.get('since') or 0
+            if not isinstance(since, int) or since < 0:
+                raise ValueError("since 必须是非负整数")
+            limit = parse_limit(body.get('limit'), MAX_RECORDS)
+            # 等待本次上传的记录提交，返回结果中才能包含它们的 seq
+            self.store.append(user, body.get('records', []), wait=True)
+        except ValueError as e:
+            return HTTPStatus.BAD_REQUEST, {'error': str(e)}
+
+        records, cursor, more = self.store.since(user, since, limit)
+        return HTTPStatus.OK, {'records': records, 'cursor': cursor, 'more': more}
+
+
+def load_history_service(path=HISTORY_DB):
+    return HistoryService(HistoryStore(path))
+
+
+if __name__ == "__main__":
+    import tempfile
+    import time
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = HistoryStore(os.path.join(tmp, 'history.db'))
+        user = 'benchmark-user'
+        draws = 100_000
+
+        start = time.perf_counter()
+        for i in range(draws):
+            store.append(user, [{'clientId': str(i), 'id': i % 100 + 1, 'timestamp': 1_760_000_000_000 + i}])
+        queued = time.perf_counter() - start
+        store.flush()
+        elapsed = time.perf_counter() - start
+        print(f"📝 {draws} 条记录：排队 {queued:.2f}s，提交完成 {elapsed:.2f}s（{draws/elapsed:,.0f} 条/秒）")
+
+        start = time.perf_counter()
+        before, pages = None, 0
+        while True:
+            _, before = store.page(user, before=before, limit=DEFAULT_PAGE)
+            pages += 1
+            if before is None:
+                break
+        elapsed = time.perf_counter() - start
+        print(f"📖 分页读取 {pages} 页耗时 {elapsed:.2f}s（每页 {elapsed/pages*1000:.2f}ms）")
+        print(f"📊 共 {store.count(user)} 条记录")
+        store.close()
+    sys.exit(0)
@@ -0,0 +1,462 @@
+#!/usr/bin/env python3
+"""
+构建脚本的统一性能埋点
+
+每次运行写出一份 JSON 报告（.build-cache/reports/<脚本>-<时间>.json），记录：
+  - 总墙钟时间、进程 CPU 时间、子进程（图片和释义的进程池）CPU 时间、峰值 RSS
+  - 每个阶段的调用次数、墙钟时间、本线程 CPU 时间
+
+按需开启的剖析（--profile 参数或 YINIAN_PROFILE 环境变量，逗号分隔，all 表示全部）：
+  memory    tracemalloc 统计每个阶段的 Python 内存峰值（会让分配密集的代码变慢）
+  cprofile  cProfile 剖析主线程和执行阶段的工作线程（如 build.py 的线程池），合并写出 .pstats
+            （可用 snakeviz / flameprof / gprof2dot 查看），报告中附带累计耗时最高的函数
+  flame     按 CPU 时间每毫秒采样正在执行阶段的线程（没有时采样主线程）的调用栈，
+            写出折叠栈 .folded（flamegraph.pl、speedscope、inferno 可直接读取）
+
+用法：
+  from instrumentation import instrument, stage
+
+  with instrument('enrich_interpretations', profile=args.profile):
+      with stage('load'):
+          ...
+
+  @stage('tiles')
+  def build_tile_pyramids(...): ...
+
+stage() 在没有正在进行的 instrument() 时不做任何事；instrument() 嵌套时
+（如 build.py 调用各脚本的函数）只记录为外层运行的一个阶段，不重复写报告。
+
+  python3 instrumentation.py                 # 列出最近的报告
+  python3 instrumentation.py enrich_interpretations   # 对比该脚本最近几次运行的各阶段耗时
+"""
+
+import contextlib
+import cProfile
+import json
+import os
+import platform
+import pstats
+import signal
+import sys
+import threading
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+PROFILE_ENV = "YINIAN_PROFILE"
+PROFILE_MODES = ('memory', 'cprofile', 'flame')
+REPORT_DIR = ".build-cache/reports"
+REPORT_VERSION = 1
+
+# 采样间隔（秒，按进程 CPU 时间计）
+SAMPLE_INTERVAL = 0.001
+# 报告中列出的函数数
+TOP_FUNCTIONS = 20
+
+_active = None
+_active_lock = threading.Lock()
+
+
+def parse_modes(value):
+    """'memory,cprofile' / 'all' → ('memory', 'cprofile')"""
+    modes = set()
+    for part in (value or '').split(','):
+        part = part.strip().lower()
+        if not part:
+            continue
+        if part == 'all':
+            modes.update(PROFILE_MODES)
+        elif part in PROFILE_MODES:
+            modes.add(part)
+        else:
+            raise ValueError(f"未知的剖析模式: {part}（可选: {', '.join(PROFILE_MODES)}、all）")
+    return tuple(m for m in PROFILE_MODES if m in modes)
+
+
+def add_profile_argument(parser):
+    """给脚本的 argparse 添加 --profile 参数"""
+    parser.add_argument('--profile', default=None, metavar='MODES',
+                        help=f"性能剖析：{'、'.join(PROFILE_MODES)}（逗号分隔，all 为全部；"
+                             f"也可设置环境变量 {PROFILE_ENV}）")
+
+
+def _max_rss_bytes():
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 以 KB 为单位，macOS 以字节为单位
+    return rss if sys.platform == 'darwin' else rss * 1024
+
+
+def _children_cpu():
+    if resource is None:
+        return None
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
+class _StageStats:
+    __slots__ = ('calls', 'wall', 'cpu', 'peak')
+
+    def __init__(self):
+        self.calls = 0
+        self.wall = 0.0
+        self.cpu = 0.0
+        self.peak = None
+
+
+class _StackSampler:
+    """
+    用 ITIMER_PROF 信号采样调用栈，汇总为折叠栈
+
+    信号在主线程处理，通过 sys._current_frames() 读取其他线程的栈。
+    threads() 返回要采样的线程 id（正在执行阶段的线程），为空时采样主线程，
+    避免把主线程等待线程池的时间算进去。工作线程在阶段内屏蔽 SIGPROF（见 Run.stage），
+    信号因此总是递送给主线程，即使主线程正阻塞在等待线程池上。
+    """
+
+    def __init__(self, threads, interval=SAMPLE_INTERVAL):
+        self.threads = threads
+        self.interval = interval
+        self.counts = {}
+        self.previous = None
+
+    def _record(self, frame):
+        stack = []
+        while frame is not None:
+            code = frame.f_code
+            stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+            frame = frame.f_back
+        key = ';'.join(reversed(stack))
+        self.counts[key] = self.counts.get(key, 0) + 1
+
+    def _handler(self, signum, frame):
+        main = threading.main_thread().ident
+        frames = sys._current_frames()
+        idents = [ident for ident in self.threads() if ident in frames] or [main]
+        for ident in idents:
+            # 主线程用被信号打断处的栈（_current_frames 中是处理函数自身）
+            self._record(frame if ident == main else frames[ident])
+
+    def start(self):
+        if threading.current_thread() is not threading.main_thread() or not hasattr(signal, 'setitimer'):
+            print("⚠️  flame 采样只支持在类 Unix 系统的主线程中运行，已跳过")
+            return False
+        self.previous = signal.signal(signal.SIGPROF, self._handler)
+        signal.setitimer(signal.ITIMER_PROF, self.interval, self.interval)
+        return True
+
+    def stop(self):
+        signal.setitimer(signal.ITIMER_PROF, 0, 0)
+        signal.signal(signal.SIGPROF, self.previous or signal.SIG_DFL)
+
+    def write(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            for stack, count in sorted(self.counts.items()):
+                f.write(f"{stack} {count}\n")
+
+
+class Run:
+    """一次脚本运行的埋点数据"""
+
+    def __init__(self, name, modes=(), report_dir=REPORT_DIR):
+        self.name = name
+        self.modes = modes
+        self.report_dir = Path(report_dir)
+        self.stages = {}
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        # 正在进行的阶段（跨线程），用于分摊 tracemalloc 峰值
+        self.open_stages = []
+        # 线程 id → 进行中的阶段数，flame 只采样这些线程
+        self.active_threads = {}
+        self.profiler = None
+        # 工作线程各自的 cProfile（cProfile 只记录启用它的线程）
+        self.thread_profilers = []
+        self.sampler = None
+        self.status = 'ok'
+
+    # ---------- 阶段 ----------
+
+    def _checkpoint(self):
+        """把上次重置以来的内存峰值计入所有进行中的阶段，再重置峰值"""
+        if not tracemalloc.is_tracing():
+            return
+        _, peak = tracemalloc.get_traced_memory()
+        for stats in self.open_stages:
+            stats.peak = max(stats.peak or 0, peak)
+        tracemalloc.reset_peak()
+
+    def _thread_profiler(self):
+        """在工作线程的最外层阶段启用单独的 cProfile，主线程由 start() 中的剖析器覆盖"""
+        if not self.profiler or threading.current_thread() is threading.main_thread():
+            return None
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Python 3.12+ 的 cProfile 基于 sys.monitoring，主线程的剖析器已覆盖所有线程
+            return None
+        return profiler
+
+    def _block_sampler_signal(self):
+        """工作线程屏蔽 SIGPROF，让采样信号递送给主线程；返回原来的信号掩码"""
+        if (not self.sampler or threading.current_thread() is threading.main_thread()
+                or not hasattr(signal, 'pthread_sigmask')):
+            return None
+        return signal.pthread_sigmask(signal.SIG_BLOCK, {signal.SIGPROF})
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        stack = getattr(self.local, 'stack', None)
+        if stack is None:
+            stack = self.local.stack = []
+        path = '/'.join(stack + [name])
+        ident = threading.get_ident()
+
+        with self.lock:
+            stats = self.stages.get(path)
+            if stats is None:
+                stats = self.stages[path] = _StageStats()
+            self._checkpoint()
+            self.open_stages.append(stats)
+            self.active_threads[ident] = self.active_threads.get(ident, 0) + 1
+
+        profiler = self._thread_profiler() if not stack else None
+        mask = self._block_sampler_signal() if not stack else None
+        stack.append(name)
+        wall_start = time.perf_counter()
+        cpu_start = time.thread_time()
+        try:
+            yield
+        finally:
+            wall = time.perf_counter() - wall_start
+            cpu = time.thread_time() - cpu_start
+            stack.pop()
+            if profiler:
+                profiler.disable()
+            if mask is not None:
+                signal.pthread_sigmask(signal.SIG_SETMASK, mask)
+            with self.lock:
+                self._checkpoint()
+                self.open_stages.remove(stats)
+                if self.active_threads[ident] == 1:
+                    del self.active_threads[ident]
+                else:
+                    self.active_threads[ident] -= 1
+                if profiler:
+                    self.thread_profilers.append(profiler)
+                stats.calls += 1
+                stats.wall += wall
+                stats.cpu += cpu
+
+    # ---------- 整体 ----------
+
+    def start(self):
+        self.started = datetime.now().astimezone()
+        self.base = self.report_dir / f"{self.name}-{self.started:%Y%m%d-%H%M%S}-{os.getpid()}"
+        if 'memory' in self.modes and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        if 'flame' in self.modes:
+            # 在信号处理函数中读取，复制字典而不加锁（持锁的线程可能正是被打断的主线程）
+            sampler = _StackSampler(lambda: list(dict(self.active_threads)))
+            self.sampler = sampler if sampler.start() else None
+        if 'cprofile' in self.modes:
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+        self.children_cpu_start = _children_cpu()
+        self.wall_start = time.perf_counter()
+        self.cpu_start = time.process_time()
+
+    def finish(self):
+        self.wall = time.perf_counter() - self.wall_start
+        self.cpu = time.process_time() - self.cpu_start
+        children = _children_cpu()
+        self.children_cpu = None if children is None else children - self.children_cpu_start
+        if self.profiler:
+            self.profiler.disable()
+        if self.sampler:
+            self.sampler.stop()
+        self.traced_peak = None
+        if tracemalloc.is_tracing():
+            self.traced_peak = tracemalloc.get_traced_memory()[1]
+            for stats in self.stages.values():
+                # 峰值按阶段内的最大值记录，整体峰值取所有阶段和阶段外的最大值
+                self.traced_peak = max(self.traced_peak, stats.peak or 0)
+            tracemalloc.stop()
+
+    def _profile_stats(self):
+        stats = pstats.Stats(self.profiler)
+        for profiler in self.thread_profilers:
+            stats.add(profiler)
+        return stats
+
+    def _top_functions(self, stats):
+        stats = stats.stats
+        rows = sorted(stats.items(), key=lambda item: item[1][3], reverse=True)[:TOP_FUNCTIONS]
+        return [
+            {
+                'function': f"{func} ({os.path.basename(filename)}:{line})",
+                'calls': nc,
+                'self_seconds': round(tt, 6),
+                'cumulative_seconds': round(ct, 6)
+            }
+            for (filename, line, func), (cc, nc, tt, ct, callers) in rows
+        ]
+
+    def report(self):
+        stages = [
+            {
+                'name': name,
+                'calls': stats.calls,
+                'wall_seconds': round(stats.wall, 6),
+                'cpu_seconds': round(stats.cpu, 6),
+                'peak_bytes': stats.peak
+            }
+            for name, stats in self.stages.items()
+        ]
+        return {
+            'version': REPORT_VERSION,
+            'script': self.name,
+            'started': self.started.isoformat(timespec='seconds'),
+            'status': self.status,
+            'argv': sys.argv,
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+            'wall_seconds': round(self.wall, 6),
+            'cpu_seconds': round(self.cpu, 6),
+            'children_cpu_seconds': None if self.children_cpu is None else round(self.children_cpu, 6),
+            'max_rss_bytes': _max_rss_bytes(),
+            'traced_peak_bytes': self.traced_peak,
+            'stages': stages,
+            'profile': {'modes': list(self.modes)}
+        }
+
+    def write(self):
+        """写出报告（和剖析文件），返回报告路径"""
+        self.report_dir.mkdir(parents=True, exist_ok=True)
+        report = self.report()
+        if self.profiler:
+            pstats_path = self.base.with_suffix('.pstats')
+            stats = self._profile_stats()
+            stats.dump_stats(pstats_path)
+            report['profile']['pstats'] = pstats_path.as_posix()
+            report['profile']['threads'] = 1 + len(self.thread_profilers)
+            report['profile']['top_functions'] = self._top_functions(stats)
+        if self.sampler:
+            folded_path = self.base.with_suffix('.folded')
+            self.sampler.write(folded_path)
+            report['profile']['folded'] = folded_path.as_posix()
+            report['profile']['samples'] = sum(self.sampler.counts.values())
+
+        path = self.base.with_suffix('.json')
+        tmp_path = path.with_name(path.name + '.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, path)
+        return path
+
+
+@contextlib.contextmanager
+def stage(name):
+    """记录一个阶段；没有正在进行的 instrument() 时直接执行"""
+    run = _active
+    if run is None:
+        yield
+        return
+    with run.stage(name):
+        yield
+
+
+@contextlib.contextmanager
+def instrument(name, profile=None, report_dir=REPORT_DIR):
+    """
+    记录一次脚本运行并写出报告
+
+    Args:
+        name: 脚本名（报告文件名前缀）
+        profile: 剖析模式，None 时读取 YINIAN_PROFILE 环境变量
+        report_dir: 报告目录
+    """
+    global _active
+    with _active_lock:
+        outer = _active
+        if outer is None:
+            modes = parse_modes(profile if profile is not None else os.environ.get(PROFILE_ENV))
+            run = _active = Run(name, modes, report_dir)
+
+    if outer is not None:
+        with outer.stage(name):
+            yield outer
+        return
+
+    run.start()
+    try:
+        yield run
+    except SystemExit as e:
+        if e.code not in (None, 0):
+            run.status = f"exit: {e.code}"
+        raise
+    except BaseException as e:
+        run.status = f"error: {type(e).__name__}"
+        raise
+    finally:
+        run.finish()
+        with _active_lock:
+            _active = None
+        try:
+            path = run.write()
+        except OSError as e:
+            print(f"⚠️  写入性能报告失败: {e}")
+        else:
+            print(f"📈 性能报告: {path}（{run.wall:.2f}s）")
+
+
+def load_reports(name=None, report_dir=REPORT_DIR):
+    """按时间顺序读取报告，name 指定时只读取该脚本的报告"""
+    reports = []
+    for path in sorted(Path(report_dir).glob(f"{name or '*'}-*.json")):
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                report = json.load(f)
+        except (OSError, ValueError):
+            continue
+        if name is None or report.get('script') == name:
+            reports.append(report)
+    return sorted(reports, key=lambda r: r.get('started', ''))
+
+
+if __name__ == "__main__":
+    name = sys.argv[1] if len(sys.argv) > 1 else None
+    reports = load_reports(name)
+    if not reports:
+        print(f"📭 {REPORT_DIR} 中没有{'「' + name + '」的' if name else ''}性能报告")
+        sys.exit(0)
+
+    if name is None:
+        for report in reports[-20:]:
+            print(f"  {report['started']}  {report['script']:<28} {report['wall_seconds']:>8.2f}s  {report['status']}")
+        sys.exit(0)
+
+    # 最近几次运行的各阶段耗时对比
+    recent = reports[-5:]
+    stage_names = list(dict.fromkeys(s['name'] for r in recent for s in r['stages']))
+    print(f"📊 {name} 最近 {len(recent)} 次运行（墙钟秒数）")
+    print(f"  {'阶段':<24}" + ''.join(f"{r['started'][5:16]:>14}" for r in recent))
+    for stage_name in ['(总计)'] + stage_names:
+        cells = []
+        for r in recent:
+            if stage_name == '(总计)':
+                cells.append(r['wall_seconds'])
+            else:
+                match = next((s for s in r['stages'] if s['name'] == stage_name), None)
+                cells.append(match['wall_seconds'] if match else None)
+        print(f"  {stage_name:<24}" + ''.join(f"{c:>14.3f}" if c is not None else f"{'-':>14}" for c in cells))
+    sys.exit(0)
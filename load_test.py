@@ -0,0 +1,448 @@
+#!/usr/bin/env python3
+"""
+摇签高峰压测 - asyncio 负载生成器
+
+模拟活动现场大量手机同时摇签：每个虚拟用户用一条 keep-alive 连接（服务器关闭连接时重连）
+按顺序请求一次页面所需的全部资源，图片随机取一支签的正反面：
+
+  legacy  index.html → app.js → 完整签文 JSON（约 390KB）→ 签文正面 → 签文背面
+  split   index.html → app.js → 精简索引 index.json → 详情分片 → 签文正面 → 签文背面
+
+到达模型：
+  --rate 0（默认）   一次性涌入：--concurrency 个用户同时开始，完成后由下一个用户补上
+  --rate N           按泊松过程每秒到达 N 个用户，同时在线的用户不超过 --concurrency
+
+报告（JSON）包含每个请求和每个用户完整流程的 p50/p95/p99 延迟、吞吐量、错误率、
+按状态码 / 错误类型 / 路径的统计。--ramp 依次提高并发，找出满足 SLO 的最大并发数。
+
+用法：
+  python3 load_test.py --spawn serve --users 2000 --concurrency 200
+  python3 load_test.py --url http://192.168.1.10:8080 --rate 50 --duration 60
+  python3 load_test.py --spawn http.server --ramp 10,50,100,200,500 --slo-p95 2000
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+from urllib.parse import urlsplit
+
+ROOT = Path(__file__).resolve().parent
+REPORT_DIR = ".build-cache/reports"
+
+FORTUNE_COUNT = 100
+SHARD_SIZE = 5  # 与 split_fortunes.SHARD_SIZE 一致
+
+SCENARIOS = {
+    'legacy': lambda n: [
+        '/',
+        '/js/app.js',
+        '/data/senso-ji-fortunes-full-optimized-v1.json',
+        f'/data/senso-ji-omikuji-main/{n}_0.jpg',
+        f'/data/senso-ji-omikuji-main/{n}_1.jpg',
+    ],
+    'split': lambda n: [
+        '/',
+        '/js/app.js',
+        '/data/fortunes/index.json',
+        f'/data/fortunes/detail-{(n - 1) // SHARD_SIZE}.json',
+        f'/data/senso-ji-omikuji-main/{n}_0.jpg',
+        f'/data/senso-ji-omikuji-main/{n}_1.jpg',
+    ],
+}
+
+# 与手机浏览器一致：接受压缩，serve.py 会直接发送预压缩副本
+REQUEST_HEADERS = "Accept: */*\r\nAccept-Encoding: br, gzip\r\nUser-Agent: yinian-load-test/1.0\r\n"
+
+
+def percentile(ordered, p):
+    """最近秩法百分位，ordered 已排序"""
+    if not ordered:
+        return None
+    k = math.ceil(p / 100 * len(ordered)) - 1
+    return ordered[max(0, min(len(ordered) - 1, k))]
+
+
+def summarize(latencies):
+    """秒 → 毫秒统计"""
+    ordered = sorted(latencies)
+    if not ordered:
+        return {'count': 0}
+    ms = lambda v: round(v * 1000, 2)
+    return {
+        'count': len(ordered),
+        'mean': ms(sum(ordered) / len(ordered)),
+        'p50': ms(percentile(ordered, 50)),
+        'p95': ms(percentile(ordered, 95)),
+        'p99': ms(percentile(ordered, 99)),
+        'max': ms(ordered[-1]),
+    }
+
+
+class HTTPError(Exception):
+    pass
+
+
+class Connection:
+    """最简 HTTP/1.1 客户端：一条连接顺序发送请求，支持 Content-Length、chunked 和关闭连接"""
+
+    def __init__(self, host, port, timeout):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.reader = None
+        self.writer = None
+
+    async def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            try:
+                await self.writer.wait_closed()
+            except OSError:
+                pass
+        self.reader = self.writer = None
+
+    async def get(self, path):
+        """返回 (状态码, 正文字节数)"""
+        return await asyncio.wait_for(self._get(path), self.timeout)
+
+    async def _get(self, path):
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        request = f"GET {path} HTTP/1.1\r\nHost: {self.host}:{self.port}\r\n{REQUEST_HEADERS}\r\n"
+        self.writer.write(request.encode('latin-1'))
+        await self.writer.drain()
+
+        status_line = await self.reader.readline()
+        if not status_line:
+            raise HTTPError('connection_closed')
+        version, status, *_ = status_line.decode('latin-1').split(' ', 2)
+        headers = {}
+        while True:
+            line = await self.reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            key, _, value = line.decode('latin-1').partition(':')
+            headers[key.strip().lower()] = value.strip()
+
+        size = 0
+        if headers.get('transfer-encoding', '').lower() == 'chunked':
+            while True:
+                chunk = int((await self.reader.readline()).split(b';')[0], 16)
+                if chunk == 0:
+                    await self.reader.readline()
+                    break
+                size += len(await self.reader.readexactly(chunk + 2)) - 2
+        elif 'content-length' in headers:
+            size = len(await self.reader.readexactly(int(headers['content-length'])))
+        else:
+            size = len(await self.reader.read())
+
+        connection = headers.get('connection', '').lower()
+        if connection == 'close' or (version == 'HTTP/1.0' and connection != 'keep-alive') or \
+                'content-length' not in headers and 'transfer-encoding' not in headers:
+            await self.close()
+        return int(status), size
+
+
+class LoadTest:
+    """
+    一轮压测
+
+    Args:
+        url: 被测站点
+        scenario: 请求序列（SCENARIOS 的键）
+        users: 总用户数（与 duration 同时给出时先到为止）
+        duration: 最长持续时间（秒）
+        concurrency: 同时在线的用户上限
+        rate: 每秒到达的用户数，0 表示一次性涌入
+        timeout: 单个请求的超时（秒）
+    """
+
+    def __init__(self, url, scenario='legacy', users=1000, duration=None, concurrency=100,
+                 rate=0.0, timeout=30.0, seed=None):
+        parts = urlsplit(url)
+        self.host = parts.hostname or '127.0.0.1'
+        self.port = parts.port or 80
+        self.prefix = parts.path.rstrip('/')
+        self.url = url
+        self.scenario = scenario
+        self.users = users
+        self.duration = duration
+        self.concurrency = concurrency
+        self.rate = rate
+        self.timeout = timeout
+        self.random = random.Random(seed)
+
+        self.request_latencies = []
+        self.session_latencies = []
+        self.by_path = {}
+        self.by_status = {}
+        self.by_error = {}
+        self.bytes = 0
+        self.completed_users = 0
+        self.failed_users = 0
+
+    def record_error(self, kind):
+        self.by_error[kind] = self.by_error.get(kind, 0) + 1
+
+    async def user(self, fortune_id):
+        conn = Connection(self.host, self.port, self.timeout)
+        start = time.perf_counter()
+        failed = False
+        try:
+            for path in SCENARIOS[self.scenario](fortune_id):
+                request_start = time.perf_counter()
+                try:
+                    status, size = await conn.get(self.prefix + path)
+                except asyncio.TimeoutError:
+                    self.record_error('timeout')
+                    failed = True
+                    await conn.close()
+                    continue
+                except (OSError, HTTPError, ValueError, asyncio.IncompleteReadError) as e:
+                    self.record_error(str(e) if isinstance(e, HTTPError) else type(e).__name__)
+                    failed = True
+                    await conn.close()
+                    continue
+
+                elapsed = time.perf_counter() - request_start
+                self.request_latencies.append(elapsed)
+                self.by_status[status] = self.by_status.get(status, 0) + 1
+                self.bytes += size
+                # 按场景中的位置归类路径，图片不区分签号
+                key = path.rsplit('/', 1)[0] + '/*' if '/senso-ji-omikuji-main/' in path or '/detail-' in path \
+                    else path
+                stats = self.by_path.setdefault(key, {'latencies': [], 'bytes': 0, 'errors': 0})
+                stats['latencies'].append(elapsed)
+                stats['bytes'] += size
+                if status >= 400:
+                    stats['errors'] += 1
+                    failed = True
+        finally:
+            await conn.close()
+
+        if failed:
+            self.failed_users += 1
+        else:
+            self.completed_users += 1
+            self.session_latencies.append(time.perf_counter() - start)
+
+    async def run(self):
+        semaphore = asyncio.Semaphore(self.concurrency)
+        deadline = time.perf_counter() + self.duration if self.duration else None
+        tasks = set()
+        started = 0
+
+        async def guarded(fortune_id):
+            try:
+                await self.user(fortune_id)
+            finally:
+                semaphore.release()
+
+        self.start = time.perf_counter()
+        next_arrival = self.start
+        while self.users is None or started < self.users:
+            if deadline and time.perf_counter() >= deadline:
+                break
+            if self.rate > 0:
+                next_arrival += self.random.expovariate(self.rate)
+                delay = next_arrival - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            await semaphore.acquire()
+            task = asyncio.create_task(guarded(self.random.randint(1, FORTUNE_COUNT)))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+            started += 1
+
+        if tasks:
+            await asyncio.wait(tasks)
+        self.elapsed = time.perf_counter() - self.start
+        return self.report()
+
+    def report(self):
+        total = sum(self.by_status.values()) + sum(self.by_error.values())
+        errors = sum(self.by_error.values()) + sum(c for s, c in self.by_status.items() if s >= 400)
+        elapsed = self.elapsed or 1e-9
+        return {
+            'url': self.url,
+            'scenario': self.scenario,
+            'config': {
+                'users': self.users,
+                'duration': self.duration,
+                'concurrency': self.concurrency,
+                'rate': self.rate,
+                'timeout': self.timeout,
+            },
+            'elapsed_seconds': round(self.elapsed, 3),
+            'users': {
+                'completed': self.completed_users,
+                'failed': self.failed_users,
+                'per_second': round((self.completed_users + self.failed_users) / elapsed, 2),
+            },
+            'requests': {
+                'total': total,
+                'errors': errors,
+                'error_rate': round(errors / total, 6) if total else 0.0,
+                'per_second': round(total / elapsed, 2),
+                'by_status': {str(k): v for k, v in sorted(self.by_status.items())},
+                'by_error': dict(sorted(self.by_error.items())),
+            },
+            'throughput_mb_per_second': round(self.bytes / elapsed / 1024 / 1024, 3),
+            'latency_ms': summarize(self.request_latencies),
+            'session_ms': summarize(self.session_latencies),
+            'by_path': {
+                path: dict(summarize(stats['latencies']), bytes=stats['bytes'], errors=stats['errors'])
+                for path, stats in self.by_path.items()
+            },
+        }
+
+
+def print_summary(report):
+    latency = report['latency_ms']
+    session = report['session_ms']
+    requests = report['requests']
+    print(f"👥 并发 {report['config']['concurrency']}：完成 {report['users']['completed']} 位用户，"
+          f"失败 {report['users']['failed']} 位（{report['users']['per_second']} 位/秒）")
+    print(f"📨 {requests['total']} 个请求，{requests['per_second']} 个/秒，"
+          f"{report['throughput_mb_per_second']} MB/s，错误率 {requests['error_rate']:.2%}")
+    if latency['count']:
+        print(f"⏱️  请求 p50 {latency['p50']}ms / p95 {latency['p95']}ms / p99 {latency['p99']}ms")
+    if session['count']:
+        print(f"📱 整个流程 p50 {session['p50']}ms / p95 {session['p95']}ms / p99 {session['p99']}ms")
+    if requests['by_error']:
+        print(f"⚠️  错误: {requests['by_error']}")
+
+
+# ==================== 被测服务器 ====================
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def spawn_server(kind):
+    """启动本地服务器：serve（serve.py）或 http.server（start.sh 以前的方式），返回 (进程, url)"""
+    port = free_port()
+    if kind == 'serve':
+        cmd = [sys.executable, str(ROOT / 'serve.py'), '--port', str(port), '--host', '127.0.0.1',
+               '--quiet', '--skip-verify', '--no-api']
+        cwd = ROOT
+    else:
+        cmd = [sys.executable, '-m', 'http.server', str(port), '--bind', '127.0.0.1']
+        cwd = ROOT / 'omikuji'
+    process = subprocess.Popen(cmd, cwd=cwd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    deadline = time.monotonic() + 10
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"服务器启动失败: {' '.join(cmd)}")
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=0.2).close()
+            return process, f"http://127.0.0.1:{port}"
+        except OSError:
+            time.sleep(0.05)
+    process.terminate()
+    raise RuntimeError("等待服务器启动超时")
+
+
+def write_report(report, output):
+    if output == '-':
+        json.dump(report, sys.stdout, ensure_ascii=False, indent=2)
+        print()
+        return None
+    path = Path(output) if output else Path(REPORT_DIR) / f"load_test-{datetime.now():%Y%m%d-%H%M%S}.json"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(path.name + '.tmp')
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+    return path
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="摇签高峰压测")
+    target = parser.add_mutually_exclusive_group()
+    target.add_argument('--url', default='http://127.0.0.1:8080', help="被测站点（默认 http://127.0.0.1:8080）")
+    target.add_argument('--spawn', choices=['serve', 'http.server'],
+                        help="在随机端口启动本地服务器后压测，结束后关闭")
+    parser.add_argument('--scenario', choices=sorted(SCENARIOS), default='legacy', help="请求序列（默认 legacy）")
+    parser.add_argument('-n', '--users', type=int, default=1000, help="总用户数（默认 1000）")
+    parser.add_argument('-d', '--duration', type=float, default=None, help="最长持续时间（秒）")
+    parser.add_argument('-c', '--concurrency', type=int, default=100, help="同时在线用户上限（默认 100）")
+    parser.add_argument('--rate', type=float, default=0.0, help="每秒到达的用户数（默认 0：一次性涌入）")
+    parser.add_argument('--timeout', type=float, default=30.0, help="单个请求超时（秒）")
+    parser.add_argument('--seed', type=int, default=None, help="随机种子（签号和到达间隔可复现）")
+    parser.add_argument('--ramp', default=None, metavar='C1,C2,...',
+                        help="依次以这些并发数压测，报告满足 SLO 的最大并发")
+    parser.add_argument('--slo-p95', type=float, default=2000.0, help="整个流程 p95 上限（毫秒，--ramp 使用）")
+    parser.add_argument('--max-error-rate', type=float, default=0.01, help="错误率上限（--ramp 使用）")
+    parser.add_argument('-o', '--output', default=None,
+                        help=f"JSON 报告路径（默认 {REPORT_DIR}/load_test-<时间>.json，- 输出到标准输出）")
+    args = parser.parse_args(argv)
+    if args.duration is not None and args.users == parser.get_default('users'):
+        args.users = None
+    return args
+
+
+def main(args):
+    process = None
+    url = args.url
+    if args.spawn:
+        process, url = spawn_server(args.spawn)
+        print(f"🚀 已启动 {args.spawn}: {url}")
+
+    levels = [int(c) for c in args.ramp.split(',')] if args.ramp else [args.concurrency]
+    rounds = []
+    try:
+        for concurrency in levels:
+            test = LoadTest(url, args.scenario, users=args.users, duration=args.duration,
+                            concurrency=concurrency, rate=args.rate, timeout=args.timeout, seed=args.seed)
+            report = asyncio.run(test.run())
+            print_summary(report)
+            rounds.append(report)
+    finally:
+        if process:
+            process.terminate()
+            process.wait()
+
+    if args.ramp:
+        passing = [
+            r for r in rounds
+            if r['requests']['error_rate'] <= args.max_error_rate
+            and r['session_ms'].get('p95') is not None and r['session_ms']['p95'] <= args.slo_p95
+        ]
+        capacity = max((r['config']['concurrency'] for r in passing), default=0)
+        result = {
+            'server': args.spawn or url,
+            'slo': {'session_p95_ms': args.slo_p95, 'max_error_rate': args.max_error_rate},
+            'capacity_concurrency': capacity,
+            'rounds': rounds,
+        }
+        print(f"🎯 满足 SLO（流程 p95 ≤ {args.slo_p95:.0f}ms，错误率 ≤ {args.max_error_rate:.1%}）的最大并发: {capacity}")
+    else:
+        result = dict(rounds[0], server=args.spawn or url)
+
+    path = write_report(result, args.output)
+    if path:
+        print(f"📋 报告: {path}")
+    ok = all(r['requests']['error_rate'] <= args.max_error_rate for r in rounds)
+    return 0 if ok or args.ramp else 1
+
+
+if __name__ == "__main__":
+    try:
+        sys.exit(main(parse_args()))
+    except (OSError, RuntimeError, ValueError) as e:
+        print(f"❌ 压测失败: {e}")
+        sys.exit(1)
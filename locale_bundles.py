@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+"""
+按语言拆分签文详情 - 每个客户端只下载自己语言的文字
+
+线上签文 JSON 中每条签同时包含多种语言：签诗原文（poem.lines）、繁体逐句释义
+（poem.lineInterpretations）和简体现代解读（interpretation.*）。本脚本在
+split_fortunes.py 的精简索引（id、签级、首句、图片，与语言无关）之外，为每种语言
+生成一套与 detail-N.json 分片方式相同的详情分片：
+
+  omikuji/data/fortunes/zh-Hant/detail-N.json   签诗 + 繁体逐句释义
+  omikuji/data/fortunes/zh-Hans/detail-N.json   签诗 + 逐句释义 + 简体现代解读
+  omikuji/data/fortunes/ja/detail-N.json        签诗 + 日文译文（translations.ja）
+  omikuji/data/fortunes/en/detail-N.json        签诗 + 英文译文（translations.en）
+
+签诗原文和图片衍生字段（响应式图片、占位图、主色、瓦片）与语言无关，每种语言都包含；
+使用语言包时页面只加载这一套详情，缺少这些字段会关掉 <picture>、占位图和瓦片查看。
+简体没有单独的逐句释义，沿用繁体。
+数据中还没有任何译文的语言不会发布（目前是 ja、en），前端自动回退到默认语言。
+
+分片列表写入 index.json 的 locales 字段，app.js 按浏览器语言（或 ?lang=）只加载一套。
+各语言在进程池中并行生成，按源文件哈希缓存，源文件未变化时跳过。
+
+用法：
+  python3 locale_bundles.py                # 生成全部语言（需先运行 split_fortunes.py）
+  python3 locale_bundles.py zh-Hant ja     # 只生成指定语言
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import sys
+import time
+from pathlib import Path
+
+from optimize_images import file_sha256, load_manifest, run_jobs, save_manifest
+from split_fortunes import OUTPUT_DIR, SHARD_SIZE, SOURCE_FILE, write_compact_json
+
+MANIFEST_FILE = ".build-cache/locale-manifest.json"
+
+# 每种语言的详情字段：{写入的路径: 源数据中的路径}
+# 签诗原文（VERSE）和图片衍生字段（IMAGE_FIELDS，images 阶段写入）每种语言都包含，不计入译文
+VERSE = 'poem.lines'
+IMAGE_FIELDS = tuple(f'image{side}{suffix}' for side in ('Front', 'Back')
+                     for suffix in ('Sources', 'Placeholder', 'Color', 'Tiles'))
+LOCALES = {
+    'zh-Hant': {
+        'poem.lineInterpretations': 'poem.lineInterpretations',
+    },
+    'zh-Hans': {
+        'poem.lineInterpretations': 'poem.lineInterpretations',
+        'interpretation': 'interpretation',
+    },
+    'ja': {
+        'poem.lineInterpretations': 'translations.ja.lineInterpretations',
+        'interpretation': 'translations.ja.interpretation',
+    },
+    'en': {
+        'poem.lineInterpretations': 'translations.en.lineInterpretations',
+        'interpretation': 'translations.en.interpretation',
+    },
+}
+# 界面语言；浏览器语言没有对应的语言包时使用
+DEFAULT_LOCALE = 'zh-Hans'
+
+
+def get_path(data, path):
+    for key in path.split('.'):
+        if not isinstance(data, dict) or key not in data:
+            return None
+        data = data[key]
+    return data
+
+
+def set_path(data, path, value):
+    *parents, key = path.split('.')
+    for parent in parents:
+        data = data.setdefault(parent, {})
+    data[key] = value
+
+
+def locale_detail(fortune, fields):
+    """
+    取出一条签在某种语言下的详情
+
+    Returns:
+        (详情, 是否包含译文)
+    """
+    detail = {field: fortune[field] for field in IMAGE_FIELDS if field in fortune}
+    set_path(detail, VERSE, get_path(fortune, VERSE) or [])
+    translated = False
+    for target, source in fields.items():
+        value = get_path(fortune, source)
+        if value:
+            set_path(detail, target, value)
+            translated = True
+    return detail, translated
+
+
+def spec_digest(locale, shard_size):
+    """语言定义和分片大小的摘要，定义变化时缓存失效"""
+    spec = json.dumps([VERSE, IMAGE_FIELDS, LOCALES[locale], shard_size], sort_keys=True)
+    return hashlib.sha256(spec.encode('utf-8')).hexdigest()[:16]
+
+
+def _build_locale(job):
+    """生成一种语言的全部分片（在子进程中执行）"""
+    source_file, output_dir, locale, shard_size = job
+    try:
+        with open(source_file, 'r', encoding='utf-8') as f:
+            fortunes = sorted(json.load(f)['fortunes'], key=lambda x: x['id'])
+
+        fields = LOCALES[locale]
+        details = [locale_detail(fortune, fields) for fortune in fortunes]
+        translated = sum(1 for _, has_text in details if has_text)
+
+        locale_dir = Path(output_dir) / locale
+        shutil.rmtree(locale_dir, ignore_errors=True)
+        # 定义了译文字段却没有任何译文：不发布
+        if fields and not translated:
+            return {'locale': locale, 'shards': [], 'translated': 0, 'bytes': 0, 'error': None}
+
+        locale_dir.mkdir(parents=True)
+        shards = []
+        total = 0
+        for shard, start in enumerate(range(0, len(fortunes), shard_size)):
+            name = f"detail-{shard}.json"
+            batch = zip(fortunes[start:start + shard_size], details[start:start + shard_size])
+            write_compact_json(locale_dir / name, {
+                'locale': locale,
+                'fortunes': {str(fortune['id']): detail for fortune, (detail, _) in batch}
+            })
+            shards.append(f"{locale}/{name}")
+            total += (locale_dir / name).stat().st_size
+        return {'locale': locale, 'shards': shards, 'translated': translated, 'bytes': total, 'error': None}
+    except Exception as e:
+        return {'locale': locale, 'error': str(e)}
+
+
+def build_locale_bundles(source_file=SOURCE_FILE, output_dir=OUTPUT_DIR, locales=None,
+                         shard_size=SHARD_SIZE, workers=None, manifest_path=MANIFEST_FILE, force=False):
+    """
+    生成各语言的详情分片，并把分片列表写入 output_dir/index.json 的 locales 字段
+
+    分片方式与 split_fortunes.py 相同（index.json 中的 shard 编号通用），
+    因此需要先生成 index.json。manifest_path 为 None 时不使用缓存（如临时的部署目录）。
+
+    Returns:
+        {语言: {'shards': [...], 'translated': 含译文的签数, 'bytes': 分片总大小}}，只包含已发布的语言
+    """
+    output_path = Path(output_dir)
+    index_file = output_path / 'index.json'
+    locales = list(locales or LOCALES)
+    for locale in locales:
+        if locale not in LOCALES:
+            raise ValueError(f"未知语言: {locale}（可选 {', '.join(LOCALES)}）")
+
+    workers = workers or min(len(locales), os.cpu_count() or 1)
+    manifest = load_manifest(manifest_path) if manifest_path else {}
+    source_hash = file_sha256(source_file)
+
+    start = time.perf_counter()
+    bundles = {}
+    jobs = []
+    for locale in locales:
+        key = (output_path / locale).as_posix()
+        entry = manifest.get(key)
+        if (not force and entry and entry.get('source') == source_hash
+                and entry.get('spec') == spec_digest(locale, shard_size)
+                and all((output_path / shard).exists() for shard in entry['shards'])):
+            bundles[locale] = {k: entry[k] for k in ('shards', 'translated', 'bytes')}
+            continue
+        jobs.append((str(source_file), str(output_path), locale, shard_size))
+
+    skipped = len(bundles)
+    for result in run_jobs(_build_locale, jobs, workers):
+        locale, error = result.pop('locale'), result.pop('error')
+        if error:
+            print(f"✗ {locale}: 错误 - {error}")
+            continue
+        bundles[locale] = result
+        manifest[(output_path / locale).as_posix()] = {
+            'source': source_hash,
+            'spec': spec_digest(locale, shard_size),
+            **result
+        }
+    if manifest_path:
+        save_manifest(manifest_path, manifest)
+
+    published = {locale: bundles[locale] for locale in locales if bundles.get(locale, {}).get('shards')}
+
+    # 只更新本次生成的语言，其余语言保持不变
+    with open(index_file, 'r', encoding='utf-8') as f:
+        index = json.load(f)
+    entries = {locale: entry for locale, entry in index.get('locales', {}).items() if locale not in locales}
+    entries.update({locale: {'shards': bundle['shards']} for locale, bundle in published.items()})
+    index['locales'] = {locale: entries[locale] for locale in LOCALES if locale in entries}
+    index['defaultLocale'] = DEFAULT_LOCALE
+    write_compact_json(index_file, index)
+
+    elapsed = time.perf_counter() - start
+    full = sum((output_path / shard).stat().st_size for shard in index['shards'])
+    for locale in locales:
+        bundle = bundles.get(locale)
+        if bundle is None:
+            continue
+        if not bundle['shards']:
+            print(f"⚠️  {locale}: 数据中没有译文，暂不发布（前端回退到 {DEFAULT_LOCALE}）")
+            continue
+        translated = f"，{bundle['translated']} 条含译文" if LOCALES[locale] else ''
+        print(f"🌐 {locale}: {len(bundle['shards'])} 个分片，{bundle['bytes']/1024:.1f}KB"
+              f"（完整详情 {full/1024:.1f}KB 的 {bundle['bytes']/full*100:.0f}%）{translated}")
+    print(f"✅ 语言包：生成 {len(bundles) - skipped} 种，跳过 {skipped} 种未变化的语言，耗时 {elapsed:.2f}s")
+
+    return published
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="按语言拆分签文详情")
+    parser.add_argument('locales', nargs='*', help=f"要生成的语言（默认全部）: {', '.join(LOCALES)}")
+    parser.add_argument('--source', default=SOURCE_FILE, help="线上签文 JSON")
+    parser.add_argument('--output', default=OUTPUT_DIR, help="分片目录（需已包含 index.json）")
+    parser.add_argument('-j', '--workers', type=int, default=None, help="并行进程数")
+    parser.add_argument('--force', action='store_true', help="忽略缓存，全部重新生成")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    try:
+        build_locale_bundles(args.source, args.output, args.locales or None,
+                             workers=args.workers, force=args.force)
+    except (OSError, ValueError, KeyError) as e:
+        print(f"❌ 生成失败: {e}")
+        sys.exit(1)
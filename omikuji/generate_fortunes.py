@@ -7,6 +7,10 @@
 
 import json
 import os
+import sys
+
+# 输出路径（相对于项目根目录），仅作为构建时的签文骨架，不直接上线
+OUTPUT_FILE = "omikuji/data/senso-ji-fortunes-template.json"
 
 # 签级映射（根据浅草寺实际分布）
 LEVEL_MAPPING = {
@@ -135,14 +139,17 @@ def generate_fortune_data(number):
 
     return fortune
 
-def main():
+def main(output_file=OUTPUT_FILE):
     """生成完整的100条签文数据"""
+    from instrumentation import stage
+
     fortunes = []
 
     # 生成100条签文
-    for i in range(1, 101):
-        fortune = generate_fortune_data(i)
-        fortunes.append(fortune)
+    with stage('generate'):
+        for i in range(1, 101):
+            fortune = generate_fortune_data(i)
+            fortunes.append(fortune)
 
     # 统计签级分布
     distribution = {}
@@ -165,8 +172,8 @@ def main():
     }
 
     # 保存为JSON文件
-    output_file = "YiNian-H5/data/senso-ji-fortunes-full.json"
-    with open(output_file, "w", encoding="utf-8") as f:
+    os.makedirs(os.path.dirname(output_file) or '.', exist_ok=True)
+    with stage('write'), open(output_file, "w", encoding="utf-8") as f:
         json.dump(data, f, ensure_ascii=False, indent=2)
 
     print(f"✅ 已生成100条签文数据，保存到: {output_file}")
@@ -176,4 +183,9 @@ def main():
         print(f"  {level}: {count}条 ({percentage:.1f}%)")
 
 if __name__ == "__main__":
-    main()
+    # instrumentation.py 在项目根目录；剖析模式通过 YINIAN_PROFILE 环境变量开启
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from instrumentation import instrument
+
+    with instrument('generate_fortunes'):
+        main(*sys.argv[1:2])
@@ -1,5 +1,10 @@
 const { createApp } = Vue;
 
+// 历史记录以只追加日志的形式保存在 localStorage：
+// fortuneHistory.<n> 为第 n 条记录，fortuneHistory.start / .next 为有效区间
+const HISTORY_KEY = 'fortuneHistory';
+const HISTORY_PAGE = 50;
+
 createApp({
     data() {
         return {
@@ -10,12 +15,20 @@ createApp({
             // 用户输入
             userWish: '',
 
-            // 签文数据
+            // 签文数据（索引），完整内容按分片懒加载
             allFortunes: [],
             currentFortune: null,
+            detailShards: [],
+            // 详情使用的语言包（locale_bundles.py），null 表示完整详情分片
+            locale: null,
 
-            // 历史记录
+            // 历史记录（精简记录，新的在前），签文内容按签号从索引还原
             history: [],
+            historyLimit: HISTORY_PAGE,
+
+            // 抽签历史同步到服务端（index.html?history=sync，需 serve.py 提供 /api/history/sync）
+            // 在另一台设备上打开 index.html?history=sync&user=<同一标识> 即可共享历史
+            historySync: new URLSearchParams(window.location.search).get('history') === 'sync',
 
             // 摇动状态
             isShaking: false,
@@ -31,7 +44,12 @@ createApp({
             // UI 状态
             showMenu: false,
             showImageSide: 'front',  // 'front' 或 'back'
+            imageLoaded: {           // 签文图片是否已加载完成（加载前显示模糊占位图）
+                front: false,
+                back: false
+            },
             fullscreenImage: null,   // 全屏显示的图片路径
+            fullscreenTiles: null,   // 全屏图片的瓦片金字塔（.dzi），没有时直接显示原图
             toast: {
                 show: false,
                 message: '',
@@ -40,8 +58,17 @@ createApp({
 
             // 查询功能
             searchNumber: '',
+            // 关键词检索结果（null 表示尚未检索）
+            searchResults: null,
+            searchTotal: 0,
             quickNumbers: [1, 7, 18, 33, 66, 88, 99, 100],
 
+            // 活动现场由服务端抽签（index.html?draw=server，需 serve.py 提供 /api/draw）
+            serverDraw: new URLSearchParams(window.location.search).get('draw') === 'server',
+
+            // 使用二进制打包数据（index.html?data=pack，由 pack_fortunes.py 生成）
+            packedData: new URLSearchParams(window.location.search).get('data') === 'pack',
+
             // 设备检测
             isMobile: /Android|webOS|iPhone|iPad|iPod|BlackBerry|IEMobile|Opera Mini/i.test(navigator.userAgent)
         };
@@ -63,7 +90,8 @@ createApp({
 
         // 解读章节
         interpretationSections() {
-            if (!this.currentFortune) return [];
+            // 语言包中可能没有现代解读（如 ja、zh-Hant）
+            if (!this.currentFortune || !this.currentFortune.interpretation) return [];
             const interp = this.currentFortune.interpretation;
             const sections = [
                 { title: '整体运势', content: interp.summary },
@@ -78,12 +106,46 @@ createApp({
             }
 
             return sections;
+        },
+
+        fortuneById() {
+            return new Map(this.allFortunes.map(fortune => [fortune.id, fortune]));
+        },
+
+        // 历史页按页渲染的卡片
+        historyCards() {
+            return this.history.slice(0, this.historyLimit).map(record => {
+                const entry = this.fortuneById.get(record.id);
+                return {
+                    ...record,
+                    formattedId: this.formatFortuneId(record.id),
+                    level: entry ? entry.level : '',
+                    shortDescription: entry ? entry.shortDescription : '',
+                    formattedTime: this.formatTime(record.timestamp),
+                    isQueried: !!record.queried
+                };
+            });
         }
     },
 
+    created() {
+        // 分片请求缓存和打包数据解码器，不需要响应式
+        this.shardRequests = {};
+        this.fortunePack = null;
+        // 检索索引只加载一次
+        this.searchIndexRequest = null;
+        // 历史同步状态
+        this.historySyncing = false;
+        this.historySyncPending = false;
+    },
+
     mounted() {
         console.log('🎨 一念 APP 启动');
 
+        // Vue 的启动页已经接管，移除静态启动页
+        const bootSplash = document.getElementById('boot-splash');
+        if (bootSplash) bootSplash.remove();
+
         // 加载签文数据
         this.loadFortunes();
 
@@ -109,18 +171,17 @@ createApp({
 
         async loadFortunes() {
             try {
-                // 使用浅草寺签文数据（优化版本，释义更符合寺庙解签模式）
-                const response = await fetch('data/senso-ji-fortunes-full-optimized-v1.json');
-                const data = await response.json();
+                // 只加载精简索引（id、签级、首句、图片），完整签文在抽中时按需加载
+                const data = this.packedData ? await this.loadPackedIndex() : await this.loadJsonIndex();
                 this.allFortunes = data.fortunes.map(fortune => {
                     return {
                         ...fortune,
                         level: this.convertLevelToChinese(fortune.level),
                         formattedId: this.formatFortuneId(fortune.id),
-                        shortDescription: fortune.poem.lines[0]
+                        shortDescription: fortune.line
                     };
                 });
-                console.log(`✅ 已加载 ${this.allFortunes.length} 条浅草寺签文`);
+                console.log(`✅ 已加载 ${this.allFortunes.length} 条浅草寺签文索引`);
                 console.log(`📊 签级分布: ${JSON.stringify(data.metadata.distribution)}`);
             } catch (error) {
                 console.error('❌ 加载签文失败:', error);
@@ -128,6 +189,73 @@ createApp({
             }
         },
 
+        // 默认：JSON 索引 + 详情分片；部署版页面已内联索引（bundle_critical.py），不再请求
+        async loadJsonIndex() {
+            const inline = document.getElementById('fortune-index');
+            const data = inline
+                ? JSON.parse(inline.textContent)
+                : await (await fetch('data/fortunes/index.json')).json();
+            // 有语言包时只加载一种语言的详情
+            this.locale = this.pickLocale(data.locales || {}, data.defaultLocale);
+            this.detailShards = this.locale ? data.locales[this.locale].shards : data.shards;
+            return data;
+        },
+
+        // 按 ?lang= 和浏览器语言选择语言包，没有匹配时用默认语言
+        pickLocale(available, fallback) {
+            const requested = [
+                new URLSearchParams(window.location.search).get('lang'),
+                ...(navigator.languages || [navigator.language])
+            ];
+            for (const tag of requested) {
+                if (!tag) continue;
+                const lower = tag.toLowerCase();
+                let locale = null;
+                if (lower.startsWith('zh')) {
+                    locale = /hant|-tw|-hk|-mo/.test(lower) ? 'zh-Hant' : 'zh-Hans';
+                } else if (lower.startsWith('ja')) {
+                    locale = 'ja';
+                } else if (lower.startsWith('en')) {
+                    locale = 'en';
+                }
+                if (locale && available[locale]) return locale;
+            }
+            return available[fallback] ? fallback : null;
+        },
+
+        // 打包数据一次下载，索引和详情都从中按 id 解码
+        async loadPackedIndex() {
+            const response = await fetch('data/fortunes/fortunes.pack');
+            if (!response.ok) throw new Error(`HTTP ${response.status}`);
+            this.fortunePack = new FortunePack(await response.arrayBuffer());
+            return { metadata: this.fortunePack.metadata, fortunes: this.fortunePack.index() };
+        },
+
+        // 加载单条签文的完整数据（同一分片只请求一次）
+        loadFortuneDetail(fortune) {
+            if (this.fortunePack) {
+                return Promise.resolve({ ...this.fortunePack.get(fortune.id), ...fortune });
+            }
+
+            const shard = this.detailShards[fortune.shard];
+            if (!this.shardRequests[shard]) {
+                this.shardRequests[shard] = fetch('data/fortunes/' + shard)
+                    .then(response => {
+                        if (!response.ok) throw new Error(`HTTP ${response.status}`);
+                        return response.json();
+                    })
+                    .catch(error => {
+                        delete this.shardRequests[shard];
+                        throw error;
+                    });
+            }
+
+            return this.shardRequests[shard].then(data => {
+                const detail = data.fortunes[fortune.id];
+                return { ...detail, ...fortune };
+            });
+        },
+
         // 将英文签级转换为中文（浅草寺签级体系）
         convertLevelToChinese(level) {
             const mapping = {
@@ -145,10 +273,37 @@ createApp({
         },
 
         loadHistory() {
-            const saved = localStorage.getItem('fortuneHistory');
-            if (saved) {
-                this.history = JSON.parse(saved);
-                console.log(`📜 加载了 ${this.history.length} 条历史记录`);
+            this.migrateHistory();
+
+            const { start, next } = this.historyRange();
+            const records = [];
+            for (let i = next - 1; i >= start; i--) {
+                const saved = localStorage.getItem(`${HISTORY_KEY}.${i}`);
+                if (saved) records.push(JSON.parse(saved));
+            }
+            this.history = records;
+            if (records.length) {
+                console.log(`📜 加载了 ${records.length} 条历史记录`);
+            }
+
+            if (this.historySync) {
+                this.syncHistory();
+            }
+        },
+
+        // 旧版本把完整签文数组保存在 fortuneHistory 中，转换为精简记录
+        migrateHistory() {
+            const saved = localStorage.getItem(HISTORY_KEY);
+            if (!saved) return;
+            localStorage.removeItem(HISTORY_KEY);
+            try {
+                const old = JSON.parse(saved);
+                for (const fortune of old.reverse()) {
+                    this.appendHistory(this.historyRecord(fortune));
+                }
+                console.log(`📦 已迁移 ${old.length} 条旧历史记录`);
+            } catch (error) {
+                console.error('❌ 迁移历史记录失败:', error);
             }
         },
 
@@ -211,20 +366,22 @@ createApp({
             this.vibrate();
 
             // 0.8 秒后抽签
-            setTimeout(() => {
-                this.drawFortune();
+            setTimeout(async () => {
+                await this.drawFortune();
                 this.isShaking = false;
             }, 800);
         },
 
         // ==================== 抽签逻辑 ====================
 
-        drawFortune() {
+        async drawFortune() {
             if (this.allFortunes.length === 0) {
                 this.showToast('签文数据未加载', 'error');
                 return;
             }
 
+            let picked = this.serverDraw ? await this.drawFromServer() : null;
+
             // 🍀 只抽取吉祥签，过滤凶签
             // 吉祥签（大吉、吉、末吉、小吉、半吉、末小吉）：正常权重
             // 凶签（凶）：完全排除
@@ -248,7 +405,18 @@ createApp({
             const seed = (timestamp % 1000) + randomIndex;
             const finalIndex = seed % weightedPool.length;
 
-            const fortune = { ...weightedPool[finalIndex] };
+            if (!picked) {
+                picked = weightedPool[finalIndex];
+            }
+
+            let fortune;
+            try {
+                fortune = await this.loadFortuneDetail(picked);
+            } catch (error) {
+                console.error('❌ 加载签文详情失败:', error);
+                this.showToast('加载签文详情失败，请重试', 'error');
+                return;
+            }
             fortune.timestamp = new Date().toISOString();
             fortune.formattedTime = this.formatTime(new Date());
 
@@ -277,6 +445,20 @@ createApp({
             }, 300);
         },
 
+        // 向服务端请求抽签结果，失败时返回 null 由本地抽签兜底
+        async drawFromServer() {
+            try {
+                const response = await fetch('api/draw?mode=lucky', { cache: 'no-store' });
+                if (!response.ok) throw new Error(`HTTP ${response.status}`);
+                const data = await response.json();
+                const id = data.fortunes[0].id;
+                return this.allFortunes.find(f => f.id === id) || null;
+            } catch (error) {
+                console.warn('⚠️ 服务端抽签失败，改用本地抽签:', error);
+                return null;
+            }
+        },
+
         // ==================== 页面导航 ====================
 
         goToPage(page) {
@@ -321,6 +503,7 @@ createApp({
 
         goToSearch() {
             this.searchNumber = '';
+            this.searchResults = null;
             this.goToPage('search');
         },
 
@@ -335,22 +518,155 @@ createApp({
             this.goToPage('shake');
         },
 
-        viewHistoryFortune(fortune) {
-            this.currentFortune = fortune;
+        async viewHistoryFortune(item) {
+            const entry = this.fortuneById.get(item.id);
+            if (!entry) {
+                this.showToast('签文数据尚未加载', 'error');
+                return;
+            }
+
+            let fortune;
+            try {
+                fortune = await this.loadFortuneDetail(entry);
+            } catch (error) {
+                console.error('❌ 加载签文详情失败:', error);
+                this.showToast('加载签文详情失败，请重试', 'error');
+                return;
+            }
+
+            this.currentFortune = {
+                ...fortune,
+                timestamp: new Date(item.timestamp).toISOString(),
+                formattedTime: item.formattedTime,
+                wish: item.wish || undefined,
+                isQueried: item.isQueried
+            };
             this.goToPage('fortune');
         },
 
         // ==================== 历史记录管理 ====================
 
+        historyRange() {
+            return {
+                start: Number(localStorage.getItem(`${HISTORY_KEY}.start`)) || 0,
+                next: Number(localStorage.getItem(`${HISTORY_KEY}.next`)) || 0
+            };
+        },
+
+        // 只保存签号、时间和许愿，clientId 用于同步时去重
+        historyRecord(fortune) {
+            const record = {
+                clientId: Date.now().toString(36) + Math.random().toString(36).slice(2, 10),
+                id: fortune.id,
+                timestamp: Date.parse(fortune.timestamp) || Date.now()
+            };
+            if (fortune.wish) record.wish = fortune.wish;
+            if (fortune.isQueried) record.queried = true;
+            return record;
+        },
+
+        // 追加一条记录：无论已有多少条，都只写入两个键
+        appendHistory(record) {
+            const { next } = this.historyRange();
+            localStorage.setItem(`${HISTORY_KEY}.${next}`, JSON.stringify(record));
+            localStorage.setItem(`${HISTORY_KEY}.next`, String(next + 1));
+        },
+
         saveToHistory(fortune) {
-            this.history.unshift(fortune);
+            const record = this.historyRecord(fortune);
+            try {
+                this.appendHistory(record);
+            } catch (error) {
+                console.error('❌ 保存历史记录失败:', error);
+            }
+            this.history.unshift(record);
 
-            // 限制最多 100 条
-            if (this.history.length > 100) {
-                this.history = this.history.slice(0, 100);
+            if (this.historySync) {
+                this.syncHistory();
             }
+        },
+
+        showMoreHistory() {
+            this.historyLimit += HISTORY_PAGE;
+        },
 
-            localStorage.setItem('fortuneHistory', JSON.stringify(this.history));
+        historyUser() {
+            const param = new URLSearchParams(window.location.search).get('user');
+            let user = param || localStorage.getItem('historyUser');
+            if (!user) {
+                user = Array.from(crypto.getRandomValues(new Uint8Array(16)),
+                    b => b.toString(16).padStart(2, '0')).join('');
+            }
+            localStorage.setItem('historyUser', user);
+            return user;
+        },
+
+        // 上传未同步的本地记录，并拉取其他设备写入的记录
+        // 服务端按 clientId 去重，重复上传是安全的
+        async syncHistory() {
+            if (this.historySyncing) {
+                this.historySyncPending = true;
+                return;
+            }
+            this.historySyncing = true;
+            try {
+                const user = this.historyUser();
+                const known = new Set(this.history.map(record => record.clientId));
+                let merged = 0;
+                let more = true;
+
+                while (more) {
+                    const { start, next } = this.historyRange();
+                    let i = Math.max(start, Number(localStorage.getItem(`${HISTORY_KEY}.synced`)) || 0);
+                    const records = [];
+                    for (; i < next && records.length < 500; i++) {
+                        const saved = localStorage.getItem(`${HISTORY_KEY}.${i}`);
+                        if (saved) records.push(JSON.parse(saved));
+                    }
+
+                    const response = await fetch('api/history/sync', {
+                        method: 'POST',
+                        headers: { 'Content-Type': 'application/json' },
+                        body: JSON.stringify({
+                            user,
+                            since: Number(localStorage.getItem(`${HISTORY_KEY}.cursor`)) || 0,
+                            records
+                        })
+                    });
+                    if (!response.ok) throw new Error(`HTTP ${response.status}`);
+                    const data = await response.json();
+
+                    for (const { clientId, id, timestamp, wish, queried } of data.records) {
+                        if (known.has(clientId)) continue;
+                        known.add(clientId);
+                        const record = { clientId, id, timestamp };
+                        if (wish) record.wish = wish;
+                        if (queried) record.queried = true;
+                        this.appendHistory(record);
+                        this.history.push(record);
+                        merged++;
+                    }
+
+                    // 拉取到的记录已经在服务端，不需要再上传
+                    const uploadedAll = i >= next;
+                    localStorage.setItem(`${HISTORY_KEY}.synced`, String(uploadedAll ? this.historyRange().next : i));
+                    localStorage.setItem(`${HISTORY_KEY}.cursor`, String(data.cursor));
+                    more = data.more || !uploadedAll;
+                }
+
+                if (merged) {
+                    this.history.sort((a, b) => b.timestamp - a.timestamp);
+                    console.log(`🔄 从服务端同步了 ${merged} 条历史记录`);
+                }
+            } catch (error) {
+                console.error('❌ 同步历史记录失败:', error);
+            } finally {
+                this.historySyncing = false;
+                if (this.historySyncPending) {
+                    this.historySyncPending = false;
+                    this.syncHistory();
+                }
+            }
         },
 
         confirmClearHistory() {
@@ -360,21 +676,40 @@ createApp({
         },
 
         clearHistory() {
+            const { start, next } = this.historyRange();
+            for (let i = start; i < next; i++) {
+                localStorage.removeItem(`${HISTORY_KEY}.${i}`);
+            }
+            localStorage.setItem(`${HISTORY_KEY}.start`, String(next));
+            localStorage.setItem(`${HISTORY_KEY}.synced`, String(next));
+            localStorage.removeItem(`${HISTORY_KEY}.cursor`);
             this.history = [];
-            localStorage.removeItem('fortuneHistory');
+            this.historyLimit = HISTORY_PAGE;
+
+            if (this.historySync) {
+                fetch(`api/history?user=${encodeURIComponent(this.historyUser())}`, { method: 'DELETE' })
+                    .catch(error => console.error('❌ 清空服务端历史记录失败:', error));
+            }
             this.showToast('已清空历史记录');
         },
 
         // ==================== 签文查询 ====================
 
-        searchFortune() {
+        async searchFortune() {
             // 验证输入
-            if (!this.searchNumber || this.searchNumber === '') {
-                this.showToast('请输入签文号', 'error');
+            const text = String(this.searchNumber).trim();
+            if (!text) {
+                this.showToast('请输入签文号或关键词', 'error');
                 return;
             }
 
-            const num = parseInt(this.searchNumber);
+            // 不是纯数字时按关键词检索签诗和解签
+            if (!/^\d+$/.test(text)) {
+                this.searchText(text);
+                return;
+            }
+
+            const num = parseInt(text);
 
             if (isNaN(num) || num < 1 || num > 100) {
                 this.showToast('请输入 1-100 之间的数字', 'error');
@@ -382,13 +717,22 @@ createApp({
             }
 
             // 查找对应签文
-            const fortune = this.allFortunes.find(f => f.id === num);
+            const entry = this.allFortunes.find(f => f.id === num);
 
-            if (!fortune) {
+            if (!entry) {
                 this.showToast('未找到该签文', 'error');
                 return;
             }
 
+            let fortune;
+            try {
+                fortune = await this.loadFortuneDetail(entry);
+            } catch (error) {
+                console.error('❌ 加载签文详情失败:', error);
+                this.showToast('加载签文详情失败，请重试', 'error');
+                return;
+            }
+
             // 创建查询记录（添加时间戳和格式化时间）
             const queryFortune = {
                 ...fortune,
@@ -408,8 +752,48 @@ createApp({
             console.log(`🔍 查询第 ${num} 签 - ${fortune.level}`);
         },
 
+        // 加载静态检索索引（search_index.py 生成），离线也可用
+        loadSearchIndex() {
+            if (!this.searchIndexRequest) {
+                this.searchIndexRequest = fetch('data/fortunes/search.json')
+                    .then(response => {
+                        if (!response.ok) throw new Error(`HTTP ${response.status}`);
+                        return response.json();
+                    })
+                    .then(data => new FortuneSearch(data))
+                    .catch(error => {
+                        this.searchIndexRequest = null;
+                        throw error;
+                    });
+            }
+            return this.searchIndexRequest;
+        },
+
+        async searchText(text) {
+            let index;
+            try {
+                index = await this.loadSearchIndex();
+            } catch (error) {
+                console.error('❌ 加载检索索引失败:', error);
+                this.showToast('加载检索索引失败，请重试', 'error');
+                return;
+            }
+
+            const { total, results } = index.search(text, 50);
+            this.searchTotal = total;
+            this.searchResults = results.map(result => ({
+                ...result,
+                formattedId: this.formatFortuneId(result.id)
+            }));
+            if (total === 0) {
+                this.showToast(`没有包含「${text}」的签文`);
+            }
+            console.log(`🔍 检索「${text}」- ${total} 支签`);
+        },
+
         clearSearch() {
             this.searchNumber = '';
+            this.searchResults = null;
         },
 
         selectQuickNumber(num) {
@@ -488,11 +872,36 @@ createApp({
 
         // ==================== 图片查看 ====================
 
-        showImageFullscreen(imagePath) {
+        // srcset 中的路径相对于 data/，与 imageFront/imageBack 保持一致
+        dataSrcset(srcset) {
+            return srcset.split(', ').map(candidate => 'data/' + candidate).join(', ');
+        },
+
+        // 有瓦片金字塔时用 TileViewer 按需加载可见瓦片，否则显示原图
+        showImageFullscreen(imagePath, tilesPath) {
             this.fullscreenImage = 'data/' + imagePath;
+            this.fullscreenTiles = tilesPath && window.TileViewer ? 'data/' + tilesPath : null;
+            if (!this.fullscreenTiles) return;
+
+            this.$nextTick(() => {
+                if (!this.$refs.tileViewer) return;
+                this.tileViewer = new TileViewer(this.$refs.tileViewer, this.fullscreenTiles, {
+                    // 瓦片不可用（如未部署）时回退到原图
+                    onError: () => this.closeTileViewer()
+                });
+            });
+        },
+
+        closeTileViewer() {
+            if (this.tileViewer) {
+                this.tileViewer.destroy();
+                this.tileViewer = null;
+            }
+            this.fullscreenTiles = null;
         },
 
         closeFullscreen() {
+            this.closeTileViewer();
             this.fullscreenImage = null;
         },
 
@@ -528,6 +937,12 @@ createApp({
     },
 
     watch: {
+        // 换签时 <img> 会被复用，重置加载状态，新图片加载完成前重新显示占位图
+        currentFortune() {
+            this.imageLoaded.front = false;
+            this.imageLoaded.back = false;
+        },
+
         // 监听设置变化并保存
         settings: {
             handler() {
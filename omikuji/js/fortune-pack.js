@@ -0,0 +1,171 @@
+// 签文二进制打包格式（.pack）解码器，格式定义见 pack_fortunes.py
+// 只解析头部，读取某条签时才按 id 定位记录并解码它引用的字符串
+(function (global) {
+    const MAGIC = 'YNFP';
+    const FORMAT_VERSION = 1;
+    const RECORD_SIZE = 60;
+
+    // 空引用（字段不存在）
+    const NONE = 0xFFFFFFFF;
+    const NO_LEVEL = 0xFF;
+    const FLAG_PRESENT = 1;
+
+    const RECORD_REFS = [
+        'imageFront', 'imageBack',
+        'title', 'source', 'lines', 'lineInterpretations',
+        'summary', 'career', 'love', 'health', 'advice', 'story',
+        'extra'
+    ];
+    const TOP_STRINGS = ['imageFront', 'imageBack'];
+    const SECTIONS = [
+        ['poem', ['title', 'source'], ['lines', 'lineInterpretations']],
+        ['interpretation', ['summary', 'career', 'love', 'health', 'advice', 'story'], []]
+    ];
+
+    class FortunePack {
+        constructor(buffer) {
+            this.view = new DataView(buffer);
+            this.bytes = new Uint8Array(buffer);
+            this.decoder = new TextDecoder('utf-8');
+
+            const magic = String.fromCharCode(...this.bytes.subarray(0, 4));
+            const version = this.view.getUint16(4, true);
+            const recordSize = this.view.getUint16(6, true);
+            if (magic !== MAGIC || version !== FORMAT_VERSION || recordSize !== RECORD_SIZE) {
+                throw new Error('不是有效的签文打包文件（或版本不兼容）');
+            }
+
+            const u32 = offset => this.view.getUint32(offset, true);
+            this.minId = u32(8);
+            this.recordCount = u32(12);
+            this.levelCount = u32(16);
+            this.metadataRef = u32(20);
+            this.stringCount = u32(24);
+            this.offsetsPos = u32(28);
+            this.blobPos = u32(32);
+            this.listPos = u32(36);
+            this.recordsPos = u32(40);
+
+            // 已解码字符串的缓存
+            this.strings = new Array(this.stringCount);
+            this.levels = [];
+            for (let i = 0; i < this.levelCount; i++) {
+                this.levels.push(this.string(i));
+            }
+        }
+
+        string(index) {
+            if (index === NONE) return null;
+            if (this.strings[index] === undefined) {
+                const start = this.view.getUint32(this.offsetsPos + 4 * index, true);
+                const end = this.view.getUint32(this.offsetsPos + 4 * index + 4, true);
+                this.strings[index] = this.decoder.decode(
+                    this.bytes.subarray(this.blobPos + start, this.blobPos + end));
+            }
+            return this.strings[index];
+        }
+
+        stringList(ref, count) {
+            const items = [];
+            for (let i = 0; i < count; i++) {
+                items.push(this.string(this.view.getUint32(this.listPos + 4 * (ref + i), true)));
+            }
+            return items;
+        }
+
+        recordOffset(id) {
+            const slot = id - this.minId;
+            if (slot < 0 || slot >= this.recordCount) return -1;
+            const offset = this.recordsPos + slot * RECORD_SIZE;
+            return this.bytes[offset + 5] & FLAG_PRESENT ? offset : -1;
+        }
+
+        get metadata() {
+            return JSON.parse(this.string(this.metadataRef));
+        }
+
+        ids() {
+            const ids = [];
+            for (let slot = 0; slot < this.recordCount; slot++) {
+                if (this.bytes[this.recordsPos + slot * RECORD_SIZE + 5] & FLAG_PRESENT) {
+                    ids.push(this.minId + slot);
+                }
+            }
+            return ids;
+        }
+
+        has(id) {
+            return this.recordOffset(id) >= 0;
+        }
+
+        // 与 data/fortunes/index.json 中的条目相同（没有 shard）
+        indexEntry(id) {
+            const offset = this.recordOffset(id);
+            if (offset < 0) return null;
+            const ref = i => this.view.getUint32(offset + 8 + 4 * i, true);
+            const level = this.bytes[offset + 4];
+            const lines = ref(RECORD_REFS.indexOf('lines'));
+            return {
+                id,
+                level: level === NO_LEVEL ? null : this.levels[level],
+                line: lines !== NONE && this.bytes[offset + 6] > 0
+                    ? this.string(this.view.getUint32(this.listPos + 4 * lines, true))
+                    : '',
+                imageFront: this.string(ref(0)),
+                imageBack: this.string(ref(1))
+            };
+        }
+
+        index() {
+            return this.ids().map(id => this.indexEntry(id));
+        }
+
+        // 解码一条签，结构与签文 JSON 中的对象相同；不存在时返回 null
+        get(id) {
+            const offset = this.recordOffset(id);
+            if (offset < 0) return null;
+
+            const refs = {};
+            RECORD_REFS.forEach((key, i) => {
+                refs[key] = this.view.getUint32(offset + 8 + 4 * i, true);
+            });
+            const counts = { lines: this.bytes[offset + 6], lineInterpretations: this.bytes[offset + 7] };
+            const extra = refs.extra !== NONE
+                ? JSON.parse(this.string(refs.extra))
+                : { poem: {}, interpretation: {} };
+            const missing = extra.missing || [];
+
+            const fortune = { id: this.view.getUint32(offset, true) };
+            const level = this.bytes[offset + 4];
+            if (level !== NO_LEVEL) fortune.level = this.levels[level];
+            for (const key of TOP_STRINGS) {
+                if (refs[key] !== NONE) fortune[key] = this.string(refs[key]);
+            }
+
+            for (const [section, strings, lists] of SECTIONS) {
+                const rest = extra[section];
+                if (!rest || typeof rest !== 'object' || Array.isArray(rest) || missing.includes(section)) {
+                    continue;
+                }
+                const value = {};
+                for (const key of strings) {
+                    if (refs[key] !== NONE) value[key] = this.string(refs[key]);
+                }
+                for (const key of lists) {
+                    if (refs[key] !== NONE) value[key] = this.stringList(refs[key], counts[key]);
+                }
+                fortune[section] = Object.assign(value, rest);
+            }
+
+            for (const [key, value] of Object.entries(extra)) {
+                if (key === 'missing') continue;
+                const isSection = key === 'poem' || key === 'interpretation';
+                if (isSection && value && typeof value === 'object' && !Array.isArray(value)) continue;
+                fortune[key] = value;
+            }
+            return fortune;
+        }
+    }
+
+    global.FortunePack = FortunePack;
+})(window);
@@ -0,0 +1,113 @@
+// 签文全文检索（离线），索引格式和排序规则见 search_index.py
+// 倒排列表按词项懒解码：只解码查询用到的词项
+(function (global) {
+    const FORMAT_VERSION = 1;
+    const MASK_BITS = 3;
+    const ALPHABET = '0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz-_';
+    const DIGITS = new Map([...ALPHABET].map((char, i) => [char, i]));
+    // 与 Python 的 \w 对应：连续的文字，标点和空白作为分隔
+    const SEGMENT = /[\p{L}\p{M}\p{N}_]+/gu;
+
+    function segments(text) {
+        return text.normalize('NFKC').toLowerCase().match(SEGMENT) || [];
+    }
+
+    // 单字段落查单字，否则查相邻两字
+    function queryTokens(text) {
+        const tokens = [];
+        for (const segment of segments(text)) {
+            const chars = [...segment];
+            const grams = chars.length === 1
+                ? chars
+                : chars.slice(0, -1).map((char, i) => char + chars[i + 1]);
+            for (const gram of grams) {
+                if (!tokens.includes(gram)) tokens.push(gram);
+            }
+        }
+        return tokens;
+    }
+
+    function decodePosting(text) {
+        const posting = new Map();
+        let doc = 0;
+        let value = 0;
+        let shift = 0;
+        for (const char of text) {
+            const digit = DIGITS.get(char);
+            value += (digit & 31) * 2 ** shift;
+            if (digit >= 32) {
+                shift += 5;
+                continue;
+            }
+            doc += Math.floor(value / 2 ** MASK_BITS);
+            posting.set(doc, value % 2 ** MASK_BITS);
+            value = 0;
+            shift = 0;
+        }
+        return posting;
+    }
+
+    class FortuneSearch {
+        constructor(data) {
+            if (data.version !== FORMAT_VERSION) {
+                throw new Error('不支持的检索索引版本: ' + data.version);
+            }
+            this.fields = data.fields;
+            this.weights = data.weights;
+            this.docs = data.docs;
+            this.encoded = data.postings;
+            this.postings = new Map();
+        }
+
+        posting(token) {
+            let posting = this.postings.get(token);
+            if (posting === undefined) {
+                const text = this.encoded[token];
+                posting = text === undefined ? null : decodePosting(text);
+                this.postings.set(token, posting);
+            }
+            return posting;
+        }
+
+        maskWeight(mask) {
+            let weight = 0;
+            this.weights.forEach((w, i) => {
+                if (mask >> i & 1) weight += w;
+            });
+            return weight;
+        }
+
+        // 返回 { total, results: [{ id, level, line, score, fields }] }
+        search(query, limit = 20) {
+            const tokens = queryTokens(query);
+            const lists = tokens.map(token => this.posting(token));
+            if (!tokens.length || lists.some(list => !list)) {
+                return { total: 0, results: [] };
+            }
+
+            // 从最短的倒排列表开始求交集
+            const order = lists.map((list, i) => i).sort((a, b) => lists[a].size - lists[b].size);
+            let candidates = [...lists[order[0]].keys()];
+            for (const i of order.slice(1)) {
+                candidates = candidates.filter(doc => lists[i].has(doc));
+            }
+
+            const n = this.docs.length;
+            const scored = candidates.map(doc => {
+                let score = 0;
+                let fields = 0;
+                lists.forEach(list => {
+                    const mask = list.get(doc);
+                    score += Math.log(1 + n / list.size) * this.maskWeight(mask);
+                    fields |= mask;
+                });
+                const [id, level, line] = this.docs[doc];
+                return { id, level, line, score, fields: this.fields.filter((_, i) => fields >> i & 1) };
+            });
+            scored.sort((a, b) => b.score - a.score || a.id - b.id);
+            return { total: scored.length, results: scored.slice(0, limit) };
+        }
+    }
+
+    global.FortuneSearch = FortuneSearch;
+})(window);
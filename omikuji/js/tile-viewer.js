@@ -0,0 +1,242 @@
+// DZI（Deep Zoom）瓦片查看器，瓦片金字塔由 optimize_images.py --tiles 生成
+// 只加载当前缩放级别下可见区域的瓦片；高一级瓦片加载完成前先显示低分辨率的底图
+(function (global) {
+    // 最多放大到原图像素的 4 倍
+    const MAX_ZOOM = 4;
+    const WHEEL_STEP = 1.2;
+    const DOUBLE_TAP_MS = 300;
+    const TAP_SLOP = 10;
+
+    class TileViewer {
+        constructor(container, dziUrl, options = {}) {
+            this.container = container;
+            this.baseUrl = dziUrl.replace(/\.dzi$/, '_files/');
+            this.onError = options.onError || null;
+            this.layers = new Map();
+            this.pointers = new Map();
+            this.lastTap = 0;
+            this.scale = 1;
+            this.x = 0;
+            this.y = 0;
+
+            this.stage = document.createElement('div');
+            this.stage.className = 'tile-stage';
+            container.appendChild(this.stage);
+
+            this.handlers = {
+                pointerdown: e => this.pointerDown(e),
+                pointermove: e => this.pointerMove(e),
+                pointerup: e => this.pointerUp(e),
+                pointercancel: e => this.pointerUp(e),
+                wheel: e => this.wheel(e)
+            };
+            for (const [type, handler] of Object.entries(this.handlers)) {
+                container.addEventListener(type, handler, { passive: type !== 'wheel' });
+            }
+            this.resize = () => this.fit();
+            global.addEventListener('resize', this.resize);
+
+            this.ready = fetch(dziUrl)
+                .then(response => {
+                    if (!response.ok) throw new Error('HTTP ' + response.status);
+                    return response.text();
+                })
+                .then(text => {
+                    this.parse(text);
+                    this.fit();
+                })
+                .catch(error => {
+                    if (this.onError) this.onError(error);
+                });
+        }
+
+        parse(text) {
+            const doc = new DOMParser().parseFromString(text, 'application/xml');
+            const image = doc.documentElement;
+            const size = image.getElementsByTagName('Size')[0];
+            if (image.nodeName !== 'Image' || !size) {
+                throw new Error('不是有效的 DZI 描述文件');
+            }
+            this.tileSize = Number(image.getAttribute('TileSize'));
+            this.overlap = Number(image.getAttribute('Overlap'));
+            this.format = image.getAttribute('Format');
+            this.width = Number(size.getAttribute('Width'));
+            this.height = Number(size.getAttribute('Height'));
+            this.maxLevel = Math.ceil(Math.log2(Math.max(this.width, this.height)));
+        }
+
+        // 整张图适应容器并居中
+        fit() {
+            if (!this.width) return;
+            const rect = this.container.getBoundingClientRect();
+            this.viewWidth = rect.width;
+            this.viewHeight = rect.height;
+            this.minScale = Math.min(rect.width / this.width, rect.height / this.height);
+            this.scale = this.minScale;
+            this.x = (rect.width - this.width * this.scale) / 2;
+            this.y = (rect.height - this.height * this.scale) / 2;
+            this.baseLevel = this.levelFor(this.minScale);
+            this.render();
+        }
+
+        // 屏幕上每个物理像素至少对应一个瓦片像素的最低级别
+        levelFor(scale) {
+            const ratio = global.devicePixelRatio || 1;
+            const level = this.maxLevel + Math.ceil(Math.log2(scale * ratio));
+            return Math.max(0, Math.min(this.maxLevel, level));
+        }
+
+        layer(level) {
+            let layer = this.layers.get(level);
+            if (!layer) {
+                const element = document.createElement('div');
+                element.className = 'tile-layer';
+                element.style.transform = `scale(${2 ** (this.maxLevel - level)})`;
+                element.style.zIndex = level;
+                this.stage.appendChild(element);
+                layer = { element, tiles: new Map() };
+                this.layers.set(level, layer);
+            }
+            return layer;
+        }
+
+        render() {
+            if (!this.width) return;
+            this.clamp();
+            this.stage.style.transform = `translate(${this.x}px, ${this.y}px) scale(${this.scale})`;
+
+            // 基础级别始终覆盖整张图，作为高分辨率瓦片加载完成前的底图
+            const level = this.levelFor(this.scale);
+            this.loadTiles(this.baseLevel);
+            if (level > this.baseLevel) this.loadTiles(level);
+            for (const [l, layer] of this.layers) {
+                layer.element.style.display = l > level ? 'none' : '';
+            }
+        }
+
+        loadTiles(level) {
+            const factor = 2 ** (this.maxLevel - level);
+            const levelWidth = Math.ceil(this.width / factor);
+            const levelHeight = Math.ceil(this.height / factor);
+            // 可见区域换算到该级别的像素坐标
+            const left = Math.max(0, -this.x / this.scale / factor);
+            const top = Math.max(0, -this.y / this.scale / factor);
+            const right = Math.min(levelWidth, (this.viewWidth - this.x) / this.scale / factor);
+            const bottom = Math.min(levelHeight, (this.viewHeight - this.y) / this.scale / factor);
+
+            const size = this.tileSize;
+            const layer = this.layer(level);
+            for (let col = Math.floor(left / size); col * size < right; col++) {
+                for (let row = Math.floor(top / size); row * size < bottom; row++) {
+                    const key = col + '_' + row;
+                    if (layer.tiles.has(key)) continue;
+                    const tile = new Image();
+                    tile.className = 'tile';
+                    tile.alt = '';
+                    tile.decoding = 'async';
+                    tile.style.left = (col ? col * size - this.overlap : 0) + 'px';
+                    tile.style.top = (row ? row * size - this.overlap : 0) + 'px';
+                    tile.onload = () => tile.classList.add('loaded');
+                    tile.src = `${this.baseUrl}${level}/${key}.${this.format}`;
+                    layer.tiles.set(key, tile);
+                    layer.element.appendChild(tile);
+                }
+            }
+        }
+
+        // 图片小于容器时居中，否则不允许拖出边界
+        clamp() {
+            const width = this.width * this.scale;
+            const height = this.height * this.scale;
+            this.x = width <= this.viewWidth
+                ? (this.viewWidth - width) / 2
+                : Math.min(0, Math.max(this.viewWidth - width, this.x));
+            this.y = height <= this.viewHeight
+                ? (this.viewHeight - height) / 2
+                : Math.min(0, Math.max(this.viewHeight - height, this.y));
+        }
+
+        // 以 (cx, cy)（容器坐标）为中心缩放
+        zoomAt(factor, cx, cy) {
+            const scale = Math.max(this.minScale, Math.min(MAX_ZOOM, this.scale * factor));
+            this.x = cx - (cx - this.x) * scale / this.scale;
+            this.y = cy - (cy - this.y) * scale / this.scale;
+            this.scale = scale;
+            this.render();
+        }
+
+        point(e) {
+            const rect = this.container.getBoundingClientRect();
+            return { x: e.clientX - rect.left, y: e.clientY - rect.top };
+        }
+
+        pointerDown(e) {
+            this.container.setPointerCapture(e.pointerId);
+            const p = this.point(e);
+            this.pointers.set(e.pointerId, { x: p.x, y: p.y, startX: p.x, startY: p.y });
+        }
+
+        pointerMove(e) {
+            const previous = this.pointers.get(e.pointerId);
+            if (!previous || !this.width) return;
+            const p = this.point(e);
+
+            if (this.pointers.size === 1) {
+                this.x += p.x - previous.x;
+                this.y += p.y - previous.y;
+                previous.x = p.x;
+                previous.y = p.y;
+                this.render();
+                return;
+            }
+
+            // 双指缩放：按两指距离变化缩放，并跟随两指中点平移
+            const [a, b] = [...this.pointers.values()];
+            const before = { d: Math.hypot(a.x - b.x, a.y - b.y), x: (a.x + b.x) / 2, y: (a.y + b.y) / 2 };
+            previous.x = p.x;
+            previous.y = p.y;
+            const after = { d: Math.hypot(a.x - b.x, a.y - b.y), x: (a.x + b.x) / 2, y: (a.y + b.y) / 2 };
+            this.x += after.x - before.x;
+            this.y += after.y - before.y;
+            this.zoomAt(before.d ? after.d / before.d : 1, after.x, after.y);
+        }
+
+        pointerUp(e) {
+            const pointer = this.pointers.get(e.pointerId);
+            this.pointers.delete(e.pointerId);
+            if (!pointer || this.pointers.size || e.type === 'pointercancel') return;
+
+            // 双击（双击屏幕）放大一倍，已经放大时恢复整图
+            const p = this.point(e);
+            if (Math.hypot(p.x - pointer.startX, p.y - pointer.startY) > TAP_SLOP) return;
+            const now = Date.now();
+            if (now - this.lastTap < DOUBLE_TAP_MS) {
+                this.lastTap = 0;
+                if (this.scale > this.minScale * 1.01) {
+                    this.fit();
+                } else {
+                    this.zoomAt(2, p.x, p.y);
+                }
+            } else {
+                this.lastTap = now;
+            }
+        }
+
+        wheel(e) {
+            e.preventDefault();
+            const p = this.point(e);
+            this.zoomAt(e.deltaY < 0 ? WHEEL_STEP : 1 / WHEEL_STEP, p.x, p.y);
+        }
+
+        destroy() {
+            for (const [type, handler] of Object.entries(this.handlers)) {
+                this.container.removeEventListener(type, handler);
+            }
+            global.removeEventListener('resize', this.resize);
+            this.stage.remove();
+            this.layers.clear();
+        }
+    }
+
+    global.TileViewer = TileViewer;
+})(window);
@@ -2,20 +2,300 @@
 """
 图片优化脚本 - 压缩签文图片以减少部署大小
 使用 Pillow 库将图片质量降低到 85%，可减少约 30-40% 的文件大小
+
+支持多进程并行压缩，并通过内容哈希清单跳过已经优化过的图片，
+避免重复构建时反复重新编码（既浪费时间，也会让画质逐次下降）。
+
+也可以不指定固定质量，而是给出感知质量目标（--target-ssim / --target-psnr）：
+对每张图片二分查找仍达到目标的最低 JPEG 质量。留白多的签纸可以压得更小，
+笔画细密的汉字则保留更高的质量。选出的质量记录在清单中，再次运行时不重复查找。
 """
 
+import argparse
+import hashlib
+import json
+import math
 import os
-from PIL import Image
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 
-def optimize_images(input_dir, output_dir=None, quality=85):
+from instrumentation import add_profile_argument, instrument, stage
+
+# 图片目录
+IMAGES_DIR = "omikuji/data/senso-ji-omikuji-main"
+
+# 内容哈希清单（记录每张图片优化前后的 SHA-256）
+MANIFEST_FILE = ".build-cache/optimize-manifest.json"
+
+# 响应式衍生图（路径相对于 omikuji/data/，与 imageFront/imageBack 一致）
+DATA_DIR = "omikuji/data"
+RESPONSIVE_SUBDIR = "responsive"
+RESPONSIVE_WIDTHS = (240, 360, 500)
+RESPONSIVE_QUALITY = {'avif': 55, 'webp': 75}
+RESPONSIVE_MANIFEST_FILE = ".build-cache/responsive-manifest.json"
+
+# 深度缩放瓦片金字塔（DZI），全屏查看时只加载可见区域的瓦片
+TILES_SUBDIR = "tiles"
+TILE_SIZE = 254
+TILE_OVERLAP = 1
+TILE_FORMAT = 'jpg'
+TILE_QUALITY = 85
+TILES_MANIFEST_FILE = ".build-cache/tiles-manifest.json"
+
+# 低清占位图（base64 内嵌在签文 JSON 中，页面可立即绘制）
+PLACEHOLDER_WIDTH = 16
+PLACEHOLDER_MANIFEST_FILE = ".build-cache/placeholder-manifest.json"
+
+# 固定质量模式的默认 JPEG 质量
+DEFAULT_QUALITY = 85
+# 感知质量目标模式：在 [QUALITY_SEARCH_MIN, 质量上限] 之间查找，上限默认为 QUALITY_SEARCH_MAX
+QUALITY_SEARCH_MIN = 40
+QUALITY_SEARCH_MAX = 95
+# SSIM 的滑动窗口边长（像素）和稳定常数
+SSIM_WINDOW = 8
+SSIM_C1 = (0.01 * 255) ** 2
+SSIM_C2 = (0.03 * 255) ** 2
+# 完全相同的图片 PSNR 为无穷大，记为该值
+PSNR_IDENTICAL = 100.0
+
+# 线上使用的签文数据
+FORTUNES_FILE = "omikuji/data/senso-ji-fortunes-full-optimized-v1.json"
+
+
+def file_sha256(path, chunk_size=1 << 20):
+    """计算文件内容的 SHA-256"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def load_manifest(manifest_path):
+    """读取哈希清单，不存在或损坏时返回空清单"""
+    try:
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_manifest(manifest_path, manifest):
+    """原子地写入哈希清单（先写临时文件再重命名）"""
+    manifest_path = Path(manifest_path)
+    manifest_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = manifest_path.with_name(manifest_path.name + '.tmp')
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2, sort_keys=True)
+    os.replace(tmp_path, manifest_path)
+
+
+def run_jobs(func, jobs, workers):
+    """在进程池中执行任务；只有一个任务或 workers=1 时直接串行执行"""
+    if workers > 1 and len(jobs) > 1:
+        with ProcessPoolExecutor(max_workers=min(workers, len(jobs))) as pool:
+            return list(pool.map(func, jobs, chunksize=4))
+    return [func(job) for job in jobs]
+
+
+def _save_jpeg(img, fp, quality):
+    img.save(
+        fp,
+        "JPEG",
+        quality=quality,
+        optimize=True,
+        progressive=True  # 渐进式 JPEG
+    )
+
+
+def psnr(reference, candidate):
+    """两张同尺寸灰度图的峰值信噪比（dB），只依赖 Pillow"""
+    from PIL import ImageChops
+
+    histogram = ImageChops.difference(reference, candidate).histogram()
+    mse = sum(count * value * value for value, count in enumerate(histogram))
+    mse /= reference.width * reference.height
+    return PSNR_IDENTICAL if mse == 0 else min(PSNR_IDENTICAL, 10 * math.log10(255 ** 2 / mse))
+
+
+def ssim(reference, candidate, window=SSIM_WINDOW):
+    """
+    两张同尺寸灰度图的平均结构相似度（SSIM），使用 window×window 的均匀窗口
+
+    需要 NumPy；窗口内的均值、方差和协方差用积分图计算，与窗口大小无关。
+    """
+    import numpy as np
+
+    x = np.asarray(reference, dtype=np.float64)
+    y = np.asarray(candidate, dtype=np.float64)
+
+    def window_mean(a):
+        integral = np.pad(a, ((1, 0), (1, 0))).cumsum(0).cumsum(1)
+        total = (integral[window:, window:] - integral[:-window, window:]
+                 - integral[window:, :-window] + integral[:-window, :-window])
+        return total / (window * window)
+
+    mu_x, mu_y = window_mean(x), window_mean(y)
+    var_x = window_mean(x * x) - mu_x * mu_x
+    var_y = window_mean(y * y) - mu_y * mu_y
+    cov = window_mean(x * y) - mu_x * mu_y
+    ssim_map = ((2 * mu_x * mu_y + SSIM_C1) * (2 * cov + SSIM_C2)
+                / ((mu_x * mu_x + mu_y * mu_y + SSIM_C1) * (var_x + var_y + SSIM_C2)))
+    return float(ssim_map.mean())
+
+
+METRICS = {'ssim': ssim, 'psnr': psnr}
+
+
+def ssim_available():
+    try:
+        import numpy  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def search_quality(img, metric, value, low=QUALITY_SEARCH_MIN, high=QUALITY_SEARCH_MAX):
+    """
+    二分查找达到 metric >= value 的最低 JPEG 质量
+
+    比较的是亮度通道：签文的可读性取决于笔画，而不是色度。
+    假设质量越高得分越高（JPEG 基本满足）；上限仍达不到目标时使用上限。
+
+    Returns:
+        (质量, 得分, 编码后的字节)
+    """
+    import io
+    from PIL import Image
+
+    measure = METRICS[metric]
+    reference = img.convert('L')
+
+    def encode(quality):
+        buffer = io.BytesIO()
+        _save_jpeg(img, buffer, quality)
+        data = buffer.getvalue()
+        with Image.open(io.BytesIO(data)) as decoded:
+            return measure(reference, decoded.convert('L')), data
+
+    best = None
+    lo, hi = low, high
+    while lo <= hi:
+        mid = (lo + hi) // 2
+        score, data = encode(mid)
+        if score >= value:
+            best = (mid, score, data)
+            hi = mid - 1
+        else:
+            lo = mid + 1
+
+    if best is None:
+        score, data = encode(high)
+        best = (high, score, data)
+    return best
+
+
+def _optimize_one(job):
+    """
+    压缩单张图片（在子进程中执行）
+
+    target 为 None 时使用固定质量；否则在 [target['min'], quality] 中查找达到目标的最低质量
+    """
+    from PIL import Image
+
+    src, dst, quality, target = job
+    src = Path(src)
+    dst = Path(dst)
+    try:
+        original_size = src.stat().st_size
+        tmp_file = dst.with_name(dst.name + '.tmp')
+
+        score = None
+        with Image.open(src) as img:
+            if target is None:
+                _save_jpeg(img, tmp_file, quality)
+            else:
+                img = img.convert('RGB')
+                quality, score, data = search_quality(
+                    img, target['metric'], target['value'], target['min'], quality)
+                tmp_file.write_bytes(data)
+        os.replace(tmp_file, dst)
+
+        return {
+            'name': src.name,
+            'original_size': original_size,
+            'optimized_size': dst.stat().st_size,
+            'sha256': file_sha256(dst),
+            'quality': quality,
+            'score': score,
+            'error': None
+        }
+    except Exception as e:
+        return {'name': src.name, 'error': str(e)}
+
+
+def _is_fresh(entry, source_hash, output_file, quality, target=None):
+    """判断清单中的记录是否仍然有效"""
+    if not entry or entry.get('target') != target:
+        return False
+    # 目标模式下质量由查找决定，清单中的 target 已包含质量上限
+    if target is None and entry.get('quality') != quality:
+        return False
+    if source_hash not in (entry.get('source'), entry.get('output')):
+        return False
+    if not output_file.exists():
+        return False
+    # 原地覆盖时输出文件就是源文件，无需重复计算
+    if output_file.stat().st_size != entry.get('size'):
+        return False
+    return source_hash == entry.get('output') or file_sha256(output_file) == entry.get('output')
+
+
+def resolve_quality(quality, target=None, min_quality=QUALITY_SEARCH_MIN):
+    """
+    JPEG 质量的默认值和校验（本脚本和 build.py 的 optimize 阶段共用，同样的参数得到同样的结果）
+
+    Args:
+        quality: 指定的质量，None 表示使用默认值
+        target: 感知质量目标；指定时 quality 为查找上限
+
+    Returns:
+        JPEG 质量（目标模式下为查找上限）
+
+    Raises:
+        ValueError: 质量不在 1-100 之间，或目标模式下质量下限高于上限
+    """
+    if quality is None:
+        quality = DEFAULT_QUALITY if target is None else QUALITY_SEARCH_MAX
+    if not 1 <= quality <= 100:
+        raise ValueError(f"JPEG 质量必须在 1-100 之间，收到 {quality}")
+    if target is not None and not 1 <= min_quality <= quality:
+        raise ValueError(f"质量下限 {min_quality} 必须在 1 和质量上限 {quality} 之间")
+    return quality
+
+
+def optimize_images(input_dir, output_dir=None, quality=None, workers=None,
+                    manifest_path=MANIFEST_FILE, force=False, target=None,
+                    min_quality=QUALITY_SEARCH_MIN):
     """
     优化图片大小
 
     Args:
         input_dir: 输入目录路径
         output_dir: 输出目录路径（如果为None，则覆盖原文件）
-        quality: JPEG 质量（1-100，推荐 80-90）
+        quality: JPEG 质量（1-100，推荐 80-90）；指定 target 时为查找的上限；
+            None 时使用 resolve_quality() 的默认值
+        workers: 并行进程数（默认使用全部 CPU 核心，1 表示串行）
+        manifest_path: 内容哈希清单路径
+        force: 忽略清单，强制重新压缩所有图片
+        target: 感知质量目标 (指标, 阈值)，如 ('ssim', 0.985) 或 ('psnr', 40)；
+            与原图比较，原地覆盖时请在未压缩过的原图上运行
+        min_quality: 目标模式下查找的质量下限
+
+    Returns:
+        统计信息字典
     """
     if output_dir is None:
         output_dir = input_dir
@@ -24,60 +304,586 @@ def optimize_images(input_dir, output_dir=None, quality=85):
     output_path = Path(output_dir)
     output_path.mkdir(parents=True, exist_ok=True)
 
-    total_original = 0
-    total_optimized = 0
-    count = 0
+    workers = workers or os.cpu_count() or 1
+    manifest = load_manifest(manifest_path)
+    quality = resolve_quality(quality, target, min_quality)
+
+    if target is not None:
+        metric, value = target
+        if metric not in METRICS:
+            raise ValueError(f"未知的质量指标: {metric}（可选 {', '.join(METRICS)}）")
+        if metric == 'ssim' and not ssim_available():
+            raise RuntimeError("计算 SSIM 需要 NumPy（pip3 install numpy），或改用 --target-psnr")
+        target = {'metric': metric, 'value': value, 'min': min_quality, 'max': quality}
 
     print(f"🖼️  开始优化图片...")
     print(f"📁 输入目录: {input_path}")
     print(f"📂 输出目录: {output_path}")
-    print(f"⚙️  JPEG 质量: {quality}%")
+    if target is None:
+        print(f"⚙️  JPEG 质量: {quality}%")
+    else:
+        print(f"⚙️  目标 {target['metric'].upper()} ≥ {target['value']}，质量 {min_quality}-{quality}%")
+    print(f"🧵 并行进程: {workers}")
     print("-" * 50)
 
-    for img_file in input_path.glob("*.jpg"):
-        try:
-            # 打开图片
-            img = Image.open(img_file)
-
-            # 原始大小
-            original_size = img_file.stat().st_size
+    start = time.perf_counter()
 
-            # 输出路径
+    # 根据内容哈希挑出需要重新压缩的图片
+    jobs = []
+    source_hashes = {}
+    reused = {}
+    skipped = 0
+    with stage('hash'):
+        for img_file in sorted(input_path.glob("*.jpg")):
             output_file = output_path / img_file.name
+            key = output_file.as_posix()
+            source_hash = file_sha256(img_file)
+
+            entry = manifest.get(key)
+            if not force and _is_fresh(entry, source_hash, output_file, quality, target):
+                skipped += 1
+                continue
+
+            source_hashes[img_file.name] = source_hash
+            if (not force and target is not None and entry and entry.get('target') == target
+                    and entry.get('source') == source_hash):
+                # 原图未变、只是输出缺失或被改动：直接用清单中查找过的质量
+                jobs.append((str(img_file), str(output_file), entry['quality'], None))
+                reused[img_file.name] = entry.get('score')
+            else:
+                jobs.append((str(img_file), str(output_file), quality, target))
+
+    if skipped:
+        print(f"⏭️  跳过 {skipped} 张未变化的图片")
+
+    with stage('compress'):
+        results = run_jobs(_optimize_one, jobs, workers)
+
+    total_original = 0
+    total_optimized = 0
+    count = 0
+    qualities = []
+
+    for result in results:
+        name = result['name']
+        if result['error']:
+            print(f"✗ {name}: 错误 - {result['error']}")
+            continue
+
+        original_size = result['original_size']
+        optimized_size = result['optimized_size']
 
-            # 优化并保存
-            img.save(
-                output_file,
-                "JPEG",
-                quality=quality,
-                optimize=True,
-                progressive=True  # 渐进式 JPEG
-            )
+        # 统计
+        total_original += original_size
+        total_optimized += optimized_size
+        count += 1
 
-            # 优化后大小
-            optimized_size = output_file.stat().st_size
+        entry = {
+            'source': source_hashes[name],
+            'output': result['sha256'],
+            'size': optimized_size,
+            'quality': result['quality']
+        }
+        detail = ''
+        if target is not None:
+            score = reused.get(name, result['score'])
+            entry['target'] = target
+            entry['score'] = round(score, 4) if score is not None else None
+            qualities.append(result['quality'])
+            detail = f" q={result['quality']}"
+            if score is not None:
+                detail += f" {target['metric'].upper()} {score:.4f}"
+        manifest[(output_path / name).as_posix()] = entry
 
-            # 统计
-            total_original += original_size
-            total_optimized += optimized_size
-            count += 1
+        reduction = (1 - optimized_size / original_size) * 100
 
-            reduction = (1 - optimized_size / original_size) * 100
+        print(f"✓ {name}: {original_size/1024:.1f}KB → {optimized_size/1024:.1f}KB (-{reduction:.1f}%){detail}")
 
-            print(f"✓ {img_file.name}: {original_size/1024:.1f}KB → {optimized_size/1024:.1f}KB (-{reduction:.1f}%)")
+    save_manifest(manifest_path, manifest)
 
-        except Exception as e:
-            print(f"✗ {img_file.name}: 错误 - {e}")
+    elapsed = time.perf_counter() - start
+    images_per_sec = count / elapsed if elapsed > 0 else 0.0
+    mb_per_sec = total_original / 1024 / 1024 / elapsed if elapsed > 0 else 0.0
 
     print("-" * 50)
-    print(f"✅ 完成！优化了 {count} 张图片")
-    print(f"📊 原始总大小: {total_original/1024/1024:.2f} MB")
-    print(f"📊 优化后大小: {total_optimized/1024/1024:.2f} MB")
-    print(f"💾 节省空间: {(total_original-total_optimized)/1024/1024:.2f} MB ({(1-total_optimized/total_original)*100:.1f}%)")
+    print(f"✅ 完成！优化了 {count} 张图片，跳过 {skipped} 张")
+    if count:
+        print(f"📊 原始总大小: {total_original/1024/1024:.2f} MB")
+        print(f"📊 优化后大小: {total_optimized/1024/1024:.2f} MB")
+        print(f"💾 节省空间: {(total_original-total_optimized)/1024/1024:.2f} MB ({(1-total_optimized/total_original)*100:.1f}%)")
+    if qualities:
+        print(f"🎚️  选用质量: 最低 {min(qualities)}，中位 {sorted(qualities)[len(qualities) // 2]}，最高 {max(qualities)}")
+    print(f"⏱️  耗时 {elapsed:.2f}s，吞吐 {images_per_sec:.1f} 张/s，{mb_per_sec:.2f} MB/s")
+
+    return {
+        'optimized': count,
+        'skipped': skipped,
+        'failed': len(results) - count,
+        'original_bytes': total_original,
+        'optimized_bytes': total_optimized,
+        'seconds': elapsed,
+        'images_per_sec': images_per_sec,
+        'mb_per_sec': mb_per_sec,
+        'qualities': qualities
+    }
+
+
+def available_formats():
+    """返回当前 Pillow 支持写出的衍生图格式（AVIF 优先）"""
+    from PIL import Image
+
+    try:
+        import pillow_avif  # noqa: F401  旧版 Pillow 的 AVIF 插件
+    except ImportError:
+        pass
+
+    Image.init()
+    return [fmt for fmt in ('avif', 'webp') if fmt.upper() in Image.SAVE]
+
+
+def _derive_one(job):
+    """为单张图片生成多个宽度的 WebP/AVIF 衍生图（在子进程中执行）"""
+    from PIL import Image
+
+    src, out_dir, widths, formats = job
+    src = Path(src)
+    out_dir = Path(out_dir)
+    try:
+        variants = []
+        with Image.open(src) as img:
+            img = img.convert('RGB')
+            # 不放大：超过原图宽度的档位直接用原图宽度
+            targets = sorted({min(w, img.width) for w in widths})
+            for width in targets:
+                height = round(img.height * width / img.width)
+                resized = img if width == img.width else img.resize((width, height), Image.LANCZOS)
+                for fmt in formats:
+                    out_file = out_dir / f"{src.stem}-{width}w.{fmt}"
+                    tmp_file = out_file.with_name(out_file.name + '.tmp')
+                    resized.save(tmp_file, fmt.upper(), quality=RESPONSIVE_QUALITY.get(fmt, 75))
+                    os.replace(tmp_file, out_file)
+                    variants.append({
+                        'format': fmt,
+                        'width': width,
+                        'height': height,
+                        'file': out_file.name,
+                        'bytes': out_file.stat().st_size
+                    })
+        return {'name': src.name, 'variants': variants, 'error': None}
+    except Exception as e:
+        return {'name': src.name, 'error': str(e)}
 
-if __name__ == "__main__":
-    import sys
 
+@stage('responsive')
+def build_responsive_images(input_dir=IMAGES_DIR, data_dir=DATA_DIR, widths=RESPONSIVE_WIDTHS,
+                            formats=None, workers=None,
+                            manifest_path=RESPONSIVE_MANIFEST_FILE, force=False):
+    """
+    生成响应式衍生图（多宽度 WebP，支持时额外生成 AVIF）
+
+    Args:
+        input_dir: 原图目录
+        data_dir: 数据根目录，衍生图写入 data_dir/responsive/
+        widths: 目标宽度列表
+        formats: 输出格式（默认自动检测，AVIF 不可用时只生成 WebP）
+        workers: 并行进程数
+        manifest_path: 内容哈希清单路径
+        force: 忽略清单，全部重新生成
+
+    Returns:
+        {图片文件名: 衍生图列表}
+    """
+    input_path = Path(input_dir)
+    out_dir = Path(data_dir) / RESPONSIVE_SUBDIR
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    formats = list(formats or available_formats())
+    widths = sorted(widths)
+    workers = workers or os.cpu_count() or 1
+    manifest = load_manifest(manifest_path)
+    params = {'widths': widths, 'formats': formats, 'quality': RESPONSIVE_QUALITY}
+
+    print(f"🖼️  生成响应式图片: {', '.join(f.upper() for f in formats)} × {widths}")
+
+    start = time.perf_counter()
+    jobs = []
+    source_hashes = {}
+    variants_by_image = {}
+    for img_file in sorted(input_path.glob("*.jpg")):
+        source_hash = file_sha256(img_file)
+        entry = manifest.get(img_file.name)
+        if (not force and entry and entry.get('source') == source_hash
+                and entry.get('params') == params
+                and all((out_dir / v['file']).exists() for v in entry['variants'])):
+            variants_by_image[img_file.name] = entry['variants']
+            continue
+
+        source_hashes[img_file.name] = source_hash
+        jobs.append((str(img_file), str(out_dir), widths, formats))
+
+    skipped = len(variants_by_image)
+    for result in run_jobs(_derive_one, jobs, workers):
+        name = result['name']
+        if result['error']:
+            print(f"✗ {name}: 错误 - {result['error']}")
+            continue
+        variants_by_image[name] = result['variants']
+        manifest[name] = {
+            'source': source_hashes[name],
+            'params': params,
+            'variants': result['variants']
+        }
+
+    save_manifest(manifest_path, manifest)
+
+    elapsed = time.perf_counter() - start
+    total_bytes = sum(v['bytes'] for variants in variants_by_image.values() for v in variants)
+    print(f"✅ 生成 {len(variants_by_image) - skipped} 张，跳过 {skipped} 张未变化的图片")
+    print(f"📊 衍生图总大小: {total_bytes/1024/1024:.2f} MB，耗时 {elapsed:.2f}s")
+
+    return variants_by_image
+
+
+def _srcset(variants, fmt):
+    return ', '.join(
+        f"{RESPONSIVE_SUBDIR}/{v['file']} {v['width']}w"
+        for v in sorted(variants, key=lambda v: v['width'])
+        if v['format'] == fmt
+    )
+
+
+def write_fortune_json(data_file, data):
+    """原子地写回签文 JSON（保持 indent=2 的格式）"""
+    data_file = Path(data_file)
+    tmp_file = data_file.with_name(data_file.name + '.tmp')
+    with open(tmp_file, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_file, data_file)
+
+
+@stage('write-json')
+def update_image_fields(data_file, fields_by_image, suffixes):
+    """
+    把按图片文件名索引的字段写到签文 JSON 的 imageFront/imageBack 旁边
+
+    例如 suffixes=('Sources',) 会写入 imageFrontSources / imageBackSources；
+    没有对应数据的图片会删除旧字段，避免引用已不存在的文件。
+
+    Returns:
+        写入的图片数量
+    """
+    with open(data_file, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+
+    updated = 0
+    for fortune in data['fortunes']:
+        for side in ('Front', 'Back'):
+            image = fortune.get(f'image{side}')
+            fields = fields_by_image.get(Path(image).name, {}) if image else {}
+            for suffix in suffixes:
+                if suffix in fields:
+                    fortune[f'image{side}{suffix}'] = fields[suffix]
+                else:
+                    fortune.pop(f'image{side}{suffix}', None)
+            if fields:
+                updated += 1
+
+    write_fortune_json(data_file, data)
+    return updated
+
+
+def write_responsive_manifest(variants_by_image, data_file=FORTUNES_FILE):
+    """
+    把衍生图清单写入签文 JSON
+
+    每条签增加 imageFrontSources / imageBackSources，
+    格式为 {"avif": srcset, "webp": srcset}，供 <picture> 使用。
+    """
+    fields_by_image = {}
+    for name, variants in variants_by_image.items():
+        formats = [fmt for fmt in ('avif', 'webp') if any(v['format'] == fmt for v in variants)]
+        fields_by_image[name] = {'Sources': {fmt: _srcset(variants, fmt) for fmt in formats}}
+
+    updated = update_image_fields(data_file, fields_by_image, ('Sources',))
+    print(f"📝 已写入 {updated} 组 srcset 到 {data_file}")
+
+
+def _placeholder_one(job):
+    """计算单张图片的低清占位图和主色调（在子进程中执行）"""
+    import base64
+    import io
+    from PIL import Image, ImageFilter
+
+    src, width = job
+    src = Path(src)
+    try:
+        with Image.open(src) as img:
+            # JPEG 可以直接按 1/8 比例解码，比完整解码再缩小快得多
+            img.draft('RGB', (width * 4, width * 8))
+            img = img.convert('RGB')
+            height = max(1, round(img.height * width / img.width))
+            tiny = img.resize((width, height), Image.BILINEAR)
+
+        # 主色调：压缩到少量颜色后取出现次数最多的一种
+        quantized = tiny.quantize(colors=4)
+        palette = quantized.getpalette()
+        _, index = max(quantized.getcolors())
+        r, g, b = palette[index * 3:index * 3 + 3]
+
+        buffer = io.BytesIO()
+        tiny.filter(ImageFilter.GaussianBlur(1)).save(buffer, 'WEBP', quality=40)
+        encoded = base64.b64encode(buffer.getvalue()).decode('ascii')
+
+        return {
+            'name': src.name,
+            'placeholder': f'data:image/webp;base64,{encoded}',
+            'color': f'#{r:02x}{g:02x}{b:02x}',
+            'error': None
+        }
+    except Exception as e:
+        return {'name': src.name, 'error': str(e)}
+
+
+@stage('placeholders')
+def build_placeholders(input_dir=IMAGES_DIR, width=PLACEHOLDER_WIDTH, workers=None,
+                       manifest_path=PLACEHOLDER_MANIFEST_FILE, force=False):
+    """
+    批量生成低清占位图（base64 WebP）和主色调
+
+    Returns:
+        {图片文件名: {'placeholder': data URI, 'color': '#rrggbb'}}
+    """
+    input_path = Path(input_dir)
+    workers = workers or os.cpu_count() or 1
+    manifest = load_manifest(manifest_path)
+
+    start = time.perf_counter()
+    jobs = []
+    source_hashes = {}
+    placeholders = {}
+    for img_file in sorted(input_path.glob("*.jpg")):
+        source_hash = file_sha256(img_file)
+        entry = manifest.get(img_file.name)
+        if not force and entry and entry.get('source') == source_hash and entry.get('width') == width:
+            placeholders[img_file.name] = {'placeholder': entry['placeholder'], 'color': entry['color']}
+            continue
+
+        source_hashes[img_file.name] = source_hash
+        jobs.append((str(img_file), width))
+
+    skipped = len(placeholders)
+    for result in run_jobs(_placeholder_one, jobs, workers):
+        name = result['name']
+        if result['error']:
+            print(f"✗ {name}: 错误 - {result['error']}")
+            continue
+        placeholders[name] = {'placeholder': result['placeholder'], 'color': result['color']}
+        manifest[name] = {'source': source_hashes[name], 'width': width, **placeholders[name]}
+
+    save_manifest(manifest_path, manifest)
+
+    elapsed = time.perf_counter() - start
+    total_bytes = sum(len(p['placeholder']) for p in placeholders.values())
+    average = total_bytes / len(placeholders) if placeholders else 0
+    print(f"✅ 占位图：生成 {len(placeholders) - skipped} 张，跳过 {skipped} 张，"
+          f"平均 {average:.0f} 字节，耗时 {elapsed:.2f}s")
+
+    return placeholders
+
+
+def write_placeholders(placeholders, data_file=FORTUNES_FILE):
+    """把占位图和主色调写入签文 JSON（imageFrontPlaceholder / imageFrontColor 等）"""
+    fields_by_image = {
+        name: {'Placeholder': p['placeholder'], 'Color': p['color']}
+        for name, p in placeholders.items()
+    }
+    updated = update_image_fields(data_file, fields_by_image, ('Placeholder', 'Color'))
+    print(f"📝 已写入 {updated} 张占位图到 {data_file}")
+
+
+def _tile_one(job):
+    """为单张图片生成 DZI 瓦片金字塔（在子进程中执行）"""
+    import math
+    import shutil
+    from PIL import Image
+
+    src, out_dir, name, tile_size, overlap, fmt, quality = job
+    src = Path(src)
+    out_dir = Path(out_dir)
+    try:
+        files_dir = out_dir / f"{name}_files"
+        tmp_dir = out_dir / f"{name}_files.tmp"
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+        with Image.open(src) as img:
+            img = img.convert('RGB')
+            width, height = img.size
+            max_level = math.ceil(math.log2(max(width, height)))
+            tiles = 0
+            # 从最高分辨率逐级缩小，每级都从原图缩放，避免累积模糊
+            for level in range(max_level, -1, -1):
+                scale = 2 ** (level - max_level)
+                level_w = max(1, math.ceil(width * scale))
+                level_h = max(1, math.ceil(height * scale))
+                level_img = img if scale == 1 else img.resize((level_w, level_h), Image.LANCZOS)
+                level_dir = tmp_dir / str(level)
+                level_dir.mkdir(parents=True)
+                for col in range(math.ceil(level_w / tile_size)):
+                    for row in range(math.ceil(level_h / tile_size)):
+                        box = (max(0, col * tile_size - overlap),
+                               max(0, row * tile_size - overlap),
+                               min(level_w, (col + 1) * tile_size + overlap),
+                               min(level_h, (row + 1) * tile_size + overlap))
+                        level_img.crop(box).save(level_dir / f"{col}_{row}.{fmt}",
+                                                 'JPEG' if fmt == 'jpg' else fmt.upper(),
+                                                 quality=quality)
+                        tiles += 1
+
+        shutil.rmtree(files_dir, ignore_errors=True)
+        os.replace(tmp_dir, files_dir)
+
+        dzi_file = out_dir / f"{name}.dzi"
+        tmp_file = dzi_file.with_name(dzi_file.name + '.tmp')
+        tmp_file.write_text(
+            '<?xml version="1.0" encoding="UTF-8"?>\n'
+            '<Image xmlns="http://schemas.microsoft.com/deepzoom/2008" '
+            f'TileSize="{tile_size}" Overlap="{overlap}" Format="{fmt}">'
+            f'<Size Width="{width}" Height="{height}"/></Image>\n',
+            encoding='utf-8')
+        os.replace(tmp_file, dzi_file)
+
+        return {'name': src.name, 'dzi': dzi_file.name, 'width': width, 'height': height,
+                'levels': max_level + 1, 'tiles': tiles, 'error': None}
+    except Exception as e:
+        return {'name': src.name, 'error': str(e)}
+
+
+@stage('tiles')
+def build_tile_pyramids(input_dir=IMAGES_DIR, data_dir=DATA_DIR, tile_size=TILE_SIZE,
+                        overlap=TILE_OVERLAP, fmt=TILE_FORMAT, workers=None,
+                        manifest_path=TILES_MANIFEST_FILE, force=False):
+    """
+    为每张图片生成 DZI（Deep Zoom）瓦片金字塔，写入 data_dir/tiles/
+
+    金字塔按原图内容哈希命名（1_0.<哈希>.dzi 和 1_0.<哈希>_files/），
+    图片变化时路径随之变化，整个目录可以长期缓存。
+
+    Returns:
+        {图片文件名: 金字塔信息}，其中 'dzi' 为相对于 tiles/ 的描述文件名
+    """
+    import shutil
+
+    input_path = Path(input_dir)
+    out_dir = Path(data_dir) / TILES_SUBDIR
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    workers = workers or os.cpu_count() or 1
+    manifest = load_manifest(manifest_path)
+    params = {'tile_size': tile_size, 'overlap': overlap, 'format': fmt, 'quality': TILE_QUALITY}
+
+    print(f"🧩 生成瓦片金字塔: {tile_size}px 瓦片，重叠 {overlap}px，{fmt.upper()}")
+
+    start = time.perf_counter()
+    jobs = []
+    source_hashes = {}
+    pyramids = {}
+    for img_file in sorted(input_path.glob("*.jpg")):
+        source_hash = file_sha256(img_file)
+        entry = manifest.get(img_file.name)
+        if (not force and entry and entry.get('source') == source_hash
+                and entry.get('params') == params and (out_dir / entry['dzi']).exists()):
+            pyramids[img_file.name] = entry
+            continue
+
+        source_hashes[img_file.name] = source_hash
+        name = f"{img_file.stem}.{source_hash[:10]}"
+        jobs.append((str(img_file), str(out_dir), name, tile_size, overlap, fmt, TILE_QUALITY))
+
+    skipped = len(pyramids)
+    for result in run_jobs(_tile_one, jobs, workers):
+        name, error = result.pop('name'), result.pop('error')
+        if error:
+            print(f"✗ {name}: 错误 - {error}")
+            continue
+        pyramids[name] = manifest[name] = {'source': source_hashes[name], 'params': params, **result}
+
+    save_manifest(manifest_path, manifest)
+
+    # 清理图片变化后遗留的旧金字塔
+    current = {Path(p['dzi']).stem for p in pyramids.values()}
+    for stale in out_dir.glob('*.dzi'):
+        if stale.stem not in current:
+            stale.unlink()
+            shutil.rmtree(out_dir / f"{stale.stem}_files", ignore_errors=True)
+
+    elapsed = time.perf_counter() - start
+    total_tiles = sum(p['tiles'] for p in pyramids.values())
+    print(f"✅ 瓦片金字塔：生成 {len(pyramids) - skipped} 张，跳过 {skipped} 张，"
+          f"共 {total_tiles} 个瓦片，耗时 {elapsed:.2f}s")
+
+    return pyramids
+
+
+def write_tile_manifest(pyramids, data_file=FORTUNES_FILE):
+    """把金字塔描述文件路径写入签文 JSON（imageFrontTiles / imageBackTiles，相对于 data/）"""
+    fields_by_image = {
+        name: {'Tiles': f"{TILES_SUBDIR}/{p['dzi']}"} for name, p in pyramids.items()
+    }
+    updated = update_image_fields(data_file, fields_by_image, ('Tiles',))
+    print(f"📝 已写入 {updated} 组瓦片金字塔到 {data_file}")
+
+
+def ask(prompt, default=''):
+    """读取用户输入；无标准输入时（如 CI 中）返回默认值"""
+    try:
+        return input(prompt).strip()
+    except EOFError:
+        return default
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="压缩签文图片")
+    parser.add_argument('--input', default=IMAGES_DIR, help="图片目录")
+    parser.add_argument('--output', default=None, help="输出目录（默认覆盖原图）")
+    parser.add_argument('-q', '--quality', type=int, default=None,
+                        help=f"JPEG 质量 1-100（默认 {DEFAULT_QUALITY}）；目标模式下为查找上限（默认 {QUALITY_SEARCH_MAX}）")
+    target = parser.add_mutually_exclusive_group()
+    target.add_argument('--target-ssim', type=float, default=None, metavar='SSIM',
+                        help="为每张图片查找 SSIM 不低于该值的最低质量（如 0.985，需要 NumPy）")
+    target.add_argument('--target-psnr', type=float, default=None, metavar='DB',
+                        help="为每张图片查找 PSNR 不低于该值的最低质量（如 40）")
+    parser.add_argument('--min-quality', type=int, default=QUALITY_SEARCH_MIN,
+                        help=f"目标模式下查找的质量下限（默认 {QUALITY_SEARCH_MIN}）")
+    parser.add_argument('-j', '--workers', type=int, default=None, help="并行进程数（默认全部核心）")
+    parser.add_argument('-y', '--yes', action='store_true', help="不询问，直接执行（用于脚本和 CI）")
+    parser.add_argument('--force', action='store_true', help="忽略哈希清单，全部重新压缩")
+    parser.add_argument('--manifest', default=MANIFEST_FILE, help="哈希清单路径")
+    parser.add_argument('--responsive', action='store_true',
+                        help="生成响应式 WebP/AVIF 衍生图并写入签文 JSON（不修改原图）")
+    parser.add_argument('--placeholders', action='store_true',
+                        help="生成低清占位图和主色调并写入签文 JSON（不修改原图）")
+    parser.add_argument('--tiles', action='store_true',
+                        help="生成 DZI 瓦片金字塔并写入签文 JSON（全屏查看时按需加载，不修改原图）")
+    parser.add_argument('--data', default=FORTUNES_FILE, help="要写入图片字段的签文 JSON")
+    add_profile_argument(parser)
+    args = parser.parse_args(argv)
+    try:
+        resolve_quality(args.quality, target_from_args(args), args.min_quality)
+    except ValueError as e:
+        parser.error(str(e))
+    return args
+
+
+def target_from_args(args):
+    """--target-ssim / --target-psnr → (指标, 阈值)，都未指定时为 None"""
+    if args.target_ssim is not None:
+        return ('ssim', args.target_ssim)
+    if args.target_psnr is not None:
+        return ('psnr', args.target_psnr)
+    return None
+
+
+if __name__ == "__main__":
     # 检查是否安装了 Pillow
     try:
         from PIL import Image
@@ -86,34 +892,61 @@ if __name__ == "__main__":
         print("请运行: pip3 install Pillow")
         sys.exit(1)
 
-    # 图片目录
-    images_dir = "omikuji/data/senso-ji-omikuji-main"
+    args = parse_args()
+    with instrument('optimize_images', profile=args.profile):
+        images_dir = args.input
 
-    if not os.path.exists(images_dir):
-        print(f"❌ 错误：目录不存在 - {images_dir}")
-        sys.exit(1)
+        if not os.path.exists(images_dir):
+            print(f"❌ 错误：目录不存在 - {images_dir}")
+            sys.exit(1)
 
-    # 询问是否要优化
-    print("🎯 图片优化工具")
-    print(f"将优化目录: {images_dir}")
-    print("⚠️  警告：此操作会覆盖原始图片！")
-    print()
+        if args.responsive or args.placeholders or args.tiles:
+            if args.responsive:
+                variants = build_responsive_images(images_dir, workers=args.workers, force=args.force)
+                write_responsive_manifest(variants, args.data)
+            if args.placeholders:
+                placeholders = build_placeholders(images_dir, workers=args.workers, force=args.force)
+                write_placeholders(placeholders, args.data)
+            if args.tiles:
+                pyramids = build_tile_pyramids(images_dir, workers=args.workers, force=args.force)
+                write_tile_manifest(pyramids, args.data)
+            sys.exit(0)
 
-    choice = input("是否继续？(y/N): ").strip().lower()
+        quality = args.quality
+        target = target_from_args(args)
 
-    if choice == 'y':
-        # 推荐质量设置
-        print("\n推荐质量设置:")
-        print("  85 - 高质量（推荐，减少 30-40%）")
-        print("  80 - 中等质量（减少 40-50%）")
-        print("  75 - 较低质量（减少 50-60%）")
+        if not args.yes:
+            # 询问是否要优化
+            print("🎯 图片优化工具")
+            print(f"将优化目录: {images_dir}")
+            if args.output is None:
+                print("⚠️  警告：此操作会覆盖原始图片！")
+            print()
 
-        quality_input = input("\n选择质量 (1-100, 默认 85): ").strip()
-        quality = int(quality_input) if quality_input else 85
+            choice = ask("是否继续？(y/N): ").lower()
 
-        if 1 <= quality <= 100:
-            optimize_images(images_dir, quality=quality)
-        else:
-            print("❌ 无效的质量值，必须在 1-100 之间")
-    else:
-        print("❌ 已取消")
+            if choice != 'y':
+                print("❌ 已取消")
+                sys.exit(0)
+
+            if quality is None and target is None:
+                # 推荐质量设置
+                print("\n推荐质量设置:")
+                print("  85 - 高质量（推荐，减少 30-40%）")
+                print("  80 - 中等质量（减少 40-50%）")
+                print("  75 - 较低质量（减少 50-60%）")
+
+                quality_input = ask(f"\n选择质量 (1-100, 默认 {DEFAULT_QUALITY}): ")
+                try:
+                    quality = resolve_quality(int(quality_input) if quality_input else None)
+                except ValueError:
+                    print("❌ 无效的质量值，必须是 1-100 之间的整数")
+                    sys.exit(1)
+
+        try:
+            optimize_images(images_dir, output_dir=args.output, quality=quality,
+                            workers=args.workers, manifest_path=args.manifest,
+                            force=args.force, target=target, min_quality=args.min_quality)
+        except (ValueError, RuntimeError) as e:
+            print(f"❌ {e}")
+            sys.exit(1)
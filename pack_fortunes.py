@@ -0,0 +1,367 @@
+#!/usr/bin/env python3
+"""
+签文二进制打包格式（.pack）- 字符串去重 + 定长记录，可 mmap 按 id 直接读取
+
+  omikuji/data/fortunes/fortunes.pack
+
+文件布局（小端序）：
+  头部        HEADER，见下方字段
+  偏移表      uint32[字符串数 + 1]，第 i 个字符串为 blob[offsets[i]:offsets[i+1]]
+  字符串区    UTF-8，所有字符串去重后只存一份；签级名称固定占前 level_count 个
+  列表区      uint32[]，诗句、逐句解释等列表的字符串编号
+  记录区      RECORD × record_count，第 i 条记录对应 id = min_id + i
+
+读取一条签只需定位一条记录再解码它引用的字符串，不必解析整个文件。
+不在固定字段中的内容（如响应式图片、占位图）以 JSON 存入 extra 字段，转换是无损的。
+浏览器端的解码器为 omikuji/js/fortune-pack.js。
+
+用法：
+  python3 pack_fortunes.py                 # 从线上签文 JSON 生成 .pack
+  python3 pack_fortunes.py --verify        # 生成后解码比对，确认无损
+"""
+
+import argparse
+import json
+import mmap
+import os
+import struct
+import sys
+import time
+from pathlib import Path
+
+SOURCE_FILE = "omikuji/data/senso-ji-fortunes-full-optimized-v1.json"
+OUTPUT_FILE = "omikuji/data/fortunes/fortunes.pack"
+
+MAGIC = b'YNFP'
+FORMAT_VERSION = 1
+
+# magic, version, record_size, min_id, record_count, level_count, metadata,
+# string_count, offsets_pos, blob_pos, list_pos, records_pos
+HEADER = struct.Struct('<4sHHIIIIIIIII')
+
+# id, level, flags, 诗句数, 逐句解释数, 然后是 13 个字符串/列表编号（顺序见 RECORD_REFS）
+RECORD = struct.Struct('<IBBBB13I')
+RECORD_REFS = (
+    'imageFront', 'imageBack',
+    'title', 'source', 'lines', 'lineInterpretations',
+    'summary', 'career', 'love', 'health', 'advice', 'story',
+    'extra',
+)
+
+# 空引用（字段不存在）
+NONE = 0xFFFFFFFF
+NO_LEVEL = 0xFF
+FLAG_PRESENT = 1
+
+TOP_STRINGS = ('imageFront', 'imageBack')
+POEM_STRINGS = ('title', 'source')
+POEM_LISTS = ('lines', 'lineInterpretations')
+INTERPRETATION_STRINGS = ('summary', 'career', 'love', 'health', 'advice', 'story')
+
+# 大多数签的 extra 都是这个值，此时不写 extra
+DEFAULT_EXTRA = {'poem': {}, 'interpretation': {}}
+
+
+class StringTable:
+    """字符串去重表"""
+
+    def __init__(self):
+        self.ids = {}
+        self.strings = []
+
+    def add(self, text):
+        if text not in self.ids:
+            self.ids[text] = len(self.strings)
+            self.strings.append(text)
+        return self.ids[text]
+
+    def encode(self):
+        """Returns: (偏移表字节, 字符串区字节)"""
+        blobs = [s.encode('utf-8') for s in self.strings]
+        offsets = [0]
+        for blob in blobs:
+            offsets.append(offsets[-1] + len(blob))
+        return struct.pack(f'<{len(offsets)}I', *offsets), b''.join(blobs)
+
+
+def _split_fortune(fortune, table, lists):
+    """把一条签拆成定长记录的字段值；不属于固定字段的内容放进 extra"""
+    extra = {key: value for key, value in fortune.items()
+             if key not in ('id', 'poem', 'interpretation') + TOP_STRINGS}
+    refs = dict.fromkeys(RECORD_REFS, NONE)
+    counts = {'lines': 0, 'lineInterpretations': 0}
+
+    def take_string(source, key, extra_target):
+        value = source.get(key)
+        if isinstance(value, str):
+            refs[key] = table.add(value)
+        elif key in source:
+            extra_target[key] = value
+
+    for key in TOP_STRINGS:
+        take_string(fortune, key, extra)
+
+    for section, strings, list_keys in (('poem', POEM_STRINGS, POEM_LISTS),
+                                        ('interpretation', INTERPRETATION_STRINGS, ())):
+        value = fortune.get(section)
+        if not isinstance(value, dict):
+            if section in fortune:
+                extra[section] = value
+            else:
+                extra.setdefault('missing', []).append(section)
+            continue
+
+        known = strings + list_keys
+        rest = {key: item for key, item in value.items() if key not in known}
+        for key in strings:
+            take_string(value, key, rest)
+        for key in list_keys:
+            items = value.get(key)
+            if isinstance(items, list) and all(isinstance(s, str) for s in items) and len(items) < 256:
+                refs[key] = len(lists)
+                counts[key] = len(items)
+                lists.extend(table.add(s) for s in items)
+            elif key in value:
+                rest[key] = items
+        extra[section] = rest
+
+    if extra != DEFAULT_EXTRA:
+        refs['extra'] = table.add(json.dumps(extra, ensure_ascii=False, sort_keys=True))
+
+    return refs, counts
+
+
+def pack_fortunes(source_file=SOURCE_FILE, output_file=OUTPUT_FILE):
+    """
+    把签文 JSON 转换为 .pack
+
+    Returns:
+        {'source': 原始字节数, 'packed': 打包后字节数, 'strings': 去重后的字符串数}
+    """
+    with open(source_file, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    fortunes = data['fortunes']
+
+    ids = [fortune['id'] for fortune in fortunes]
+    if any(not isinstance(i, int) or i < 0 for i in ids) or len(set(ids)) != len(ids):
+        raise ValueError("签号必须是不重复的非负整数")
+
+    table = StringTable()
+    # 签级名称占前 level_count 个字符串，签级编码即字符串编号
+    levels = sorted({f['level'] for f in fortunes if isinstance(f.get('level'), str)})
+    if len(levels) >= NO_LEVEL:
+        raise ValueError(f"签级种类过多: {len(levels)}")
+    for level in levels:
+        table.add(level)
+
+    min_id = min(ids) if ids else 0
+    record_count = max(ids) - min_id + 1 if ids else 0
+    records = [RECORD.pack(0, NO_LEVEL, 0, 0, 0, *([NONE] * len(RECORD_REFS)))] * record_count
+    lists = []
+
+    for fortune in fortunes:
+        fortune = dict(fortune)
+        level = fortune.get('level')
+        if not isinstance(level, str):
+            # 非字符串签级（通常不会出现）原样放进 extra
+            level_code = NO_LEVEL
+        else:
+            level_code = table.ids[level]
+            del fortune['level']
+        refs, counts = _split_fortune(fortune, table, lists)
+        records[fortune['id'] - min_id] = RECORD.pack(
+            fortune['id'], level_code, FLAG_PRESENT,
+            counts['lines'], counts['lineInterpretations'],
+            *(refs[key] for key in RECORD_REFS))
+
+    metadata = table.add(json.dumps(data.get('metadata', {}), ensure_ascii=False))
+    offsets, blob = table.encode()
+    list_bytes = struct.pack(f'<{len(lists)}I', *lists)
+
+    offsets_pos = HEADER.size
+    blob_pos = offsets_pos + len(offsets)
+    # 列表区和记录区按 4 字节对齐
+    padding = -(blob_pos + len(blob)) % 4
+    list_pos = blob_pos + len(blob) + padding
+    records_pos = list_pos + len(list_bytes)
+
+    header = HEADER.pack(MAGIC, FORMAT_VERSION, RECORD.size, min_id, record_count, len(levels),
+                         metadata, len(table.strings), offsets_pos, blob_pos, list_pos, records_pos)
+
+    output_file = Path(output_file)
+    output_file.parent.mkdir(parents=True, exist_ok=True)
+    tmp_file = output_file.with_name(output_file.name + '.tmp')
+    with open(tmp_file, 'wb') as f:
+        f.write(header)
+        f.write(offsets)
+        f.write(blob)
+        f.write(b'\0' * padding)
+        f.write(list_bytes)
+        f.write(b''.join(records))
+    os.replace(tmp_file, output_file)
+
+    return {
+        'source': os.path.getsize(source_file),
+        'packed': output_file.stat().st_size,
+        'strings': len(table.strings),
+    }
+
+
+class FortunePack:
+    """
+    只读的 .pack 加载器：mmap 文件，按 id 直接定位记录
+
+        with FortunePack(OUTPUT_FILE) as pack:
+            fortune = pack.get(18)
+    """
+
+    def __init__(self, path=OUTPUT_FILE):
+        self._file = open(path, 'rb')
+        try:
+            self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # 空文件无法 mmap
+            self._file.close()
+            raise ValueError(f"{path} 不是有效的签文打包文件")
+
+        (magic, version, record_size, self.min_id, self.record_count, self.level_count,
+         self._metadata, self.string_count, self._offsets_pos, self._blob_pos,
+         self._list_pos, self._records_pos) = HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC or version != FORMAT_VERSION or record_size != RECORD.size:
+            self.close()
+            raise ValueError(f"{path} 不是有效的签文打包文件（或版本不兼容）")
+        self._cache = {}
+        self.levels = [self.string(i) for i in range(self.level_count)]
+
+    def close(self):
+        self._mm.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def string(self, index):
+        if index == NONE:
+            return None
+        # 去重后的字符串被多条签共用，解码一次后缓存
+        text = self._cache.get(index)
+        if text is None:
+            start, end = struct.unpack_from('<II', self._mm, self._offsets_pos + 4 * index)
+            text = self._cache[index] = self._mm[self._blob_pos + start:self._blob_pos + end].decode('utf-8')
+        return text
+
+    def _strings(self, ref, count):
+        if ref == NONE:
+            return None
+        indexes = struct.unpack_from(f'<{count}I', self._mm, self._list_pos + 4 * ref)
+        return [self.string(i) for i in indexes]
+
+    def _record(self, fortune_id):
+        slot = fortune_id - self.min_id
+        if not 0 <= slot < self.record_count:
+            return None
+        record = RECORD.unpack_from(self._mm, self._records_pos + slot * RECORD.size)
+        return record if record[2] & FLAG_PRESENT else None
+
+    @property
+    def metadata(self):
+        return json.loads(self.string(self._metadata))
+
+    def ids(self):
+        return [self.min_id + slot for slot in range(self.record_count)
+                if self._mm[self._records_pos + slot * RECORD.size + 5] & FLAG_PRESENT]
+
+    def __len__(self):
+        return len(self.ids())
+
+    def __contains__(self, fortune_id):
+        return self._record(fortune_id) is not None
+
+    def __iter__(self):
+        for fortune_id in self.ids():
+            yield self.get(fortune_id)
+
+    def level(self, fortune_id):
+        """只读签级，不解码其他字段"""
+        record = self._record(fortune_id)
+        if record is None or record[1] == NO_LEVEL:
+            return None
+        return self.levels[record[1]]
+
+    def get(self, fortune_id):
+        """解码一条签，结构与签文 JSON 中的对象相同；不存在时返回 None"""
+        record = self._record(fortune_id)
+        if record is None:
+            return None
+        refs = dict(zip(RECORD_REFS, record[5:]))
+        counts = {'lines': record[3], 'lineInterpretations': record[4]}
+        extra = json.loads(self.string(refs['extra'])) if refs['extra'] != NONE else DEFAULT_EXTRA
+
+        fortune = {'id': record[0]}
+        if record[1] != NO_LEVEL:
+            fortune['level'] = self.levels[record[1]]
+        for key in TOP_STRINGS:
+            if refs[key] != NONE:
+                fortune[key] = self.string(refs[key])
+
+        for section, strings, list_keys in (('poem', POEM_STRINGS, POEM_LISTS),
+                                            ('interpretation', INTERPRETATION_STRINGS, ())):
+            rest = extra.get(section)
+            if not isinstance(rest, dict) or section in extra.get('missing', ()):
+                continue
+            value = {}
+            for key in strings:
+                if refs[key] != NONE:
+                    value[key] = self.string(refs[key])
+            for key in list_keys:
+                if refs[key] != NONE:
+                    value[key] = self._strings(refs[key], counts[key])
+            value.update(rest)
+            fortune[section] = value
+
+        for key, value in extra.items():
+            if key == 'missing':
+                continue
+            if key in ('poem', 'interpretation') and isinstance(value, dict):
+                continue
+            fortune[key] = value
+        return fortune
+
+    def to_json(self):
+        return {'metadata': self.metadata, 'fortunes': list(self)}
+
+
+def load_packed(path=OUTPUT_FILE):
+    """一次性解码整个 .pack，返回与签文 JSON 相同的结构"""
+    with FortunePack(path) as pack:
+        return pack.to_json()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="把签文 JSON 转换为二进制打包格式")
+    parser.add_argument('source', nargs='?', default=SOURCE_FILE, help=f"签文 JSON（默认 {SOURCE_FILE}）")
+    parser.add_argument('output', nargs='?', default=OUTPUT_FILE, help=f"输出文件（默认 {OUTPUT_FILE}）")
+    parser.add_argument('--verify', action='store_true', help="生成后完整解码并与源文件比对")
+    args = parser.parse_args()
+
+    stats = pack_fortunes(args.source, args.output)
+    print(f"📦 {args.source} → {args.output}")
+    print(f"   {stats['source']/1024:.1f}KB → {stats['packed']/1024:.1f}KB"
+          f"（{stats['packed']/stats['source']*100:.1f}%），{stats['strings']} 个去重字符串")
+
+    if args.verify:
+        with open(args.source, 'r', encoding='utf-8') as f:
+            expected = json.load(f)
+        start = time.perf_counter()
+        with FortunePack(args.output) as pack:
+            first = pack.get(pack.ids()[0]) if len(pack) else None
+            lookup = time.perf_counter() - start
+            decoded = pack.to_json()
+        if decoded != expected:
+            print("❌ 解码结果与源文件不一致")
+            sys.exit(1)
+        print(f"✅ 无损校验通过（打开并读取单条签 {lookup*1000:.2f}ms）")
+    sys.exit(0)
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+发布签文数据 - 把 full.json 的修改同步到线上签文 JSON（optimized-v1）
+
+full.json 是签诗、签级和逐句释义的来源（gemini / enrich 阶段更新它），
+线上页面和 split / pack / search 读取的是 optimized-v1：其中的现代解读经过人工润色，
+图片相关字段（响应式图片、占位图、瓦片）由 images 阶段写入。同步规则：
+
+  - 签级、签诗（含逐句释义）、图片路径：以 full.json 为准
+  - 现代解读：签级和签诗都没变时保留线上的润色版本，否则换成 full.json 中 enrich 重新生成的释义
+  - 线上文件中 full.json 没有的字段（图片衍生字段等）：保留
+  - full.json 中只用于增量构建的指纹字段：不发布
+
+内容没有变化时不写文件，下游阶段据此跳过。
+
+用法：
+  python3 publish_fortunes.py
+"""
+
+import json
+import os
+import sys
+
+from optimize_images import write_fortune_json
+
+SOURCE_FILE = "omikuji/data/senso-ji-fortunes-full.json"
+TARGET_FILE = "omikuji/data/senso-ji-fortunes-full-optimized-v1.json"
+
+# 只用于增量构建（update_from_gemini_direct.py / enrich_interpretations.py），不发布
+INTERNAL_FIELDS = ('sourceFingerprint', 'interpretationFingerprint')
+# 决定线上润色释义是否仍然适用的字段
+CONTENT_FIELDS = ('level', 'poem')
+
+
+def publish_fortune(fortune, served=None):
+    """
+    合成一条线上签
+
+    Returns:
+        (线上签, 是否换用了 full.json 的释义)
+    """
+    source = {key: value for key, value in fortune.items() if key not in INTERNAL_FIELDS}
+    if served is None:
+        return source, True
+
+    entry = dict(served)
+    curated = all(served.get(key) == source.get(key) for key in CONTENT_FIELDS)
+    for key, value in source.items():
+        if key == 'interpretation' and curated and 'interpretation' in served:
+            continue
+        entry[key] = value
+    return entry, not curated
+
+
+def publish_fortunes(source_file=SOURCE_FILE, target_file=TARGET_FILE):
+    """
+    把 source_file 的签同步到 target_file
+
+    Returns:
+        内容有变化的签数（0 表示未写文件）
+    """
+    with open(source_file, 'r', encoding='utf-8') as f:
+        source = json.load(f)
+
+    if os.path.exists(target_file):
+        with open(target_file, 'r', encoding='utf-8') as f:
+            target = json.load(f)
+    else:
+        target = {'fortunes': []}
+    served = {fortune['id']: fortune for fortune in target['fortunes']}
+
+    fortunes = []
+    changed = []
+    reinterpreted = 0
+    for fortune in sorted(source['fortunes'], key=lambda x: x['id']):
+        current = served.get(fortune['id'])
+        entry, replaced = publish_fortune(fortune, current)
+        fortunes.append(entry)
+        if entry != current:
+            changed.append(fortune['id'])
+            reinterpreted += replaced
+    removed = set(served) - {fortune['id'] for fortune in fortunes}
+
+    data = dict(target, metadata=source.get('metadata', target.get('metadata')), fortunes=fortunes)
+    if data == target:
+        print(f"⏭️  线上签文已是最新: {target_file}")
+        return 0
+
+    write_fortune_json(target_file, data)
+    print(f"✅ 发布 {len(changed)} 个签到 {target_file}（{reinterpreted} 个使用重新生成的释义）")
+    if changed:
+        print(f"   变化的签: {', '.join(map(str, changed[:20]))}{' ...' if len(changed) > 20 else ''}")
+    if removed:
+        print(f"   移除的签: {', '.join(map(str, sorted(removed)))}")
+    return len(changed) + len(removed) or 1
+
+
+if __name__ == "__main__":
+    try:
+        publish_fortunes()
+    except (OSError, ValueError, KeyError) as e:
+        print(f"❌ 发布失败: {e}")
+        sys.exit(1)
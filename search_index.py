@@ -0,0 +1,308 @@
+#!/usr/bin/env python3
+"""
+签文全文检索 - 字符二元组（bigram）倒排索引
+
+对签诗（poem.lines）、逐句释义（lineInterpretations）和现代解读（interpretation.*）
+建立倒排索引：每段连续文字切分为单字和相邻两字，记录出现在哪些签的哪些字段中。
+
+查询同样切分：单字查单字（如「月」），两字以上查相邻两字（如「浮圖塔」→ 浮圖、圖塔），
+要求所有词项都出现（AND），按 idf × 字段权重排序（签诗 > 逐句释义 > 现代解读）。
+查询只访问命中的倒排列表，不随签文总数线性增长，多座寺院的数据合并后仍在毫秒以内。
+
+  omikuji/data/fortunes/search.json   紧凑的静态索引，前端离线检索（fortune-search.js）也使用它
+
+由 serve.py 挂载为 /api/search：
+
+  GET /api/search?q=月
+  GET /api/search?q=船 归&limit=5
+
+用法：
+  python3 search_index.py              # 生成 search.json 并测试查询耗时
+  python3 search_index.py 月 舟        # 查询
+"""
+
+import json
+import math
+import re
+import sys
+import unicodedata
+from http import HTTPStatus
+
+from split_fortunes import write_compact_json
+
+SOURCE_FILE = "omikuji/data/senso-ji-fortunes-full-optimized-v1.json"
+SEARCH_FILE = "omikuji/data/fortunes/search.json"
+FORMAT_VERSION = 1
+
+# (字段名, 权重)；字段序号即位掩码中的位，最多 MASK_BITS 个字段
+FIELDS = [
+    ('poem', 3.0),
+    ('lines', 2.0),
+    ('interpretation', 1.0),
+]
+MASK_BITS = 3
+
+# 静态索引中倒排列表的编码字母表（URL 安全的 64 个字符）
+ALPHABET = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz-_"
+
+MAX_QUERY = 64
+MAX_LIMIT = 100
+DEFAULT_LIMIT = 20
+
+# 连续的文字（汉字、假名、字母、数字），标点和空白作为分隔
+SEGMENT = re.compile(r'\w+')
+
+
+def normalize(text):
+    """全角转半角、大写转小写"""
+    return unicodedata.normalize('NFKC', text).lower()
+
+
+def segments(text):
+    return SEGMENT.findall(normalize(text))
+
+
+def index_tokens(text):
+    """建索引用：每段的全部单字和相邻两字"""
+    tokens = set()
+    for segment in segments(text):
+        tokens.update(segment)
+        tokens.update(segment[i:i + 2] for i in range(len(segment) - 1))
+    return tokens
+
+
+def query_tokens(text):
+    """查询用：单字段落查单字，否则查相邻两字"""
+    tokens = []
+    for segment in segments(text):
+        grams = [segment] if len(segment) == 1 else [segment[i:i + 2] for i in range(len(segment) - 1)]
+        tokens.extend(g for g in grams if g not in tokens)
+    return tokens
+
+
+def fortune_fields(fortune):
+    """按 FIELDS 的顺序返回每个字段的文本"""
+    poem = fortune.get('poem') or {}
+    interpretation = fortune.get('interpretation') or {}
+    texts = {
+        'poem': '\n'.join(poem.get('lines') or []),
+        'lines': '\n'.join(poem.get('lineInterpretations') or []),
+        'interpretation': '\n'.join(v for v in interpretation.values() if isinstance(v, str)),
+    }
+    return [texts[name] for name, _ in FIELDS]
+
+
+def encode_varint(value, out):
+    """每个字符携带 5 位，低位在前；字母表后半部分表示后面还有字符"""
+    while value >= 32:
+        out.append(ALPHABET[32 + (value & 31)])
+        value >>= 5
+    out.append(ALPHABET[value])
+
+
+def encode_posting(posting):
+    """{文档号: 位掩码} → 字符串：每个文档一个变长整数 (文档号差值 << MASK_BITS) | 位掩码"""
+    out = []
+    previous = 0
+    for doc, mask in sorted(posting.items()):
+        encode_varint((doc - previous) << MASK_BITS | mask, out)
+        previous = doc
+    return ''.join(out)
+
+
+def decode_posting(text):
+    posting = {}
+    doc = value = shift = 0
+    for char in text:
+        digit = ALPHABET.index(char)
+        value |= (digit & 31) << shift
+        if digit >= 32:
+            shift += 5
+            continue
+        doc += value >> MASK_BITS
+        posting[doc] = value & ((1 << MASK_BITS) - 1)
+        value = shift = 0
+    return posting
+
+
+class SearchIndex:
+    """
+    倒排索引与查询
+
+    Args:
+        docs: [(签号, 签级, 首句)]，下标即文档号
+        postings: {词项: {文档号: 字段位掩码}}
+        weights: 每个字段的权重
+    """
+
+    def __init__(self, docs, postings, weights=None):
+        self.docs = docs
+        self.postings = postings
+        self.weights = list(weights or [w for _, w in FIELDS])
+        n = len(docs)
+        self.idf = {token: math.log(1 + n / len(posting)) for token, posting in postings.items()}
+        # 位掩码 → 命中字段的权重之和
+        self._mask_weight = {}
+
+    @classmethod
+    def build(cls, fortunes):
+        docs = []
+        postings = {}
+        for doc, fortune in enumerate(sorted(fortunes, key=lambda f: f['id'])):
+            lines = (fortune.get('poem') or {}).get('lines') or ['']
+            docs.append((fortune['id'], fortune.get('level', ''), lines[0]))
+            for field, text in enumerate(fortune_fields(fortune)):
+                for token in index_tokens(text):
+                    posting = postings.setdefault(token, {})
+                    posting[doc] = posting.get(doc, 0) | (1 << field)
+        return cls(docs, postings)
+
+    def mask_weight(self, mask):
+        weight = self._mask_weight.get(mask)
+        if weight is None:
+            weight = sum(w for i, w in enumerate(self.weights) if mask >> i & 1)
+            self._mask_weight[mask] = weight
+        return weight
+
+    def search(self, query, limit=DEFAULT_LIMIT):
+        """
+        Returns:
+            (命中总数, [{id, level, line, score, fields}])，按得分降序、签号升序
+        """
+        tokens = query_tokens(query)
+        if not tokens:
+            return 0, []
+        lists = [self.postings.get(token) for token in tokens]
+        if not all(lists):
+            return 0, []
+
+        # 从最短的倒排列表开始求交集
+        order = sorted(range(len(tokens)), key=lambda i: len(lists[i]))
+        candidates = set(lists[order[0]])
+        for i in order[1:]:
+            candidates.intersection_update(lists[i])
+            if not candidates:
+                return 0, []
+
+        scored = []
+        for doc in candidates:
+            score = 0.0
+            fields = 0
+            for token, posting in zip(tokens, lists):
+                mask = posting[doc]
+                score += self.idf[token] * self.mask_weight(mask)
+                fields |= mask
+            scored.append((-score, self.docs[doc][0], doc, fields))
+        scored.sort()
+
+        results = []
+        for neg_score, fortune_id, doc, fields in scored[:limit]:
+            _, level, line = self.docs[doc]
+            results.append({
+                'id': fortune_id,
+                'level': level,
+                'line': line,
+                'score': round(-neg_score, 3),
+                'fields': [name for i, (name, _) in enumerate(FIELDS) if fields >> i & 1]
+            })
+        return len(scored), results
+
+    def export(self):
+        """紧凑的静态索引：每个词项的倒排列表编码为一个字符串（见 encode_posting）"""
+        postings = {token: encode_posting(self.postings[token]) for token in sorted(self.postings)}
+        return {
+            'version': FORMAT_VERSION,
+            'fields': [name for name, _ in FIELDS],
+            'weights': self.weights,
+            'docs': [list(doc) for doc in self.docs],
+            'postings': postings
+        }
+
+    @classmethod
+    def from_export(cls, data):
+        if data.get('version') != FORMAT_VERSION:
+            raise ValueError(f"不支持的索引版本: {data.get('version')}")
+        postings = {token: decode_posting(text) for token, text in data['postings'].items()}
+        return cls([tuple(doc) for doc in data['docs']], postings, data['weights'])
+
+
+def build_search_index(source_file=SOURCE_FILE, output_file=SEARCH_FILE):
+    """从线上签文 JSON 生成静态索引，返回 SearchIndex"""
+    with open(source_file, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    index = SearchIndex.build(data['fortunes'])
+    write_compact_json(output_file, index.export())
+    return index
+
+
+def load_search_index(path=SEARCH_FILE):
+    with open(path, 'r', encoding='utf-8') as f:
+        return SearchIndex.from_export(json.load(f))
+
+
+def parse_limit(value):
+    if value in (None, ''):
+        return DEFAULT_LIMIT
+    try:
+        limit = int(value)
+    except (TypeError, ValueError):
+        limit = None
+    if limit is None or not 1 <= limit <= MAX_LIMIT:
+        raise ValueError(f"limit 必须是 1-{MAX_LIMIT} 之间的整数")
+    return limit
+
+
+class SearchService:
+    """serve.py 的 /api/search 入口"""
+
+    def __init__(self, index):
+        self.index = index
+
+    def handle(self, method, query, body):
+        if method != 'GET':
+            return HTTPStatus.METHOD_NOT_ALLOWED, {'error': '只支持 GET'}
+        try:
+            text = query.get('q', '').strip()
+            if not text or len(text) > MAX_QUERY:
+                raise ValueError(f"q 不能为空，且不超过 {MAX_QUERY} 字")
+            limit = parse_limit(query.get('limit'))
+        except ValueError as e:
+            return HTTPStatus.BAD_REQUEST, {'error': str(e)}
+
+        total, results = self.index.search(text, limit)
+        return HTTPStatus.OK, {'query': text, 'total': total, 'results': results}
+
+
+def load_search_service(path=SEARCH_FILE):
+    return SearchService(load_search_index(path))
+
+
+if __name__ == "__main__":
+    import os
+    import time
+
+    if len(sys.argv) > 1:
+        index = load_search_index()
+        for text in sys.argv[1:]:
+            total, results = index.search(text, limit=10)
+            print(f"🔍 {text}：{total} 支签")
+            for r in results:
+                print(f"   第{r['id']}签 {r['level']} {r['line']}（{r['score']}，{'/'.join(r['fields'])}）")
+        sys.exit(0)
+
+    start = time.perf_counter()
+    index = build_search_index()
+    elapsed = time.perf_counter() - start
+    size = os.path.getsize(SEARCH_FILE)
+    print(f"✅ {len(index.docs)} 支签，{len(index.postings)} 个词项，耗时 {elapsed:.2f}s")
+    print(f"📦 {SEARCH_FILE}（{size / 1024:.1f} KB）")
+
+    queries = ['月', '舟', '浮圖塔', '贵人相助', '婚嫁', '不存在的词']
+    rounds = 10_000
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for text in queries:
+            index.search(text)
+    elapsed = time.perf_counter() - start
+    print(f"⏱️  {rounds * len(queries)} 次查询，平均 {elapsed / rounds / len(queries) * 1e6:.1f}µs")
+    sys.exit(0)
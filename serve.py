@@ -0,0 +1,505 @@
+#!/usr/bin/env python3
+"""
+一念 - 本地 / 自建部署静态服务器
+
+替代 `python3 -m http.server`，适合内网、展会一体机等自建部署：
+- 多线程并发处理请求，HTTP/1.1 keep-alive
+- 按字节数限制大小的内存 LRU 缓存，热点文件无需反复读盘
+- 按 Accept-Encoding 直接发送预压缩的 .br / .gz 副本（compress_assets.py 生成）
+- ETag / Last-Modified 条件请求（304），图片支持 Range 请求（206）
+- 大文件使用 sendfile 零拷贝发送
+- 读取 vercel.json 中的 rewrites 和 headers，与线上行为保持一致
+- /api/* 接口（抽签、检索、抽签历史同步等），由 register_api() 挂载
+- 启动前运行 verify_dataset.py 校验签文数据和图片，有错误时拒绝启动
+
+用法：
+  python3 serve.py                 # 监听 0.0.0.0:8080
+  python3 serve.py --port 9000 --cache-mb 128 --quiet
+  python3 serve.py --root dist     # 预览 fingerprint_assets.py 生成的部署目录
+"""
+
+import argparse
+import json
+import mimetypes
+import os
+import re
+import sqlite3
+import sys
+import threading
+from collections import OrderedDict
+from email.utils import formatdate, parsedate_to_datetime
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qsl, unquote, urlsplit
+
+ROOT = Path(__file__).resolve().parent
+VERCEL_CONFIG = ROOT / "vercel.json"
+
+# 与 Vercel 对未配置 headers 的资源的默认行为一致
+DEFAULT_CACHE_CONTROL = "public, max-age=0, must-revalidate"
+
+# 超过该大小的文件不进入内存缓存，直接 sendfile
+MAX_CACHED_FILE = 1 << 20
+
+# API 请求体上限
+MAX_BODY = 64 << 10
+
+# 按优先级排列的预压缩格式
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+mimetypes.add_type('image/webp', '.webp')
+mimetypes.add_type('image/avif', '.avif')
+mimetypes.add_type('application/json', '.json')
+mimetypes.add_type('application/x-fortune-pack', '.pack')
+
+TEXT_TYPES = ('text/', 'application/json', 'application/javascript', 'image/svg+xml')
+
+# 可以使用预压缩副本的类型（.pack 中大部分是 UTF-8 文本，压缩率接近 JSON）
+COMPRESSIBLE_TYPES = TEXT_TYPES + ('application/x-fortune-pack',)
+
+
+# ==================== vercel.json ====================
+
+def _route_regex(source):
+    """把 vercel.json 的 source（path-to-regexp 风格）转换为正则"""
+    pattern = re.sub(r':(\w+)\*', r'(?P<\1>.*)', source)
+    pattern = re.sub(r':(\w+)', r'(?P<\1>[^/]+)', pattern)
+    return re.compile(f'^{pattern}$')
+
+
+def _substitute(destination, match):
+    """把 $1 / :name 替换为匹配到的分组"""
+    result = re.sub(r'\$(\d+)', lambda m: match.group(int(m.group(1))) or '', destination)
+    return re.sub(r':(\w+)', lambda m: match.groupdict().get(m.group(1), m.group(0)), result)
+
+
+def load_vercel_config(path=VERCEL_CONFIG):
+    """
+    读取 vercel.json 中的 rewrites 和 headers
+
+    Returns:
+        (rewrites, header_rules)：[(regex, destination)], [(regex, [(key, value)])]
+    """
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            config = json.load(f)
+    except (OSError, ValueError):
+        config = {}
+
+    rewrites = [(_route_regex(r['source']), r['destination']) for r in config.get('rewrites', [])]
+    header_rules = [
+        (_route_regex(rule['source']), [(h['key'], h['value']) for h in rule.get('headers', [])])
+        for rule in config.get('headers', [])
+    ]
+    return rewrites, header_rules
+
+
+# ==================== 文件缓存 ====================
+
+class FileCache:
+    """
+    按字节数限制的 LRU 文件缓存（线程安全）
+
+    每次命中时比较 mtime 和大小，文件被重新构建后自动失效。
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, path, st):
+        with self.lock:
+            entry = self.entries.get(path)
+            if entry and entry[0] == st.st_mtime_ns and len(entry[1]) == st.st_size:
+                self.entries.move_to_end(path)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+
+        if st.st_size > MAX_CACHED_FILE or st.st_size > self.max_bytes:
+            return None
+
+        with open(path, 'rb') as f:
+            body = f.read()
+
+        with self.lock:
+            old = self.entries.pop(path, None)
+            if old:
+                self.current_bytes -= len(old[1])
+            self.entries[path] = (st.st_mtime_ns, body)
+            self.current_bytes += len(body)
+            while self.current_bytes > self.max_bytes:
+                _, (_, evicted) = self.entries.popitem(last=False)
+                self.current_bytes -= len(evicted)
+        return body
+
+
+# ==================== 请求处理 ====================
+
+def parse_accept_encoding(header):
+    """解析 Accept-Encoding，返回可接受的编码集合（q=0 视为拒绝）"""
+    accepted = set()
+    for part in (header or '').split(','):
+        name, _, params = part.strip().partition(';')
+        name = name.strip().lower()
+        q = 1.0
+        match = re.search(r'q\s*=\s*([\d.]+)', params)
+        if match:
+            try:
+                q = float(match.group(1))
+            except ValueError:
+                q = 0.0
+        if name and q > 0:
+            accepted.add(name)
+    return accepted
+
+
+def parse_range(header, size):
+    """
+    解析单段 Range 请求
+
+    Returns:
+        (start, end) 闭区间；无 Range 或格式不支持时返回 None；无法满足时返回 False
+    """
+    match = re.fullmatch(r'\s*bytes\s*=\s*(\d*)\s*-\s*(\d*)\s*', header or '')
+    if not match or not (match.group(1) or match.group(2)):
+        return None
+    first, last = match.groups()
+    if first:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+    else:
+        length = int(last)
+        if length == 0:
+            return False
+        start, end = max(size - length, 0), size - 1
+    if start >= size or start > end:
+        return False
+    return start, end
+
+
+class StaticHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    server_version = 'YinianServer/1.0'
+    # keep-alive 连接的空闲超时（秒）
+    timeout = 15
+    # 响应头和 sendfile 正文分两次发送，Nagle 算法会让 keep-alive 请求多等约 40ms
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        if not self.server.quiet:
+            super().log_message(format, *args)
+
+    def do_GET(self):
+        if not self.serve_api():
+            self.serve(head=False)
+
+    def do_HEAD(self):
+        self.serve(head=True)
+
+    def do_POST(self):
+        if not self.serve_api():
+            self.send_error_body(HTTPStatus.METHOD_NOT_ALLOWED)
+
+    def do_DELETE(self):
+        if not self.serve_api():
+            self.send_error_body(HTTPStatus.METHOD_NOT_ALLOWED)
+
+    # ---------- API ----------
+
+    def serve_api(self):
+        """分发 /api/* 请求；不是 API 路径时返回 False"""
+        url = urlsplit(self.path)
+        api = self.server.api.get(url.path)
+        if api is None:
+            return False
+
+        body = None
+        try:
+            length = int(self.headers.get('Content-Length') or 0)
+        except ValueError:
+            length = -1
+        # 拒绝时请求体没有读取，连接上剩余的数据无法再解析为下一个请求，响应后关闭连接
+        if length < 0:
+            self.close_connection = True
+            self.send_json(HTTPStatus.BAD_REQUEST, {'error': 'Content-Length 必须是非负整数'})
+            return True
+        if length > MAX_BODY:
+            self.close_connection = True
+            self.send_json(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, {'error': f'请求体不能超过 {MAX_BODY >> 10}KB'})
+            return True
+        if length:
+            try:
+                body = json.loads(self.rfile.read(length))
+            except ValueError:
+                self.send_json(HTTPStatus.BAD_REQUEST, {'error': '请求体不是合法的 JSON'})
+                return True
+
+        status, payload = api(self.command, dict(parse_qsl(url.query)), body)
+        self.send_json(status, payload)
+        return True
+
+    def send_json(self, status, payload):
+        body = json.dumps(payload, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('Cache-Control', 'no-store')
+        self.end_headers()
+        self.wfile.write(body)
+
+    # ---------- 路径解析 ----------
+
+    def resolve(self, url_path):
+        """应用 vercel.json 的 rewrites，返回 (线上路径, 本地文件路径)"""
+        # 拒绝 .. 和隐藏文件（.git、.build-cache 等）
+        if any(part == '..' or part.startswith('.') for part in url_path.split('/')):
+            return url_path, None
+
+        route = url_path
+        for regex, destination in self.server.rewrites:
+            match = regex.match(url_path)
+            if match:
+                route = _substitute(destination, match)
+                break
+
+        target = (self.server.root / route.lstrip('/')).resolve()
+        if target != self.server.root and self.server.root not in target.parents:
+            return route, None
+        if target.is_dir():
+            target = target / 'index.html'
+        return route, target
+
+    def rule_headers(self, route):
+        headers = []
+        for regex, rule in self.server.header_rules:
+            if regex.match(route):
+                headers.extend(rule)
+        if not any(key.lower() == 'cache-control' for key, _ in headers):
+            headers.append(('Cache-Control', DEFAULT_CACHE_CONTROL))
+        return headers
+
+    def pick_encoding(self, path, st, content_type):
+        """选择可用的预压缩副本，副本比源文件旧时不使用"""
+        if not content_type.startswith(COMPRESSIBLE_TYPES):
+            return None, path, st
+        accepted = parse_accept_encoding(self.headers.get('Accept-Encoding'))
+        for encoding, suffix in ENCODINGS:
+            if encoding not in accepted:
+                continue
+            variant = path.with_name(path.name + suffix)
+            try:
+                variant_st = variant.stat()
+            except OSError:
+                continue
+            if variant_st.st_mtime_ns >= st.st_mtime_ns:
+                return encoding, variant, variant_st
+        return None, path, st
+
+    def not_modified(self, etag, mtime):
+        if_none_match = self.headers.get('If-None-Match')
+        if if_none_match:
+            tags = [t.strip().removeprefix('W/') for t in if_none_match.split(',')]
+            return '*' in tags or etag in tags
+        if_modified_since = self.headers.get('If-Modified-Since')
+        if if_modified_since:
+            try:
+                return int(mtime) <= parsedate_to_datetime(if_modified_since).timestamp()
+            except (TypeError, ValueError):
+                return False
+        return False
+
+    # ---------- 响应 ----------
+
+    def send_error_body(self, status):
+        body = f"{status.value} {status.phrase}\n".encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'text/plain; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if self.command != 'HEAD':
+            self.wfile.write(body)
+
+    def serve(self, head):
+        url_path = unquote(urlsplit(self.path).path)
+        route, path = self.resolve(url_path)
+        try:
+            st = path.stat() if path else None
+        except OSError:
+            st = None
+        if st is None or not path.is_file():
+            self.send_error_body(HTTPStatus.NOT_FOUND)
+            return
+
+        content_type = mimetypes.guess_type(path.name)[0] or 'application/octet-stream'
+        if content_type.startswith(TEXT_TYPES) and 'charset' not in content_type:
+            content_type += '; charset=utf-8'
+
+        encoding, body_path, body_st = self.pick_encoding(path, st, content_type)
+        etag = f'"{st.st_size:x}-{st.st_mtime_ns:x}{"-" + encoding if encoding else ""}"'
+
+        if self.not_modified(etag, st.st_mtime):
+            self.send_response(HTTPStatus.NOT_MODIFIED)
+            self.send_common_headers(route, etag, st, encoding)
+            self.end_headers()
+            return
+
+        size = body_st.st_size
+        status = HTTPStatus.OK
+        start, end = 0, size - 1
+
+        # Range 只对未压缩的原始文件生效（主要用于图片）
+        if encoding is None and 'Range' in self.headers:
+            if_range = self.headers.get('If-Range')
+            byte_range = parse_range(self.headers['Range'], size) if not if_range or if_range == etag else None
+            if byte_range is False:
+                self.send_response(HTTPStatus.REQUESTED_RANGE_NOT_SATISFIABLE)
+                self.send_header('Content-Range', f'bytes */{size}')
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+            if byte_range:
+                status = HTTPStatus.PARTIAL_CONTENT
+                start, end = byte_range
+
+        length = end - start + 1 if size else 0
+        self.send_response(status)
+        self.send_common_headers(route, etag, st, encoding)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(length))
+        if status == HTTPStatus.PARTIAL_CONTENT:
+            self.send_header('Content-Range', f'bytes {start}-{end}/{size}')
+        self.end_headers()
+
+        if head or not length:
+            return
+
+        body = self.server.cache.get(str(body_path), body_st)
+        if body is not None:
+            self.wfile.write(body[start:end + 1] if status == HTTPStatus.PARTIAL_CONTENT else body)
+        else:
+            with open(body_path, 'rb') as f:
+                self.connection.sendfile(f, start, length)
+
+    def send_common_headers(self, route, etag, st, encoding):
+        self.send_header('ETag', etag)
+        self.send_header('Last-Modified', formatdate(st.st_mtime, usegmt=True))
+        self.send_header('Accept-Ranges', 'bytes')
+        self.send_header('Vary', 'Accept-Encoding')
+        if encoding:
+            self.send_header('Content-Encoding', encoding)
+        for key, value in self.rule_headers(route):
+            self.send_header(key, value)
+
+
+class StaticServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # 展会等突发场景下同时建立的连接较多
+    request_queue_size = 256
+
+    def __init__(self, address, root=ROOT, cache_bytes=64 << 20, quiet=False, config=VERCEL_CONFIG):
+        super().__init__(address, StaticHandler)
+        self.root = Path(root).resolve()
+        self.cache = FileCache(cache_bytes)
+        self.quiet = quiet
+        self.rewrites, self.header_rules = load_vercel_config(config)
+        self.api = {}
+
+    def register_api(self, path, handler):
+        """
+        挂载 API：handler(method, query, body) -> (HTTPStatus, JSON 对象)
+
+        query 为查询参数字典，body 为解析后的 JSON 请求体（没有时为 None）。
+        """
+        self.api[path] = handler
+
+
+def resolve_asset(root, path):
+    """
+    返回站点中的实际文件路径
+
+    fingerprint_assets.py 生成的部署目录中文件名带有内容哈希，
+    按 omikuji/asset-manifest.json 找到对应的文件。
+    """
+    target = Path(root) / path
+    manifest = Path(root) / "omikuji" / "asset-manifest.json"
+    if target.exists() or not manifest.exists():
+        return target
+    with open(manifest, 'r', encoding='utf-8') as f:
+        mapping = json.load(f)
+    logical = Path(path).relative_to("omikuji").as_posix()
+    return Path(root) / "omikuji" / mapping.get(logical, logical)
+
+
+def register_default_apis(server, history_db=None):
+    """挂载内置 API；依赖的数据文件缺失时跳过并提示"""
+    from fortune_draw import INDEX_FILE, load_draw_service
+    from history_store import HISTORY_DB, load_history_service
+    from search_index import SEARCH_FILE, load_search_service
+
+    try:
+        draw_service = load_draw_service(resolve_asset(server.root, INDEX_FILE))
+    except (OSError, ValueError, KeyError) as e:
+        print(f"⚠️  未挂载 /api/draw：{e}")
+    else:
+        server.register_api('/api/draw', draw_service.handle)
+
+    try:
+        search_service = load_search_service(resolve_asset(server.root, SEARCH_FILE))
+    except (OSError, ValueError, KeyError) as e:
+        print(f"⚠️  未挂载 /api/search：{e}")
+    else:
+        server.register_api('/api/search', search_service.handle)
+
+    try:
+        history_service = load_history_service(history_db or ROOT / HISTORY_DB)
+    except (OSError, sqlite3.Error) as e:
+        print(f"⚠️  未挂载 /api/history：{e}")
+    else:
+        server.register_api('/api/history', history_service.handle)
+        server.register_api('/api/history/sync', history_service.handle_sync)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="一念静态服务器")
+    parser.add_argument('--host', default='0.0.0.0', help="监听地址（默认 0.0.0.0）")
+    parser.add_argument('--port', type=int, default=8080, help="端口（默认 8080）")
+    parser.add_argument('--cache-mb', type=int, default=64, help="内存缓存上限（MB）")
+    parser.add_argument('--quiet', action='store_true', help="不输出访问日志")
+    parser.add_argument('--no-api', action='store_true', help="只提供静态文件，不挂载 /api/*")
+    parser.add_argument('--skip-verify', action='store_true', help="启动前不校验签文数据和图片")
+    parser.add_argument('--root', default=ROOT, type=Path,
+                        help="站点根目录（默认项目目录；dist 为带内容指纹的部署目录）")
+    parser.add_argument('--history-db', type=Path,
+                        help="抽签历史数据库（默认 .data/history.db）")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    if not args.skip_verify:
+        from verify_dataset import verify_dataset
+        if not verify_dataset(root=ROOT, fail_fast=True, quiet=True).ok:
+            print("❌ 签文数据校验失败，服务器未启动（--skip-verify 可跳过校验）")
+            sys.exit(1)
+    server = StaticServer((args.host, args.port), root=args.root, cache_bytes=args.cache_mb << 20,
+                          quiet=args.quiet, config=args.root / "vercel.json")
+    if not args.no_api:
+        register_default_apis(server, history_db=args.history_db)
+    print(f"🌐 一念服务器已启动: http://{args.host}:{args.port}")
+    print(f"📂 根目录: {server.root}（按 vercel.json 重写到 omikuji/）")
+    print(f"💾 内存缓存上限: {args.cache_mb} MB")
+    if server.api:
+        print(f"🔌 API: {', '.join(sorted(server.api))}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n👋 服务器已停止")
+    finally:
+        server.server_close()
+    sys.exit(0)
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+把线上签文数据拆分为精简索引 + 按需加载的详情分片
+
+  omikuji/data/fortunes/index.json      抽签和列表所需的最少字段（id、签级、首句、图片）
+  omikuji/data/fortunes/detail-N.json   每 SHARD_SIZE 条签的完整数据，抽中或查询时再加载
+
+首屏只需下载索引即可抽签，不必先下载完整的签文 JSON。
+"""
+
+import json
+import os
+import sys
+from pathlib import Path
+
+SOURCE_FILE = "omikuji/data/senso-ji-fortunes-full-optimized-v1.json"
+OUTPUT_DIR = "omikuji/data/fortunes"
+SHARD_SIZE = 5
+
+
+def write_compact_json(path, data):
+    """原子地写入紧凑 JSON（无缩进、无多余空格）"""
+    path = Path(path)
+    tmp_path = path.with_name(path.name + '.tmp')
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, separators=(',', ':'))
+    os.replace(tmp_path, path)
+
+
+def index_entry(fortune, shard):
+    """索引中每条签只保留抽签、列表和预加载图片需要的字段"""
+    return {
+        'id': fortune['id'],
+        'level': fortune['level'],
+        'line': fortune['poem']['lines'][0] if fortune['poem'].get('lines') else '',
+        'imageFront': fortune.get('imageFront'),
+        'imageBack': fortune.get('imageBack'),
+        'shard': shard
+    }
+
+
+def split_fortunes(source_file=SOURCE_FILE, output_dir=OUTPUT_DIR, shard_size=SHARD_SIZE):
+    """
+    拆分签文数据
+
+    Returns:
+        写出的文件列表
+    """
+    with open(source_file, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+
+    output_path = Path(output_dir)
+    output_path.mkdir(parents=True, exist_ok=True)
+
+    fortunes = sorted(data['fortunes'], key=lambda x: x['id'])
+    shards = []
+    entries = []
+    written = []
+
+    for start in range(0, len(fortunes), shard_size):
+        shard = len(shards)
+        name = f"detail-{shard}.json"
+        batch = fortunes[start:start + shard_size]
+        shards.append(name)
+        entries.extend(index_entry(fortune, shard) for fortune in batch)
+
+        write_compact_json(output_path / name, {
+            'fortunes': {str(fortune['id']): fortune for fortune in batch}
+        })
+        written.append(output_path / name)
+
+    write_compact_json(output_path / 'index.json', {
+        'metadata': data['metadata'],
+        'shards': shards,
+        'fortunes': entries
+    })
+    written.append(output_path / 'index.json')
+
+    # 清理签数减少后遗留的旧分片
+    for stale in output_path.glob('detail-*.json'):
+        if stale.name not in shards:
+            stale.unlink()
+
+    source_size = os.path.getsize(source_file)
+    index_size = os.path.getsize(output_path / 'index.json')
+    print(f"✅ 已拆分 {len(fortunes)} 条签文为 1 个索引 + {len(shards)} 个详情分片")
+    print(f"📊 完整数据 {source_size/1024:.1f}KB → 索引 {index_size/1024:.1f}KB")
+
+    return written
+
+
+if __name__ == "__main__":
+    split_fortunes(*sys.argv[1:3])
@@ -47,5 +47,5 @@ echo "  • 按 Ctrl+C 停止服务器"
 echo "━━━━━━━━━━━━━━━━━━━━"
 echo ""
 
-# 启动Python HTTP服务器
-python3 -m http.server 8080
+# 启动服务器（多线程、支持预压缩、ETag 和 vercel.json 中的缓存规则）
+exec python3 ../serve.py --port 8080
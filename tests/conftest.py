@@ -0,0 +1,6 @@
+import sys
+from pathlib import Path
+
+# 构建脚本都在仓库根目录（不是包），测试直接按模块名导入
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
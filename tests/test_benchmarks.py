@@ -0,0 +1,41 @@
+"""benchmarks.py：基线的保存和比较"""
+
+import json
+
+import benchmarks
+from conftest import ROOT
+
+
+def result(seconds):
+    return {'seconds': seconds, 'min': seconds, 'runs': 1, 'work': 1, 'unit': 'items', 'throughput': 1 / seconds}
+
+
+def test_committed_baseline_covers_all_benchmarks():
+    baseline = json.loads((ROOT / benchmarks.BASELINE_FILE).read_text(encoding='utf-8'))
+    for scale in ('full', 'quick'):
+        assert set(baseline[scale]['results']) == set(benchmarks.BENCHMARKS)
+
+
+def test_scales_are_kept_separately(tmp_path):
+    path = tmp_path / 'baseline.json'
+    benchmarks.save_baseline({'draw': result(1.0)}, quick=False, path=path)
+    benchmarks.save_baseline({'draw': result(0.1)}, quick=True, path=path)
+
+    assert benchmarks.check_regressions({'draw': result(1.1)}, quick=False, path=path) == []
+    assert benchmarks.check_regressions({'draw': result(0.5)}, quick=True, path=path) == ['draw']
+
+
+def test_missing_scale_is_not_compared(tmp_path):
+    path = tmp_path / 'baseline.json'
+    benchmarks.save_baseline({'draw': result(1.0)}, quick=False, path=path)
+
+    assert benchmarks.check_regressions({'draw': result(9.0)}, quick=True, path=path) is None
+
+
+def test_partial_save_keeps_other_benchmarks(tmp_path):
+    path = tmp_path / 'baseline.json'
+    benchmarks.save_baseline({'draw': result(1.0), 'enrich': result(2.0)}, quick=False, path=path)
+    benchmarks.save_baseline({'draw': result(3.0)}, quick=False, path=path)
+
+    assert benchmarks.load_baseline(path)['full']['results']['enrich']['seconds'] == 2.0
+    assert benchmarks.check_regressions({'draw': result(3.0)}, quick=False, path=path) == []
@@ -0,0 +1,97 @@
+"""build.py 阶段依赖图：签诗修改要一路传到线上分片"""
+
+import json
+import shutil
+
+import pytest
+
+import build
+import optimize_images
+from conftest import ROOT
+
+
+@pytest.fixture
+def workspace(tmp_path, monkeypatch):
+    """在临时目录中放一份构建输入，阶段脚本按相对路径读写"""
+    for path in [build.GEMINI_FILE, build.FULL_FILE, build.SERVED_FILE]:
+        target = tmp_path / path
+        target.parent.mkdir(parents=True, exist_ok=True)
+        shutil.copy2(ROOT / path, target)
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+def load_detail(workspace, fortune_id):
+    with open(workspace / build.FORTUNES_DIR / 'index.json', encoding='utf-8') as f:
+        index = json.load(f)
+    entry = next(e for e in index['fortunes'] if e['id'] == fortune_id)
+    with open(workspace / build.FORTUNES_DIR / index['shards'][entry['shard']], encoding='utf-8') as f:
+        shard = json.load(f)
+    return shard['fortunes'][str(fortune_id)]
+
+
+def test_served_data_is_downstream_of_gemini():
+    stages = build.resolve(['split'])
+    assert stages.index('gemini') < stages.index('enrich') < stages.index('publish') < stages.index('images')
+    for name in ['images', 'split', 'pack', 'search', 'fingerprint']:
+        assert build.SERVED_FILE in build.STAGES[name]['inputs']
+    assert build.SERVED_FILE in build.STAGES['publish']['outputs']
+
+
+def test_poem_edit_reaches_detail_shards(workspace):
+    source = workspace / build.GEMINI_FILE
+    text = source.read_text(encoding='utf-8')
+    assert text.count('"七寶浮圖塔"') == 1
+    source.write_text(text.replace('"七寶浮圖塔"', '"七寶浮圖閣"'), encoding='utf-8')
+
+    before = load_detail(ROOT, 2)
+    options = build.parse_args(['--workers', '1'])
+    # images 只改写图片字段，这里跳过（需要 Pillow 且较慢）
+    for name in build.resolve(['split']):
+        if name in ('gemini', 'enrich', 'publish', 'split'):
+            build.STAGES[name]['run'](options)
+
+    edited = load_detail(workspace, 1)
+    assert edited['poem']['lines'][0] == '七寶浮圖閣'
+    assert edited['interpretation'] != load_detail(ROOT, 1)['interpretation']
+    # 签诗没变的签保留线上润色过的释义
+    assert load_detail(workspace, 2)['interpretation'] == before['interpretation']
+
+
+def test_optimize_is_opt_in():
+    options = build.parse_args([])
+    assert build.opted_out('optimize', [], options)
+    assert build.opted_out('optimize', ['images'], options)
+    assert not build.opted_out('optimize', ['optimize'], options)
+    assert not build.opted_out('optimize', [], build.parse_args(['--optimize']))
+    assert not build.opted_out('images', [], options)
+
+
+def test_fingerprint_runs_after_split_pack_search():
+    deps = build.STAGES['fingerprint']['deps']
+    for name in ['split', 'pack', 'search']:
+        assert name in deps
+
+
+@pytest.mark.parametrize('argv, quality', [
+    ([], optimize_images.DEFAULT_QUALITY),
+    (['--target-ssim', '0.985'], optimize_images.QUALITY_SEARCH_MAX),
+    (['--target-psnr', '40', '--quality', '90'], 90),
+])
+def test_quality_defaults_match_optimize_images(argv, quality):
+    assert build.parse_args(argv).quality == quality
+    script = optimize_images.parse_args(argv)
+    assert optimize_images.resolve_quality(script.quality, optimize_images.target_from_args(script)) == quality
+
+
+@pytest.mark.parametrize('argv', [
+    ['--target-ssim', '0.985', '--quality', '50', '--min-quality', '60'],
+    ['--quality', '0'],
+    ['--quality', '101'],
+])
+def test_invalid_quality_range_is_rejected(argv, capsys):
+    for parse_args in (build.parse_args, optimize_images.parse_args):
+        with pytest.raises(SystemExit) as exit_info:
+            parse_args(argv)
+        assert exit_info.value.code == 2
+    assert '质量' in capsys.readouterr().err
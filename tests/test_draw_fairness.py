@@ -0,0 +1,80 @@
+"""draw_fairness.py：公平性和签级规格两项检验"""
+
+import json
+
+import pytest
+
+import draw_fairness
+
+pytestmark = pytest.mark.skipif(not draw_fairness.numpy_available(), reason="需要 NumPy")
+
+
+def write_index(path, levels):
+    """按 {签级: 签数} 生成只含 id 和 level 的索引"""
+    fortunes = []
+    for level, count in levels.items():
+        fortunes += [{'id': len(fortunes) + i + 1, 'level': level} for i in range(count)]
+    path.write_text(json.dumps({'fortunes': fortunes}, ensure_ascii=False), encoding='utf-8')
+    return path
+
+
+@pytest.fixture
+def spec_index(tmp_path):
+    return write_index(tmp_path / 'spec.json', draw_fairness.load_level_mapping())
+
+
+@pytest.fixture
+def skewed_index(tmp_path):
+    # 把全部大凶改成大吉：算法仍然公平，但签级分布不再符合规格
+    levels = draw_fairness.load_level_mapping()
+    levels['大吉'] += levels.pop('大凶')
+    return write_index(tmp_path / 'skewed.json', levels)
+
+
+def test_chi2_sf_known_values():
+    assert draw_fairness.chi2_sf(3.841, 1) == pytest.approx(0.05, abs=1e-4)
+    assert draw_fairness.chi2_sf(0, 5) == 1.0
+
+
+def test_unexpected_cells_fail_without_infinite_statistic():
+    result = draw_fairness.chi_square([50, 50, 3], [0.5, 0.5, 0.0])
+    assert result['unexpected'] == 3
+    assert result['p_value'] == 0.0
+    assert result['statistic'] < float('inf')
+
+
+def test_matching_data_passes(spec_index):
+    report = draw_fairness.run(draws=200_000, index_file=spec_index)
+    assert report['ok'] and report['findings'] == []
+    # 对照组不计入结论
+    assert not report['algorithms']['clock']['fair']
+
+
+def test_spec_mismatch_fails_overall_verdict(skewed_index):
+    report = draw_fairness.run(draws=200_000, index_file=skewed_index, algorithms=['client'])
+    client = report['algorithms']['client']
+    assert client['fair'] and not client['matches_spec']
+    assert report['fair'] and not report['ok']
+    assert client['spec_deviations'][0]['level'] in ('大吉', '大凶')
+    assert report['findings'][0].startswith('client: 签级分布与 LEVEL_MAPPING 不符')
+
+
+def test_lucky_spec_excludes_levels_missing_from_data(skewed_index):
+    # 数据中没有大凶，规格中 server:lucky 仍要排除它，否则会按 8.57% 期望大凶
+    report = draw_fairness.run(draws=200_000, index_file=skewed_index, algorithms=['server:lucky'])
+    lucky = report['algorithms']['server:lucky']
+    assert lucky['excluded_levels'] == sorted(draw_fairness.UNLUCKY_LEVELS)
+    assert '大凶' not in lucky['levels'] and '凶' not in lucky['levels']
+
+
+def test_spec_mismatch_only_fails_when_strict(skewed_index, tmp_path):
+    argv = ['client', '-n', '100000', '--index', str(skewed_index), '-o', str(tmp_path / 'report.json')]
+    assert draw_fairness.main(draw_fairness.parse_args(argv)) == 0
+    assert draw_fairness.main(draw_fairness.parse_args(argv + ['--strict'])) == 1
+
+
+def test_failed_algorithms(skewed_index):
+    # build.py 的 fairness 阶段用 failed_algorithms(report) 决定是否失败，与 main() 的退出码一致
+    report = draw_fairness.run(draws=100_000, index_file=skewed_index)
+    assert draw_fairness.failed_algorithms(report) == []
+    assert draw_fairness.failed_algorithms(report, strict=True) == ['client', 'server:lucky', 'server:all']
@@ -0,0 +1,61 @@
+"""extract_pdf_fortunes.py：从仓库中的签文 PDF 提取全部签"""
+
+import json
+
+import pytest
+
+import extract_pdf_fortunes
+from conftest import ROOT
+
+pytestmark = pytest.mark.skipif(not extract_pdf_fortunes.has_pypdf(), reason="需要 pypdf")
+
+
+@pytest.fixture(scope='module')
+def parsed(tmp_path_factory):
+    cache = tmp_path_factory.mktemp('pdf') / 'pages.json'
+    texts = extract_pdf_fortunes.extract_pages(ROOT / extract_pdf_fortunes.PDF_FILE, workers=1, cache_path=cache)
+    return extract_pdf_fortunes.parse_fortunes(texts)
+
+
+def test_all_fortunes_extracted(parsed):
+    fortunes, _, errors = parsed
+    assert errors == []
+    assert sorted(f['id'] for f in fortunes) == list(range(1, extract_pdf_fortunes.TOTAL_FORTUNES + 1))
+    assert all(f['level'] in extract_pdf_fortunes.LEVELS for f in fortunes)
+
+
+def test_level_missing_from_text_layer(parsed):
+    fortunes, _, _ = parsed
+    fortune = next(f for f in fortunes if f['id'] == 49)
+    assert fortune['level'] == '吉'
+    assert fortune['poem']['lines'][0] == '正好中秋月'
+
+
+def test_summary_keeps_whole_first_sentence(parsed):
+    fortunes, _, _ = parsed
+    for fortune in fortunes:
+        summary = fortune['interpretation']['summary']
+        assert summary.endswith(('。', '！', '？')), summary
+        assert summary.count('。') == 2, summary
+
+
+def test_predictions_keep_their_own_names(parsed):
+    fortunes, _, _ = parsed
+    fortune = next(f for f in fortunes if f['id'] == 38)
+    assert fortune['predictions']['願望'] == '難實現吧。'
+    assert fortune['predictions']['遺失物'] == '難出現吧。'
+    interpretation = fortune['interpretation']
+    assert interpretation['career'] == '' and interpretation['story'] == ''
+    assert interpretation['health'] == '疾病：會拖長吧。'
+    for fortune in fortunes:
+        assert all(value for value in fortune['predictions'].values()), fortune['id']
+
+
+def test_level_changes_against_dataset(parsed, tmp_path):
+    fortunes, _, _ = parsed
+    dataset = [{'id': f['id'], 'level': f['level']} for f in fortunes]
+    dataset[37]['level'] = '大吉'
+    path = tmp_path / 'full.json'
+    path.write_text(json.dumps({'fortunes': dataset}, ensure_ascii=False), encoding='utf-8')
+    assert extract_pdf_fortunes.level_changes(fortunes, path) == [(38, '大吉', '半吉')]
+    assert extract_pdf_fortunes.level_changes(fortunes, tmp_path / 'missing.json') == []
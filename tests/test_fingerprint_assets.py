@@ -0,0 +1,18 @@
+"""fingerprint_assets.py 部署目录"""
+
+import pytest
+
+import fingerprint_assets
+from conftest import ROOT
+
+
+@pytest.mark.parametrize('bundle', [False, True])
+def test_bundle_flag_controls_inlining(tmp_path, monkeypatch, bundle):
+    monkeypatch.chdir(ROOT)
+    output = tmp_path / 'dist'
+    fingerprint_assets.fingerprint_assets(output, workers=1, hash_cache=tmp_path / 'hashes.json',
+                                          bundle=bundle, budget=0)
+
+    html = (output / 'omikuji/index.html').read_text(encoding='utf-8')
+    assert ('id="fortune-index"' in html) == bundle
+    assert ('<style>' in html) == bundle
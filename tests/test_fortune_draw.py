@@ -0,0 +1,35 @@
+"""fortune_draw.py 的 /api/draw 请求校验"""
+
+from http import HTTPStatus
+
+import pytest
+
+from fortune_draw import COUNT_ERROR, MAX_COUNT, DrawService
+
+FORTUNES = [{'id': i, 'level': level} for i, level in enumerate(['大吉', '吉', '凶'], start=1)]
+
+
+@pytest.fixture
+def service():
+    return DrawService(FORTUNES)
+
+
+@pytest.mark.parametrize('count', ['abc', '1.5', '0', '-3', str(MAX_COUNT + 1)])
+def test_invalid_count_is_rejected(service, count):
+    status, payload = service.handle('GET', {'count': count}, None)
+    assert status == HTTPStatus.BAD_REQUEST
+    assert payload == {'error': COUNT_ERROR}
+
+
+@pytest.mark.parametrize('weights', ['大吉:many', '大吉'])
+def test_invalid_weights_are_rejected(service, weights):
+    status, payload = service.handle('GET', {'weights': weights}, None)
+    assert status == HTTPStatus.BAD_REQUEST
+    assert payload['error'].startswith('权重格式应为')
+
+
+def test_count_and_seed(service):
+    status, payload = service.handle('GET', {'mode': 'all', 'seed': 'event', 'count': '5'}, None)
+    assert status == HTTPStatus.OK
+    assert len(payload['fortunes']) == 5
+    assert service.handle('GET', {'mode': 'all', 'seed': 'event', 'count': '5'}, None)[1] == payload
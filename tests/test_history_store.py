@@ -0,0 +1,56 @@
+"""history_store.py 的 /api/history 请求校验"""
+
+from http import HTTPStatus
+
+import pytest
+
+from history_store import HistoryService, HistoryStore
+
+USER = 'test-user-01'
+
+
+@pytest.fixture
+def service(tmp_path):
+    store = HistoryStore(tmp_path / 'history.db')
+    yield HistoryService(store)
+    store.close()
+
+
+@pytest.mark.parametrize('body', [[1, 2], 'records', 3])
+def test_non_object_body_is_rejected(service, body):
+    for handle in (service.handle, service.handle_sync):
+        status, payload = handle('POST', {}, body)
+        assert status == HTTPStatus.BAD_REQUEST
+        assert payload == {'error': '请求体必须是 JSON 对象'}
+
+
+@pytest.mark.parametrize('query', [{'limit': 'abc'}, {'limit': '0'}, {'before': 'x'}])
+def test_invalid_paging_returns_own_message(service, query):
+    status, payload = service.handle('GET', dict(query, user=USER), None)
+    assert status == HTTPStatus.BAD_REQUEST
+    assert 'invalid literal' not in payload['error']
+
+
+def test_sync_rejects_non_integer_limit(service):
+    status, payload = service.handle_sync('POST', {}, {'user': USER, 'limit': 'many'})
+    assert status == HTTPStatus.BAD_REQUEST
+    assert payload['error'].startswith('limit')
+
+
+def test_sync_round_trip(service):
+    record = {'id': 7, 'timestamp': 1_700_000_000_000, 'clientId': 'c1'}
+    status, payload = service.handle_sync('POST', {}, {'user': USER, 'records': [record]})
+    assert status == HTTPStatus.OK
+    assert [r['id'] for r in payload['records']] == [7]
+
+
+def test_sync_waits_only_for_its_own_records(service, monkeypatch):
+    # 其他用户持续排队写入时，共享队列可能一直排不空，同步不能等整个队列
+    monkeypatch.setattr(service.store, 'flush', lambda: pytest.fail("同步不应等待整个写队列"))
+    other = [{'id': 1, 'timestamp': 1_700_000_000_000 + i, 'clientId': f'o{i}'} for i in range(200)]
+    service.store.append('other-user-01', other)
+
+    records = [{'id': i, 'timestamp': 1_700_000_000_000 + i, 'clientId': f'c{i}'} for i in range(1, 4)]
+    status, payload = service.handle_sync('POST', {}, {'user': USER, 'records': records})
+    assert status == HTTPStatus.OK
+    assert [r['id'] for r in payload['records']] == [1, 2, 3]
@@ -0,0 +1,37 @@
+"""instrumentation.py：阶段在线程池中运行时也要能剖析到"""
+
+import json
+import signal
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from instrumentation import instrument, stage
+
+
+def busy_stage_work():
+    total = 0
+    for i in range(3_000_000):
+        total += i * i
+    return total
+
+
+def run_in_worker():
+    with stage('work'):
+        return busy_stage_work()
+
+
+@pytest.mark.skipif(not hasattr(signal, 'setitimer'), reason="flame 需要 setitimer")
+def test_profiles_cover_worker_threads(tmp_path):
+    with instrument('threaded', profile='cprofile,flame', report_dir=tmp_path) as run:
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            pool.submit(run_in_worker).result()
+
+    report = json.loads(run.base.with_suffix('.json').read_text(encoding='utf-8'))
+    profile = report['profile']
+    assert profile['threads'] == 2
+    assert any('busy_stage_work' in row['function'] for row in profile['top_functions'])
+
+    folded = (tmp_path / profile['folded'].rsplit('/', 1)[-1]).read_text(encoding='utf-8')
+    sampled = sum(int(line.rsplit(' ', 1)[1]) for line in folded.splitlines() if 'busy_stage_work' in line)
+    assert sampled > profile['samples'] / 2
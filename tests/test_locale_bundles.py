@@ -0,0 +1,60 @@
+"""locale_bundles.py：使用语言包时，页面合并出的签文详情要带上图片字段"""
+
+import json
+
+import pytest
+
+import locale_bundles
+from conftest import ROOT
+from split_fortunes import SOURCE_FILE, split_fortunes
+
+
+@pytest.fixture
+def fortunes_dir(tmp_path):
+    """带图片衍生字段（images 阶段写入的格式）的线上数据，拆分并生成语言包"""
+    with open(ROOT / SOURCE_FILE, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    for fortune in data['fortunes']:
+        for side in ('Front', 'Back'):
+            image = fortune[f'image{side}']
+            fortune[f'image{side}Sources'] = {'webp': f"responsive/{image}-480w.webp 480w"}
+            fortune[f'image{side}Placeholder'] = "data:image/webp;base64,AAAA"
+            fortune[f'image{side}Color'] = "#a08060"
+            fortune[f'image{side}Tiles'] = f"tiles/{image}.dzi"
+    source = tmp_path / 'served.json'
+    source.write_text(json.dumps(data, ensure_ascii=False), encoding='utf-8')
+
+    output = tmp_path / 'fortunes'
+    split_fortunes(source, output)
+    locale_bundles.build_locale_bundles(source, output, workers=1, manifest_path=None)
+    return output
+
+
+def merged_detail(fortunes_dir, locale, fortune_id):
+    """与 app.js 的 loadFortuneDetail 相同：{...详情, ...索引条目}"""
+    with open(fortunes_dir / 'index.json', encoding='utf-8') as f:
+        index = json.load(f)
+    entry = next(e for e in index['fortunes'] if e['id'] == fortune_id)
+    shard = index['locales'][locale]['shards'][entry['shard']]
+    with open(fortunes_dir / shard, encoding='utf-8') as f:
+        detail = json.load(f)['fortunes'][str(fortune_id)]
+    return {**detail, **entry}
+
+
+def test_locale_details_carry_image_fields(fortunes_dir):
+    with open(fortunes_dir / 'index.json', encoding='utf-8') as f:
+        locales = json.load(f)['locales']
+    assert locale_bundles.DEFAULT_LOCALE in locales
+    for locale in locales:
+        fortune = merged_detail(fortunes_dir, locale, 1)
+        for field in locale_bundles.IMAGE_FIELDS:
+            assert fortune[field], (locale, field)
+        assert fortune['imageFrontTiles'] == f"tiles/{fortune['imageFront']}.dzi"
+
+
+def test_untranslated_locales_are_not_published(fortunes_dir):
+    with open(fortunes_dir / 'index.json', encoding='utf-8') as f:
+        locales = json.load(f)['locales']
+    assert 'ja' not in locales and 'en' not in locales
+    assert not (fortunes_dir / 'ja').exists()
+    assert merged_detail(fortunes_dir, 'zh-Hans', 1)['interpretation']
@@ -0,0 +1,28 @@
+"""search_index.py 的 /api/search 请求校验"""
+
+from http import HTTPStatus
+
+import pytest
+
+from conftest import ROOT
+from search_index import MAX_LIMIT, SEARCH_FILE, SearchService, load_search_index
+
+
+@pytest.fixture(scope='module')
+def service():
+    return SearchService(load_search_index(ROOT / SEARCH_FILE))
+
+
+@pytest.mark.parametrize('limit', ['abc', '1.5', '0', str(MAX_LIMIT + 1)])
+def test_invalid_limit_is_rejected(service, limit):
+    status, payload = service.handle('GET', {'q': '月', 'limit': limit}, None)
+    assert status == HTTPStatus.BAD_REQUEST
+    assert payload == {'error': f"limit 必须是 1-{MAX_LIMIT} 之间的整数"}
+
+
+@pytest.mark.parametrize('limit, expected', [(None, 20), ('', 20), ('3', 3)])
+def test_limit_defaults_and_caps_results(service, limit, expected):
+    query = {'q': '月'} if limit is None else {'q': '月', 'limit': limit}
+    status, payload = service.handle('GET', query, None)
+    assert status == HTTPStatus.OK
+    assert len(payload['results']) == min(expected, payload['total'])
@@ -0,0 +1,104 @@
+"""serve.py：API 请求体校验，以及 ETag / Range / 预压缩副本"""
+
+import gzip
+import http.client
+import json
+import threading
+from http import HTTPStatus
+
+import pytest
+
+import serve
+from conftest import ROOT
+
+TEXT = "一念 serve.py 测试\n" * 200
+IMAGE = bytes(range(256)) * 8
+
+
+@pytest.fixture
+def server(tmp_path):
+    site = tmp_path / 'omikuji'
+    site.mkdir()
+    (site / 'hello.txt').write_text(TEXT, encoding='utf-8')
+    (site / 'hello.txt.gz').write_bytes(gzip.compress(TEXT.encode('utf-8')))
+    (site / 'slip.jpg').write_bytes(IMAGE)
+
+    httpd = serve.StaticServer(('127.0.0.1', 0), root=tmp_path, cache_bytes=1 << 20,
+                               quiet=True, config=ROOT / 'vercel.json')
+    httpd.register_api('/api/echo', lambda method, query, body: (
+        HTTPStatus.OK, {'method': method, 'query': query, 'body': body}))
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def request(server, method, path, body=None, headers=None):
+    """发送请求，返回 (状态码, 响应头, 正文)；headers 原样发送（可以是不合法的值）"""
+    conn = http.client.HTTPConnection(*server.server_address, timeout=5)
+    try:
+        conn.putrequest(method, path, skip_accept_encoding=True)
+        for key, value in (headers or {}).items():
+            conn.putheader(key, value)
+        conn.endheaders(body)
+        response = conn.getresponse()
+        return response.status, response.headers, response.read()
+    finally:
+        conn.close()
+
+
+def test_api_receives_query_and_json_body(server):
+    body = json.dumps({'records': []}).encode('utf-8')
+    status, _, payload = request(server, 'POST', '/api/echo?user=u1', body,
+                                 {'Content-Type': 'application/json', 'Content-Length': str(len(body))})
+    assert status == HTTPStatus.OK
+    assert json.loads(payload) == {'method': 'POST', 'query': {'user': 'u1'}, 'body': {'records': []}}
+
+
+@pytest.mark.parametrize('length, error', [
+    ('abc', 'Content-Length 必须是非负整数'),
+    ('-1', 'Content-Length 必须是非负整数'),
+])
+def test_invalid_content_length_is_rejected(server, length, error):
+    status, headers, payload = request(server, 'POST', '/api/echo', headers={'Content-Length': length})
+    assert status == HTTPStatus.BAD_REQUEST
+    assert json.loads(payload) == {'error': error}
+    assert headers['Content-Type'].startswith('application/json')
+
+
+def test_oversized_body_is_rejected_without_reading_it(server):
+    status, _, payload = request(server, 'POST', '/api/echo',
+                                 headers={'Content-Length': str(serve.MAX_BODY + 1)})
+    assert status == HTTPStatus.REQUEST_ENTITY_TOO_LARGE
+    assert json.loads(payload) == {'error': f'请求体不能超过 {serve.MAX_BODY >> 10}KB'}
+
+
+def test_malformed_json_body_is_rejected(server):
+    status, _, payload = request(server, 'POST', '/api/echo', b'{not json', {'Content-Length': '9'})
+    assert status == HTTPStatus.BAD_REQUEST
+    assert json.loads(payload) == {'error': '请求体不是合法的 JSON'}
+
+
+def test_etag_revalidation(server):
+    status, headers, body = request(server, 'GET', '/hello.txt')
+    assert status == HTTPStatus.OK and body.decode('utf-8') == TEXT
+    status, _, body = request(server, 'GET', '/hello.txt', headers={'If-None-Match': headers['ETag']})
+    assert status == HTTPStatus.NOT_MODIFIED and body == b''
+
+
+def test_precompressed_variant(server):
+    status, headers, body = request(server, 'GET', '/hello.txt', headers={'Accept-Encoding': 'gzip, br;q=0'})
+    assert status == HTTPStatus.OK
+    assert headers['Content-Encoding'] == 'gzip'
+    assert gzip.decompress(body).decode('utf-8') == TEXT
+
+
+def test_range_request(server):
+    status, headers, body = request(server, 'GET', '/slip.jpg', headers={'Range': 'bytes=10-19'})
+    assert status == HTTPStatus.PARTIAL_CONTENT
+    assert headers['Content-Range'] == f'bytes 10-19/{len(IMAGE)}'
+    assert body == IMAGE[10:20]
+
+    status, _, _ = request(server, 'GET', '/slip.jpg', headers={'Range': f'bytes={len(IMAGE)}-'})
+    assert status == HTTPStatus.REQUESTED_RANGE_NOT_SATISFIABLE
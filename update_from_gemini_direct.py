@@ -1,81 +1,239 @@
 #!/usr/bin/env python3
 """
 从修正后的senso-gemini.txt更新full.json
-使用正则表达式逐个提取签对象
+流式扫描模型输出，逐个提取并解码签对象
 """
 
+import argparse
+import hashlib
 import json
+import os
 import re
+import sys
+
+from instrumentation import add_profile_argument, instrument, stage
+from optimize_images import write_fortune_json
 
 SOURCE_FILE = "omikuji/data/senso-gemini.txt"
 TARGET_FILE = "omikuji/data/senso-ji-fortunes-full.json"
 
+# 每次读取的字符数；内存占用只与单个签对象的大小有关
+CHUNK_SIZE = 1 << 16
+# 单个对象的上限，超过视为残缺输出，避免吞掉整个文件
+MAX_OBJECT_CHARS = 1 << 20
+
+# 修改合并逻辑后递增，让所有签的来源指纹失效
+MERGE_VERSION = 1
+
+# 模型输出中的引用标记，如 [cite_start]、[cite: 5]、[cite: 5, 6]
+CITE_MARKER = re.compile(r'\[cite_start\]|\[cite:\s*[\d,\s]*\]')
+
+# 对象内部（字符串外）的记号：完整的字符串一次匹配，或单个花括号/未闭合的引号
+_TOKEN = re.compile(r'"[^"\\]*(?:\\.[^"\\]*)*"|[{}"]')
+# 字符串内部需要关注的字符
+_IN_STRING = re.compile(r'["\\]')
+
+
+def read_chunks(path, chunk_size=CHUNK_SIZE):
+    """按块读取文本文件"""
+    with open(path, 'r', encoding='utf-8') as f:
+        for chunk in iter(lambda: f.read(chunk_size), ''):
+            yield chunk
+
+
+def iter_json_objects(chunks, max_chars=MAX_OBJECT_CHARS):
+    """
+    在文本流中定位最外层的 {...} 对象
+
+    跟踪字符串状态，字符串内的花括号和转义引号不会影响配对；
+    对象之外的说明文字（包括其中的引号）会被忽略。整体只扫描一遍。
+
+    Yields:
+        {'offset': 起始字符偏移, 'end': 结束偏移（不含）, 'line': 起始行号,
+         'text': 对象原文, 'error': 无法完整切分时的原因，否则为 None}
+    """
+    depth = 0
+    in_string = False
+    escape_pending = False
+    parts = []
+    size = 0
+    start = line_start = 0
+    base = 0
+    line = 1
+
+    for chunk in chunks:
+        i = 0
+        seg_start = 0
+        counted = 0
+        n = len(chunk)
+
+        while i < n:
+            if depth == 0:
+                m = chunk.find('{', i)
+                if m < 0:
+                    break
+                line += chunk.count('\n', counted, m)
+                counted = m
+                start, line_start = base + m, line
+                parts, size = [], 0
+                seg_start = m
+                depth = 1
+                i = m + 1
+            elif in_string:
+                if escape_pending:
+                    escape_pending = False
+                    i += 1
+                    continue
+                m = _IN_STRING.search(chunk, i)
+                if m is None:
+                    break
+                if m.group() == '"':
+                    in_string = False
+                else:
+                    escape_pending = True
+                i = m.end()
+            else:
+                m = _TOKEN.search(chunk, i)
+                if m is None:
+                    break
+                token = m.group()
+                i = m.end()
+                if token[0] == '"':
+                    # 只有在字符串跨越了块边界时才会单独匹配到引号
+                    in_string = len(token) == 1
+                elif token == '{':
+                    depth += 1
+                else:
+                    depth -= 1
+                    if depth == 0:
+                        parts.append(chunk[seg_start:i])
+                        yield {'offset': start, 'end': base + i, 'line': line_start,
+                               'text': ''.join(parts), 'error': None}
+                        parts = []
+
+        if depth:
+            parts.append(chunk[seg_start:])
+            size += n - seg_start
+            if size > max_chars:
+                yield {'offset': start, 'end': base + n, 'line': line_start,
+                       'text': '', 'error': f'对象超过 {max_chars} 字符，疑似缺少右括号'}
+                depth, in_string, escape_pending, parts = 0, False, False, []
+        line += chunk.count('\n', counted)
+        base += n
+
+    if depth:
+        yield {'offset': start, 'end': base, 'line': line_start,
+               'text': ''.join(parts), 'error': '文件结束时对象仍未闭合'}
+
+
+def extract_fortunes(sources, rejected=None):
+    """
+    从一个或多个模型输出文件中提取签对象
+
+    Args:
+        sources: 文件路径列表
+        rejected: 可选列表，用于收集被拒绝的对象（文件、偏移、行号、原因）
+
+    Returns:
+        按 id 排序的签列表；同一 id 出现多次时以最后一次为准
+    """
+    if rejected is None:
+        rejected = []
+    decoder = json.JSONDecoder()
+    fortune_map = {}
 
-def extract_fortunes_from_text(content):
-    """使用正则表达式提取所有签对象"""
-
-    # 预处理：移除所有特殊标记
-    content = content.replace('[cite_start]', '')
-    content = re.sub(r'\[cite:\s*\d+\]', '', content)
-
-    # 逐个提取签对象
-    # 模式：从 { "id": xxx 开始到对应的 }
-    pattern = r'\{\s*"id"\s*:\s*(\d+)\s*,[^}]*"interpretation"\s*:\s*\{[^}]*\}\s*\}\s*,'
-
-    fortunes = []
-
-    # 使用更简单的方法：找到每个 { "id": X } 块
-    # 先分割成单独的对象
-    in_object = False
-    brace_count = 0
-    current_obj = ""
-    id_pattern = re.compile(r'"id"\s*:\s*(\d+)')
-
-    for char in content:
-        if char == '{' and not in_object:
-            in_object = True
-            brace_count = 1
-            current_obj = char
-        elif in_object:
-            current_obj += char
-            if char == '{':
-                brace_count += 1
-            elif char == '}':
-                brace_count -= 1
-                if brace_count == 0:
-                    # 完成一个对象
-                    # 检查是否包含id
-                    if id_pattern.search(current_obj):
-                        try:
-                            obj = json.loads(current_obj)
-                            fortunes.append(obj)
-                        except:
-                            pass
-                    in_object = False
-                    current_obj = ""
-
-    print(f"通过正则提取了 {len(fortunes)} 个签")
+    for source in sources:
+        chunks = read_chunks(source) if isinstance(source, str) else source
+        name = source if isinstance(source, str) else '<text>'
+
+        for obj in iter_json_objects(chunks):
+            error = obj['error']
+            if error is None:
+                text = CITE_MARKER.sub('', obj['text'])
+                try:
+                    item, _ = decoder.raw_decode(text)
+                except json.JSONDecodeError as e:
+                    error = f'JSON 解析失败: {e.msg}（对象内第 {e.lineno} 行第 {e.colno} 列）'
+                else:
+                    if not isinstance(item.get('id'), int):
+                        error = '缺少整数 id'
+                    elif not isinstance(item.get('poem'), dict) or 'interpretation' not in item:
+                        error = '缺少 poem 或 interpretation'
+
+            if error:
+                rejected.append({'file': name, 'offset': obj['offset'], 'end': obj['end'],
+                                 'line': obj['line'], 'error': error})
+                continue
+
+            fortune_map[item['id']] = item
 
     # 按id排序
-    fortunes.sort(key=lambda x: x['id'])
+    return [fortune_map[fid] for fid in sorted(fortune_map)]
+
+
+def extract_fortunes_from_text(content):
+    """从完整文本中提取所有签对象，并报告被拒绝的对象位置"""
+    rejected = []
+    fortunes = extract_fortunes([[content]], rejected)
+
+    print(f"提取了 {len(fortunes)} 个签")
+    report_rejected(rejected)
 
     return fortunes
 
 
-def update_from_gemini():
-    """从修正后的gemini数据更新full.json"""
+def report_rejected(rejected):
+    """打印被拒绝对象的位置"""
+    if not rejected:
+        return
+    print(f"⚠️  拒绝了 {len(rejected)} 个对象：")
+    for item in rejected:
+        print(f"  - {item['file']} 第 {item['line']} 行，偏移 {item['offset']}-{item['end']}：{item['error']}")
+
+
+def source_fingerprint(item):
+    """
+    模型输出中一个签的内容指纹（签级、签诗、逐句解释、释义和合并逻辑版本）
+
+    保存在签的 sourceFingerprint 字段中，与当前值一致时跳过该签。
+    """
+    poem = item['poem']
+    payload = json.dumps(
+        [MERGE_VERSION, item['level'], poem['title'], poem['lines'],
+         poem.get('lineInterpretations', []), item['interpretation']],
+        ensure_ascii=False, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:16]
+
+
+def update_from_gemini(sources=None, target=TARGET_FILE, base=None, force=False):
+    """
+    从修正后的gemini数据更新full.json
+
+    Args:
+        sources: 模型输出文件列表（默认 SOURCE_FILE）
+        target: 要更新的签文 JSON
+        base: target 不存在时用作起点的签文骨架（generate_fortunes.py 的输出）
+        force: 忽略来源指纹，更新全部签
+
+    Returns:
+        更新的签数
+    """
+    sources = sources or [SOURCE_FILE]
 
     print("=" * 80)
     print("从修正后的senso-gemini.txt更新full.json")
     print("=" * 80)
     print()
 
-    # 读取修正后的gemini数据
-    print(f"读取源文件: {SOURCE_FILE}")
-    with open(SOURCE_FILE, 'r', encoding='utf-8') as f:
-        content = f.read()
+    # 流式读取修正后的gemini数据（可以是多个文件）
+    for source in sources:
+        print(f"读取源文件: {source}")
 
-    source_data = extract_fortunes_from_text(content)
+    rejected = []
+    with stage('extract'):
+        source_data = extract_fortunes(sources, rejected)
+    print(f"提取了 {len(source_data)} 个签")
+    report_rejected(rejected)
 
     if len(source_data) < 100:
         print(f"⚠️  只提取到 {len(source_data)} 个签，尝试继续...")
@@ -88,9 +246,15 @@ def update_from_gemini():
     for item in source_data:
         fortune_map[item['id']] = item
 
-    # 读取目标full.json
-    print(f"读取目标文件: {TARGET_FILE}")
-    with open(TARGET_FILE, 'r', encoding='utf-8') as f:
+    # 读取目标full.json（首次构建时从骨架开始）
+    from_base = bool(base) and not os.path.exists(target)
+    if from_base:
+        print(f"目标文件不存在，使用骨架: {base}")
+        target_source = base
+    else:
+        target_source = target
+    print(f"读取目标文件: {target_source}")
+    with stage('load'), open(target_source, 'r', encoding='utf-8') as f:
         data = json.load(f)
 
     print(f"  - 目标文件包含 {len(data['fortunes'])} 个签")
@@ -99,6 +263,7 @@ def update_from_gemini():
     # 更新每个签的数据
     print("开始更新数据...")
     updated_count = 0
+    unchanged_count = 0
     poem_changes = []
 
     for fortune in data['fortunes']:
@@ -107,6 +272,12 @@ def update_from_gemini():
         if fortune_id in fortune_map:
             source_item = fortune_map[fortune_id]
 
+            # 模型输出中这个签没有变化，保留现有内容（包括 enrich 生成的释义）
+            current = source_fingerprint(source_item)
+            if not force and fortune.get('sourceFingerprint') == current:
+                unchanged_count += 1
+                continue
+
             old_poem = fortune['poem']['lines']
             new_poem = source_item['poem']['lines']
 
@@ -135,14 +306,19 @@ def update_from_gemini():
                 'story': interp.get('story', '')
             }
 
+            fortune['sourceFingerprint'] = current
+            # 签诗或释义来源变了，让 enrich 重新生成这个签的释义
+            fortune.pop('interpretationFingerprint', None)
+
             updated_count += 1
 
-    # 保存更新后的数据
-    print(f"  - 成功更新 {updated_count} 个签")
+    # 保存更新后的数据（没有变化时不写文件）
+    print(f"  - 成功更新 {updated_count} 个签，{unchanged_count} 个未变化")
     print()
 
-    with open(TARGET_FILE, 'w', encoding='utf-8') as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
+    if updated_count or from_base:
+        with stage('write'):
+            write_fortune_json(target, data)
 
     # 显示诗句变更（前3个）
     if poem_changes:
@@ -170,6 +346,14 @@ def update_from_gemini():
     print("✅ 更新完成！")
     print("=" * 80)
 
+    return updated_count
+
 
 if __name__ == "__main__":
-    update_from_gemini()
+    parser = argparse.ArgumentParser(description="从修正后的模型输出更新 full.json")
+    parser.add_argument('sources', nargs='*', help=f"模型输出文件（默认 {SOURCE_FILE}）")
+    parser.add_argument('--force', action='store_true', help="忽略来源指纹，更新全部签")
+    add_profile_argument(parser)
+    args = parser.parse_args()
+    with instrument('update_from_gemini_direct', profile=args.profile):
+        update_from_gemini(args.sources, force=args.force)
@@ -0,0 +1,345 @@
+#!/usr/bin/env python3
+"""
+签文数据完整性校验
+
+检查线上签文数据是否可以安全发布：
+- 签号 1-100 齐全、没有重复或多余的签
+- 签级是已知签级；与 generate_fortunes.LEVEL_MAPPING 的分布不同时给出提示
+- 每条签的 imageFront / imageBack 存在，并且是结构完整的图片（JPEG/PNG/WebP）
+- 图片内容与 optimize_images.py 清单中记录的输出一致（检测被意外覆盖或截断）
+
+图片用 mmap 读取、多线程并行计算 SHA-256，结果记录在 .build-cache/verify-manifest.json；
+大小和修改时间都没变的文件直接沿用上次的校验结果，部署前和 serve.py 启动时
+都可以运行（无变化时只需几十毫秒）。
+
+用法：
+  python3 verify_dataset.py               # 校验并输出报告，有错误时退出码为 1
+  python3 verify_dataset.py --fail-fast   # 遇到第一个错误立即停止
+  python3 verify_dataset.py --force       # 忽略清单，重新计算全部哈希
+"""
+
+import argparse
+import hashlib
+import importlib.util
+import json
+import mmap
+import os
+import sys
+import time
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from pathlib import Path
+
+from optimize_images import MANIFEST_FILE as OPTIMIZE_MANIFEST_FILE
+from optimize_images import load_manifest, save_manifest
+
+ROOT = Path(__file__).resolve().parent
+
+DATA_DIR = "omikuji/data"
+DATA_FILES = [
+    "omikuji/data/senso-ji-fortunes-full-optimized-v1.json",
+    "omikuji/data/senso-ji-fortunes-full.json",
+]
+MANIFEST_FILE = ".build-cache/verify-manifest.json"
+
+EXPECTED_IDS = range(1, 101)
+IMAGE_FIELDS = ('imageFront', 'imageBack')
+
+# 浅草寺实际使用、但签文骨架中没有的签级
+EXTRA_LEVELS = {'末小吉'}
+
+# JPEG 中带有图片尺寸的帧头（SOF0-SOF15，除去 DHT/JPG/DAC）
+JPEG_SOF = set(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+
+
+def _load_levels():
+    """读取 generate_fortunes.py 中的签级映射，返回 (已知签级, 期望分布)"""
+    spec = importlib.util.spec_from_file_location(
+        "generate_fortunes", ROOT / "omikuji/generate_fortunes.py")
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    expected = Counter({module.LEVEL_CHINESE[key]: len(ids)
+                        for key, ids in module.LEVEL_MAPPING.items()})
+    return set(module.LEVEL_CHINESE.values()) | EXTRA_LEVELS, expected
+
+
+# ==================== 图片检查 ====================
+
+def _u16(data, offset, order='big'):
+    return int.from_bytes(data[offset:offset + 2], order)
+
+
+def _jpeg_size(data):
+    """遍历 JPEG 段，返回 (宽, 高)；结构损坏时抛出 ValueError"""
+    if data[-2:] != b'\xff\xd9':
+        raise ValueError("缺少 JPEG 结束标记（文件可能被截断）")
+    pos = 2
+    while pos + 4 <= len(data):
+        if data[pos] != 0xFF:
+            raise ValueError(f"偏移 {pos} 处不是 JPEG 段标记")
+        marker = data[pos + 1]
+        if marker == 0xFF:
+            pos += 1
+            continue
+        if marker in JPEG_SOF:
+            return _u16(data, pos + 7), _u16(data, pos + 5)
+        if marker in (0xD9, 0xDA):
+            break
+        pos += 2 + _u16(data, pos + 2)
+    raise ValueError("没有找到 JPEG 帧头")
+
+
+def image_info(data):
+    """
+    根据文件头判断图片格式并读取尺寸（不解码像素）
+
+    Returns:
+        (格式, 宽, 高)；不是可识别的完整图片时抛出 ValueError
+    """
+    if data[:2] == b'\xff\xd8':
+        return ('jpeg',) + _jpeg_size(data)
+    if data[:8] == b'\x89PNG\r\n\x1a\n':
+        if data[-8:-4] != b'IEND':
+            raise ValueError("缺少 PNG IEND 块（文件可能被截断）")
+        return 'png', int.from_bytes(data[16:20], 'big'), int.from_bytes(data[20:24], 'big')
+    if data[:4] == b'RIFF' and data[8:12] == b'WEBP':
+        if int.from_bytes(data[4:8], 'little') + 8 != len(data):
+            raise ValueError("WebP 长度与 RIFF 头不符（文件可能被截断）")
+        return 'webp', None, None
+    raise ValueError("不是可识别的图片格式")
+
+
+def _inspect(job):
+    """用 mmap 计算一个文件的 SHA-256 并检查图片结构（在线程池中执行）"""
+    path, key = job
+    st = os.stat(path)
+    entry = {'size': st.st_size, 'mtime_ns': st.st_mtime_ns}
+    if not st.st_size:
+        entry['error'] = "文件为空"
+        return key, entry
+
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        # hashlib 处理大块数据时会释放 GIL，多线程可以并行计算
+        entry['sha256'] = hashlib.sha256(data).hexdigest()
+        try:
+            entry['format'], entry['width'], entry['height'] = image_info(data)
+        except ValueError as e:
+            entry['error'] = str(e)
+    return key, entry
+
+
+# ==================== 数据检查 ====================
+
+def check_fortunes(data_file, known_levels, report, root=ROOT):
+    """
+    检查一个签文 JSON 的签号和签级
+
+    Returns:
+        {图片路径（相对于项目根目录）: [引用它的签描述]}
+    """
+    try:
+        with open(Path(root) / data_file, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        fortunes = data['fortunes']
+    except (OSError, ValueError, KeyError, TypeError) as e:
+        report.error(data_file, f"无法读取签文数据: {e}")
+        return {}
+
+    images = {}
+    seen = Counter()
+    for index, fortune in enumerate(fortunes):
+        fortune_id = fortune.get('id') if isinstance(fortune, dict) else None
+        if not isinstance(fortune_id, int):
+            report.error(data_file, f"第 {index} 项缺少整数 id")
+            continue
+        seen[fortune_id] += 1
+
+        level = fortune.get('level')
+        if level not in known_levels:
+            report.error(data_file, f"第 {fortune_id} 签的签级未知: {level!r}")
+
+        for field in IMAGE_FIELDS:
+            image = fortune.get(field)
+            if not image:
+                report.error(data_file, f"第 {fortune_id} 签缺少 {field}")
+                continue
+            images.setdefault(f"{DATA_DIR}/{image}", []).append(f"第 {fortune_id} 签 {field}")
+
+    duplicated = sorted(i for i, n in seen.items() if n > 1)
+    missing = sorted(set(EXPECTED_IDS) - set(seen))
+    unexpected = sorted(set(seen) - set(EXPECTED_IDS))
+    if duplicated:
+        report.error(data_file, f"签号重复: {duplicated}")
+    if missing:
+        report.error(data_file, f"缺少签号: {missing}")
+    if unexpected:
+        report.error(data_file, f"多余的签号: {unexpected}")
+
+    report.levels[data_file] = Counter(
+        f.get('level') for f in fortunes if isinstance(f, dict))
+    return images
+
+
+def check_distribution(report, expected, strict=False):
+    """比较各数据文件的签级分布与 LEVEL_MAPPING"""
+    for data_file, actual in report.levels.items():
+        if actual == expected:
+            continue
+        diff = ', '.join(f"{level} {actual[level]}/{expected[level]}"
+                         for level in sorted(set(actual) | set(expected))
+                         if actual[level] != expected[level])
+        message = f"签级分布与 LEVEL_MAPPING 不同（实际/期望）: {diff}"
+        if strict:
+            report.error(data_file, message)
+        else:
+            report.warn(data_file, message)
+
+
+class FailFast(Exception):
+    """开启 fail_fast 时，出现第一个错误即中止校验"""
+
+
+class Report:
+    """收集校验中发现的问题"""
+
+    def __init__(self, fail_fast=False):
+        self.fail_fast = fail_fast
+        self.errors = []
+        self.warnings = []
+        self.levels = {}
+        self.replaced = []
+        self.checked = 0
+        self.hashed = 0
+
+    def error(self, path, message):
+        self.errors.append((path, message))
+        if self.fail_fast:
+            raise FailFast()
+
+    def warn(self, path, message):
+        self.warnings.append((path, message))
+
+    @property
+    def ok(self):
+        return not self.errors
+
+    def print(self, seconds):
+        if self.replaced:
+            names = ', '.join(Path(key).name for key in sorted(self.replaced)[:5])
+            more = f" 等 {len(self.replaced)} 张" if len(self.replaced) > 5 else ""
+            print(f"⚠️  {names}{more}: 图片在 optimize_images.py 之后被替换，尚未重新优化")
+        for path, message in self.warnings:
+            print(f"⚠️  {path}: {message}")
+        for path, message in self.errors:
+            print(f"✗ {path}: {message}")
+        status = "✅ 校验通过" if self.ok else f"❌ 发现 {len(self.errors)} 处错误"
+        print(f"{status}：{self.checked} 个文件，重新计算 {self.hashed} 个哈希，耗时 {seconds*1000:.0f}ms")
+
+
+def _check_image(key, entry, refs, optimized, report):
+    where = '、'.join(dict.fromkeys(refs))
+    if entry.get('error'):
+        report.error(key, f"{entry['error']}（{where}）")
+        return
+    recorded = optimized.get(key)
+    if recorded and entry['size'] == recorded.get('size') and entry['sha256'] != recorded.get('output'):
+        report.error(key, f"内容与 optimize_images.py 清单记录不符，可能已损坏（{where}）")
+    elif recorded and entry['size'] != recorded.get('size'):
+        report.replaced.append(key)
+
+
+def verify_dataset(data_files=None, root=ROOT, manifest_path=MANIFEST_FILE, workers=None,
+                   fail_fast=False, strict_levels=False, force=False, quiet=False):
+    """
+    校验签文数据和图片
+
+    Args:
+        data_files: 要检查的签文 JSON（默认线上数据和 full.json）
+        root: 项目根目录，其他路径都相对于它
+        workers: 计算哈希的线程数（默认 CPU 核心数）
+        fail_fast: 遇到第一个错误立即停止
+        strict_levels: 签级分布与 LEVEL_MAPPING 不同时视为错误
+        force: 忽略清单，重新计算全部哈希
+        quiet: 通过时不输出报告
+
+    Returns:
+        Report（report.ok 表示是否通过）
+    """
+    start = time.perf_counter()
+    root = Path(root)
+    report = Report(fail_fast)
+    manifest_path = root / manifest_path
+    manifest = {} if force else load_manifest(manifest_path)
+    optimized = load_manifest(root / OPTIMIZE_MANIFEST_FILE)
+
+    try:
+        known_levels, expected = _load_levels()
+        images = {}
+        for data_file in data_files or DATA_FILES:
+            for key, refs in check_fortunes(data_file, known_levels, report, root).items():
+                images.setdefault(key, []).extend(refs)
+        check_distribution(report, expected, strict_levels)
+
+        # 大小和修改时间都没变的文件沿用清单中的结果
+        jobs = []
+        for key, refs in sorted(images.items()):
+            path = root / key
+            try:
+                st = path.stat()
+            except OSError:
+                manifest.pop(key, None)
+                report.error(key, f"图片不存在（{'、'.join(dict.fromkeys(refs))}）")
+                continue
+            report.checked += 1
+            entry = manifest.get(key)
+            if entry and entry['size'] == st.st_size and entry['mtime_ns'] == st.st_mtime_ns:
+                _check_image(key, entry, refs, optimized, report)
+            else:
+                jobs.append((path, key))
+
+        with ThreadPoolExecutor(max_workers=workers or os.cpu_count() or 1) as pool:
+            pending = {pool.submit(_inspect, job) for job in jobs}
+            try:
+                while pending:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        key, entry = future.result()
+                        report.hashed += 1
+                        # 只缓存结构完整的文件，有问题的文件下次仍会重新检查
+                        if entry.get('error'):
+                            manifest.pop(key, None)
+                        else:
+                            manifest[key] = entry
+                        _check_image(key, entry, images[key], optimized, report)
+            finally:
+                for future in pending:
+                    future.cancel()
+    except FailFast:
+        pass
+
+    if report.hashed:
+        save_manifest(manifest_path, manifest)
+
+    if not quiet or not report.ok:
+        report.print(time.perf_counter() - start)
+    return report
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="校验签文数据和图片的完整性")
+    parser.add_argument('data_files', nargs='*', help="要检查的签文 JSON（默认线上数据和 full.json）")
+    parser.add_argument('-j', '--workers', type=int, default=None, help="计算哈希的线程数")
+    parser.add_argument('--fail-fast', action='store_true', help="遇到第一个错误立即停止")
+    parser.add_argument('--strict-levels', action='store_true',
+                        help="签级分布与 LEVEL_MAPPING 不同时视为错误")
+    parser.add_argument('--force', action='store_true', help="忽略清单，重新计算全部哈希")
+    parser.add_argument('--manifest', default=MANIFEST_FILE, help="校验清单路径")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    result = verify_dataset(args.data_files, manifest_path=args.manifest, workers=args.workers,
+                            fail_fast=args.fail_fast, strict_levels=args.strict_levels,
+                            force=args.force)
+    sys.exit(0 if result.ok else 1)